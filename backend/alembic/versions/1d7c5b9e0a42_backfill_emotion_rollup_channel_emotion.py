@@ -0,0 +1,40 @@
+"""backfill emotion_rollup channel_emotion grain
+
+Revision ID: 1d7c5b9e0a42
+Revises: e6a4f18c3b59
+Create Date: 2026-10-19 17:20:44.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "1d7c5b9e0a42"
+down_revision: Union[str, Sequence[str], None] = "e6a4f18c3b59"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # compute_emotion_daily now emits this grain in its GROUPING SETS; fill in the history
+    op.execute("""
+        INSERT INTO emotion_rollup (
+          id, day, grain, org_id, team_id, channel, emotion,
+          doc_count, negative_count, avg_confidence, created_at
+        )
+        SELECT
+          gen_random_uuid(),
+          day, 'channel_emotion', org_id, team_id, channel, emotion,
+          SUM(doc_count)::int,
+          SUM(CASE WHEN sentiment = 'negative' THEN doc_count ELSE 0 END)::int,
+          (SUM(doc_count * COALESCE(avg_confidence, 0)) / NULLIF(SUM(doc_count), 0))::float,
+          NOW()
+        FROM emotion_daily
+        GROUP BY day, org_id, team_id, channel, emotion
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM emotion_rollup WHERE grain = 'channel_emotion'")
@@ -0,0 +1,32 @@
+"""add emotion_rolling confidence_sum
+
+Revision ID: 3e7a91c2d4b8
+Revises: a1c4d2e9b6f1
+Create Date: 2026-10-19 09:12:40.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3e7a91c2d4b8"
+down_revision: Union[str, Sequence[str], None] = "a1c4d2e9b6f1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "emotion_rolling",
+        sa.Column("confidence_sum", sa.Float(), nullable=False, server_default="0"),
+    )
+    # backfill from the stored average so existing windows can be slid forward
+    op.execute("UPDATE emotion_rolling SET confidence_sum = doc_count * COALESCE(avg_confidence, 0)")
+    op.alter_column("emotion_rolling", "confidence_sum", server_default=None)
+
+
+def downgrade() -> None:
+    op.drop_column("emotion_rolling", "confidence_sum")
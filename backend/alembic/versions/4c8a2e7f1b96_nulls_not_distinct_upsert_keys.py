@@ -0,0 +1,83 @@
+"""nulls-not-distinct upsert keys for aggregates and alerts
+
+Revision ID: 4c8a2e7f1b96
+Revises: 9b3e6f2d8c17
+Create Date: 2026-10-19 19:11:05.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "4c8a2e7f1b96"
+down_revision: Union[str, Sequence[str], None] = "9b3e6f2d8c17"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (table, constraint, columns): NULL segment dimensions are real keys, so the
+# constraints must treat them as equal for ON CONFLICT to find the row (PG15+)
+_SEGMENT_CONSTRAINTS = [
+    (
+        "emotion_daily", "uq_emotion_daily_segment",
+        ["day", "org_id", "team_id", "channel", "source", "sentiment", "emotion"],
+    ),
+    (
+        "emotion_rolling", "uq_emotion_rolling_segment",
+        ["as_of_day", "window_days", "org_id", "team_id", "channel", "source", "sentiment", "emotion"],
+    ),
+    (
+        "emotion_rollup", "uq_emotion_rollup_segment",
+        ["day", "grain", "org_id", "team_id", "channel", "emotion"],
+    ),
+]
+
+
+def upgrade() -> None:
+    for table, name, cols in _SEGMENT_CONSTRAINTS:
+        op.drop_constraint(name, table, type_="unique")
+        op.create_unique_constraint(name, table, cols, postgresql_nulls_not_distinct=True)
+
+    # one alert per (day, rule, segment) from the rule engine ...
+    op.execute("""
+        DELETE FROM alerts a
+        USING alerts b
+        WHERE a.rule_id IS NOT NULL AND a.rule_id = b.rule_id AND a.day = b.day
+          AND a.org_id IS NOT DISTINCT FROM b.org_id
+          AND a.team_id IS NOT DISTINCT FROM b.team_id
+          AND a.channel IS NOT DISTINCT FROM b.channel
+          AND (a.created_at, a.id) < (b.created_at, b.id)
+    """)
+    op.execute("""
+        CREATE UNIQUE INDEX ux_alerts_rule_segment
+        ON alerts (day, rule_id, org_id, team_id, channel) NULLS NOT DISTINCT
+        WHERE rule_id IS NOT NULL
+    """)
+
+    # ... and per (day, type, segment) from the daily detectors; intraday alerts are per hour
+    op.execute("""
+        DELETE FROM alerts a
+        USING alerts b
+        WHERE a.rule_id IS NULL AND b.rule_id IS NULL AND a.alert_type <> 'intraday_spike'
+          AND a.alert_type = b.alert_type AND a.day = b.day
+          AND a.org_id IS NOT DISTINCT FROM b.org_id
+          AND a.team_id IS NOT DISTINCT FROM b.team_id
+          AND a.channel IS NOT DISTINCT FROM b.channel
+          AND (a.created_at, a.id) < (b.created_at, b.id)
+    """)
+    op.execute("""
+        CREATE UNIQUE INDEX ux_alerts_detector_segment
+        ON alerts (day, alert_type, org_id, team_id, channel) NULLS NOT DISTINCT
+        WHERE rule_id IS NULL AND alert_type <> 'intraday_spike'
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ux_alerts_detector_segment")
+    op.execute("DROP INDEX IF EXISTS ux_alerts_rule_segment")
+
+    for table, name, cols in reversed(_SEGMENT_CONSTRAINTS):
+        op.drop_constraint(name, table, type_="unique")
+        op.create_unique_constraint(name, table, cols)
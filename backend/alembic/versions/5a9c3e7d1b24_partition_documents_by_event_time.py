@@ -0,0 +1,226 @@
+"""partition documents and document_inference by event_time
+
+Revision ID: 5a9c3e7d1b24
+Revises: d8e3b15c7f42
+Create Date: 2026-10-19 14:03:52.000000
+
+Converts both tables to monthly declarative range partitions on a new
+event_time column (COALESCE(timestamp, created_at); copied onto
+document_inference). Partitioned tables need the partition key in every
+unique constraint, so the primary keys become (id, event_time) and
+document_inference references documents on (document_id, event_time).
+alert_evidence and document_topics lose their FK to documents; retention
+(app.db.partitions.drop_partitions_before) cleans them up explicitly.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5a9c3e7d1b24"
+down_revision: Union[str, Sequence[str], None] = "d8e3b15c7f42"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# months of history to give their own partitions; older rows go to the default partition
+HISTORY_MONTHS = 36
+MONTHS_AHEAD = 3
+
+
+def _create_partitions(table: str, lo_sql: str) -> None:
+    op.execute(f"""
+        DO $$
+        DECLARE
+          hi date := (date_trunc('month', now() AT TIME ZONE 'UTC') + interval '{MONTHS_AHEAD} months')::date;
+          m  date;
+        BEGIN
+          SELECT GREATEST(
+                   date_trunc('month', COALESCE(({lo_sql}), now()) AT TIME ZONE 'UTC')::date,
+                   (hi - interval '{HISTORY_MONTHS + MONTHS_AHEAD} months')::date
+                 )
+            INTO m;
+          WHILE m <= hi LOOP
+            EXECUTE format(
+              'CREATE TABLE IF NOT EXISTS %I PARTITION OF {table} FOR VALUES FROM (%L) TO (%L)',
+              '{table}_p' || to_char(m, 'YYYY_MM'),
+              to_char(m, 'YYYY-MM-DD') || ' 00:00:00+00',
+              to_char((m + interval '1 month')::date, 'YYYY-MM-DD') || ' 00:00:00+00'
+            );
+            m := (m + interval '1 month')::date;
+          END LOOP;
+        END $$;
+    """)
+    op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+
+def upgrade() -> None:
+    # FKs into documents.id cannot survive: id alone is no longer unique at the table level
+    op.execute("ALTER TABLE document_inference DROP CONSTRAINT IF EXISTS document_inference_document_id_fkey")
+    op.execute("ALTER TABLE document_inference DROP CONSTRAINT IF EXISTS document_inference_inference_run_id_fkey")
+    op.execute("ALTER TABLE alert_evidence DROP CONSTRAINT IF EXISTS alert_evidence_document_id_fkey")
+    op.execute("ALTER TABLE document_topics DROP CONSTRAINT IF EXISTS document_topics_document_id_fkey")
+
+    # ---- documents ----
+    op.rename_table("documents", "documents_unpartitioned")
+    op.execute("ALTER INDEX documents_pkey RENAME TO documents_unpartitioned_pkey")
+
+    op.execute("""
+        CREATE TABLE documents (
+          id uuid NOT NULL,
+          external_id varchar(255),
+          org_id varchar(128),
+          team_id varchar(128),
+          source varchar(64),
+          channel varchar(64),
+          tags json,
+          text_redacted text NOT NULL,
+          redaction_summary json NOT NULL,
+          timestamp timestamptz,
+          event_time timestamptz NOT NULL,
+          created_at timestamptz NOT NULL,
+          updated_at timestamptz NOT NULL,
+          CONSTRAINT documents_pkey PRIMARY KEY (id, event_time)
+        ) PARTITION BY RANGE (event_time)
+    """)
+    _create_partitions("documents", "SELECT MIN(COALESCE(timestamp, created_at)) FROM documents_unpartitioned")
+
+    op.execute("""
+        INSERT INTO documents (
+          id, external_id, org_id, team_id, source, channel, tags,
+          text_redacted, redaction_summary, timestamp, event_time, created_at, updated_at
+        )
+        SELECT
+          id, external_id, org_id, team_id, source, channel, tags,
+          text_redacted, redaction_summary, timestamp, COALESCE(timestamp, created_at), created_at, updated_at
+        FROM documents_unpartitioned
+    """)
+
+    # ---- document_inference ----
+    op.rename_table("document_inference", "document_inference_unpartitioned")
+    op.execute("ALTER INDEX document_inference_pkey RENAME TO document_inference_unpartitioned_pkey")
+
+    op.execute("""
+        CREATE TABLE document_inference (
+          id uuid NOT NULL,
+          document_id uuid NOT NULL,
+          event_time timestamptz NOT NULL,
+          inference_run_id uuid NOT NULL,
+          sentiment varchar(32),
+          emotion_labels json,
+          calibrated_confidence double precision,
+          label varchar(255),
+          score double precision,
+          result json,
+          created_at timestamptz NOT NULL,
+          CONSTRAINT document_inference_pkey PRIMARY KEY (id, event_time)
+        ) PARTITION BY RANGE (event_time)
+    """)
+    _create_partitions("document_inference", "SELECT MIN(event_time) FROM documents")
+
+    op.execute("""
+        INSERT INTO document_inference (
+          id, document_id, event_time, inference_run_id, sentiment, emotion_labels,
+          calibrated_confidence, label, score, result, created_at
+        )
+        SELECT
+          di.id, di.document_id, d.event_time, di.inference_run_id, di.sentiment, di.emotion_labels,
+          di.calibrated_confidence, di.label, di.score, di.result, di.created_at
+        FROM document_inference_unpartitioned di
+        JOIN documents d ON d.id = di.document_id
+    """)
+
+    op.drop_table("document_inference_unpartitioned")
+    op.drop_table("documents_unpartitioned")
+
+    # indexes on the parent cascade to every partition (current and future)
+    op.create_index(op.f("ix_documents_external_id"), "documents", ["external_id"], unique=False)
+    op.create_index(op.f("ix_documents_org_id"), "documents", ["org_id"], unique=False)
+    op.create_index(op.f("ix_documents_team_id"), "documents", ["team_id"], unique=False)
+    op.create_index(op.f("ix_documents_source"), "documents", ["source"], unique=False)
+    op.create_index(op.f("ix_documents_channel"), "documents", ["channel"], unique=False)
+    op.create_index(op.f("ix_documents_timestamp"), "documents", ["timestamp"], unique=False)
+
+    op.create_index(op.f("ix_document_inference_document_id"), "document_inference", ["document_id"], unique=False)
+    op.create_index(op.f("ix_document_inference_inference_run_id"), "document_inference", ["inference_run_id"], unique=False)
+    op.create_index(op.f("ix_document_inference_sentiment"), "document_inference", ["sentiment"], unique=False)
+
+    op.create_foreign_key(
+        "document_inference_document_fkey",
+        "document_inference", "documents",
+        ["document_id", "event_time"], ["id", "event_time"],
+        ondelete="CASCADE",
+    )
+    op.create_foreign_key(
+        "document_inference_inference_run_id_fkey",
+        "document_inference", "inference_runs",
+        ["inference_run_id"], ["id"],
+        ondelete="CASCADE",
+    )
+
+
+def downgrade() -> None:
+    op.rename_table("document_inference", "document_inference_partitioned")
+    op.rename_table("documents", "documents_partitioned")
+    op.execute("ALTER TABLE document_inference_partitioned DROP CONSTRAINT document_inference_document_fkey")
+    op.execute("ALTER TABLE document_inference_partitioned DROP CONSTRAINT document_inference_inference_run_id_fkey")
+    op.execute("ALTER TABLE documents_partitioned DROP CONSTRAINT documents_pkey")
+    op.execute("ALTER TABLE document_inference_partitioned DROP CONSTRAINT document_inference_pkey")
+    for name in (
+        "ix_documents_external_id", "ix_documents_org_id", "ix_documents_team_id",
+        "ix_documents_source", "ix_documents_channel", "ix_documents_timestamp",
+        "ix_document_inference_document_id", "ix_document_inference_inference_run_id",
+        "ix_document_inference_sentiment",
+    ):
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+
+    op.execute("""
+        CREATE TABLE documents AS
+        SELECT id, external_id, org_id, team_id, source, channel, tags,
+               text_redacted, redaction_summary, timestamp, created_at, updated_at
+        FROM documents_partitioned
+    """)
+    op.execute("""
+        CREATE TABLE document_inference AS
+        SELECT id, document_id, inference_run_id, label, score, result, created_at,
+               sentiment, emotion_labels, calibrated_confidence
+        FROM document_inference_partitioned
+    """)
+    op.drop_table("document_inference_partitioned")
+    op.drop_table("documents_partitioned")
+
+    op.create_primary_key("documents_pkey", "documents", ["id"])
+    op.create_primary_key("document_inference_pkey", "document_inference", ["id"])
+    for col in ("text_redacted", "redaction_summary", "created_at", "updated_at"):
+        op.alter_column("documents", col, nullable=False)
+    for col in ("document_id", "inference_run_id", "created_at"):
+        op.alter_column("document_inference", col, nullable=False)
+
+    op.create_index(op.f("ix_documents_external_id"), "documents", ["external_id"], unique=False)
+    op.create_index(op.f("ix_documents_org_id"), "documents", ["org_id"], unique=False)
+    op.create_index(op.f("ix_documents_team_id"), "documents", ["team_id"], unique=False)
+    op.create_index(op.f("ix_documents_source"), "documents", ["source"], unique=False)
+    op.create_index(op.f("ix_documents_channel"), "documents", ["channel"], unique=False)
+    op.create_index(op.f("ix_documents_timestamp"), "documents", ["timestamp"], unique=False)
+    op.create_index(op.f("ix_document_inference_document_id"), "document_inference", ["document_id"], unique=False)
+    op.create_index(op.f("ix_document_inference_inference_run_id"), "document_inference", ["inference_run_id"], unique=False)
+    op.create_index(op.f("ix_document_inference_sentiment"), "document_inference", ["sentiment"], unique=False)
+
+    op.create_foreign_key(
+        "document_inference_document_id_fkey", "document_inference", "documents",
+        ["document_id"], ["id"], ondelete="CASCADE",
+    )
+    op.create_foreign_key(
+        "document_inference_inference_run_id_fkey", "document_inference", "inference_runs",
+        ["inference_run_id"], ["id"], ondelete="CASCADE",
+    )
+    op.create_foreign_key(
+        "alert_evidence_document_id_fkey", "alert_evidence", "documents",
+        ["document_id"], ["id"], ondelete="CASCADE",
+    )
+    op.create_foreign_key(
+        "document_topics_document_id_fkey", "document_topics", "documents",
+        ["document_id"], ["id"], ondelete="CASCADE",
+    )
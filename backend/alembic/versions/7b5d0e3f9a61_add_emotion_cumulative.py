@@ -0,0 +1,50 @@
+"""add emotion_cumulative
+
+Revision ID: 7b5d0e3f9a61
+Revises: 3e7a91c2d4b8
+Create Date: 2026-10-19 10:02:11.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "7b5d0e3f9a61"
+down_revision: Union[str, Sequence[str], None] = "3e7a91c2d4b8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "emotion_cumulative",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("org_id", sa.String(length=128), nullable=True),
+        sa.Column("team_id", sa.String(length=128), nullable=True),
+        sa.Column("channel", sa.String(length=64), nullable=True),
+        sa.Column("source", sa.String(length=64), nullable=True),
+        sa.Column("sentiment", sa.String(length=32), nullable=True),
+        sa.Column("emotion", sa.String(length=64), nullable=True),
+        sa.Column("cum_doc_count", sa.BigInteger(), nullable=False),
+        sa.Column("cum_confidence_sum", sa.Float(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "day", "org_id", "team_id", "channel", "source", "sentiment", "emotion",
+            name="uq_emotion_cumulative_segment",
+        ),
+    )
+    op.create_index(op.f("ix_emotion_cumulative_day"), "emotion_cumulative", ["day"], unique=False)
+    op.create_index(op.f("ix_emotion_cumulative_org_id"), "emotion_cumulative", ["org_id"], unique=False)
+    op.create_index("ix_emotion_cumulative_org_day", "emotion_cumulative", ["org_id", "day"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_emotion_cumulative_org_day", table_name="emotion_cumulative")
+    op.drop_index(op.f("ix_emotion_cumulative_org_id"), table_name="emotion_cumulative")
+    op.drop_index(op.f("ix_emotion_cumulative_day"), table_name="emotion_cumulative")
+    op.drop_table("emotion_cumulative")
@@ -0,0 +1,43 @@
+"""add inference_run_documents and run progress counters
+
+Revision ID: 7e2d9a4c6f10
+Revises: 4c8a2e7f1b96
+Create Date: 2026-10-19 20:04:47.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "7e2d9a4c6f10"
+down_revision: Union[str, Sequence[str], None] = "4c8a2e7f1b96"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "inference_run_documents",
+        sa.Column("inference_run_id", sa.UUID(), nullable=False),
+        sa.Column("seq", sa.Integer(), nullable=False),
+        sa.Column("document_id", sa.UUID(), nullable=False),
+        sa.Column("event_time", sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(["inference_run_id"], ["inference_runs.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("inference_run_id", "seq"),
+    )
+
+    op.add_column("inference_runs", sa.Column("document_count", sa.Integer(), nullable=True))
+    op.add_column(
+        "inference_runs",
+        sa.Column("documents_done", sa.Integer(), server_default=sa.text("0"), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("inference_runs", "documents_done")
+    op.drop_column("inference_runs", "document_count")
+
+    op.drop_table("inference_run_documents")
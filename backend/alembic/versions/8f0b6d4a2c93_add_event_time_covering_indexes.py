@@ -0,0 +1,43 @@
+"""add event_time covering indexes
+
+Revision ID: 8f0b6d4a2c93
+Revises: 5a9c3e7d1b24
+Create Date: 2026-10-19 15:10:26.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8f0b6d4a2c93"
+down_revision: Union[str, Sequence[str], None] = "5a9c3e7d1b24"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # created on the partitioned parents, so every partition (and future ones) gets them
+    op.create_index(
+        "ix_documents_org_team_channel_event_time",
+        "documents",
+        ["org_id", "team_id", "channel", "event_time"],
+        unique=False,
+        postgresql_include=["id"],
+    )
+    op.create_index("ix_documents_org_event_time", "documents", ["org_id", "event_time"], unique=False)
+    op.create_index(
+        "ix_document_inference_document_event_time",
+        "document_inference",
+        ["document_id", "event_time", "created_at"],
+        unique=False,
+        postgresql_include=["sentiment", "calibrated_confidence"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_document_inference_document_event_time", table_name="document_inference")
+    op.drop_index("ix_documents_org_event_time", table_name="documents")
+    op.drop_index("ix_documents_org_team_channel_event_time", table_name="documents")
@@ -0,0 +1,63 @@
+"""add spike_candidates and alerts.rule_id
+
+Revision ID: 9b3e6f2d8c17
+Revises: 1d7c5b9e0a42
+Create Date: 2026-10-19 18:02:31.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9b3e6f2d8c17"
+down_revision: Union[str, Sequence[str], None] = "1d7c5b9e0a42"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "spike_candidates",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("metric", sa.String(length=64), nullable=False),
+        sa.Column("baseline_days", sa.Integer(), nullable=False),
+        sa.Column("min_docs", sa.Integer(), nullable=False),
+        sa.Column("org_id", sa.String(length=128), nullable=True),
+        sa.Column("team_id", sa.String(length=128), nullable=True),
+        sa.Column("channel", sa.String(length=64), nullable=True),
+        sa.Column("value", sa.Float(), nullable=False),
+        sa.Column("doc_count", sa.Integer(), nullable=False),
+        sa.Column("median", sa.Float(), nullable=False),
+        sa.Column("mad", sa.Float(), nullable=False),
+        sa.Column("z", sa.Float(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "day", "metric", "baseline_days", "min_docs", "org_id", "team_id", "channel",
+            name="uq_spike_candidates_segment",
+            postgresql_nulls_not_distinct=True,
+        ),
+    )
+    op.create_index("ix_spike_candidates_org_day", "spike_candidates", ["org_id", "day"], unique=False)
+
+    op.add_column("alerts", sa.Column("rule_id", sa.UUID(), nullable=True))
+    op.create_index("ix_alerts_day_rule_id", "alerts", ["day", "rule_id"], unique=False)
+
+    # rule-engine alerts already recorded their rule in the baseline payload
+    op.execute("""
+        UPDATE alerts
+        SET rule_id = CAST(baseline::jsonb ->> 'rule_id' AS uuid)
+        WHERE baseline::jsonb ->> 'rule_id' IS NOT NULL
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_alerts_day_rule_id", table_name="alerts")
+    op.drop_column("alerts", "rule_id")
+
+    op.drop_index("ix_spike_candidates_org_day", table_name="spike_candidates")
+    op.drop_table("spike_candidates")
@@ -0,0 +1,41 @@
+"""add task_outbox
+
+Revision ID: b3f1c7d28e45
+Revises: 7e2d9a4c6f10
+Create Date: 2026-10-19 21:12:09.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b3f1c7d28e45"
+down_revision: Union[str, Sequence[str], None] = "7e2d9a4c6f10"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "task_outbox",
+        sa.Column("id", sa.BigInteger(), sa.Identity(), nullable=False),
+        sa.Column("task_name", sa.String(length=255), nullable=False),
+        sa.Column("args", sa.JSON(), nullable=False),
+        sa.Column("kwargs", sa.JSON(), nullable=False),
+        sa.Column("org_id", sa.String(length=128), nullable=True),
+        sa.Column("queue", sa.String(length=64), nullable=True),
+        sa.Column("attempts", sa.Integer(), server_default=sa.text("0"), nullable=False),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("available_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_task_outbox_available_id", "task_outbox", ["available_at", "id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_task_outbox_available_id", table_name="task_outbox")
+    op.drop_table("task_outbox")
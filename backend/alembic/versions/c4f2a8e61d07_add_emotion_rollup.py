@@ -0,0 +1,77 @@
+"""add emotion_rollup
+
+Revision ID: c4f2a8e61d07
+Revises: 7b5d0e3f9a61
+Create Date: 2026-10-19 11:20:05.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c4f2a8e61d07"
+down_revision: Union[str, Sequence[str], None] = "7b5d0e3f9a61"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "emotion_rollup",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("grain", sa.String(length=16), nullable=False),
+        sa.Column("org_id", sa.String(length=128), nullable=True),
+        sa.Column("team_id", sa.String(length=128), nullable=True),
+        sa.Column("channel", sa.String(length=64), nullable=True),
+        sa.Column("emotion", sa.String(length=64), nullable=True),
+        sa.Column("doc_count", sa.Integer(), nullable=False),
+        sa.Column("negative_count", sa.Integer(), nullable=False),
+        sa.Column("avg_confidence", sa.Float(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "day", "grain", "org_id", "team_id", "channel", "emotion",
+            name="uq_emotion_rollup_segment",
+        ),
+    )
+    op.create_index(op.f("ix_emotion_rollup_day"), "emotion_rollup", ["day"], unique=False)
+    op.create_index("ix_emotion_rollup_grain_day_org", "emotion_rollup", ["grain", "day", "org_id"], unique=False)
+
+    # backfill existing days from emotion_daily so readers can switch over immediately
+    op.execute("""
+        INSERT INTO emotion_rollup (
+          id, day, grain, org_id, team_id, channel, emotion,
+          doc_count, negative_count, avg_confidence, created_at
+        )
+        SELECT
+          gen_random_uuid(),
+          day,
+          CASE GROUPING(team_id, channel, emotion)
+            WHEN 7 THEN 'org'
+            WHEN 3 THEN 'team'
+            WHEN 1 THEN 'channel'
+            ELSE 'org_emotion'
+          END,
+          org_id, team_id, channel, emotion,
+          SUM(doc_count)::int,
+          SUM(CASE WHEN sentiment = 'negative' THEN doc_count ELSE 0 END)::int,
+          (SUM(doc_count * COALESCE(avg_confidence, 0)) / NULLIF(SUM(doc_count), 0))::float,
+          NOW()
+        FROM emotion_daily
+        GROUP BY GROUPING SETS (
+          (day, org_id),
+          (day, org_id, team_id),
+          (day, org_id, team_id, channel),
+          (day, org_id, emotion)
+        )
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_emotion_rollup_grain_day_org", table_name="emotion_rollup")
+    op.drop_index(op.f("ix_emotion_rollup_day"), table_name="emotion_rollup")
+    op.drop_table("emotion_rollup")
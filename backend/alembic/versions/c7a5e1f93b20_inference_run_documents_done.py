@@ -0,0 +1,39 @@
+"""add inference_run_documents.done
+
+Revision ID: c7a5e1f93b20
+Revises: b3f1c7d28e45
+Create Date: 2026-10-19 22:31:40.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c7a5e1f93b20"
+down_revision: Union[str, Sequence[str], None] = "b3f1c7d28e45"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "inference_run_documents",
+        sa.Column("done", sa.Boolean(), server_default=sa.text("false"), nullable=False),
+    )
+    # members already inferred by their run; members of in-flight runs whose document
+    # is gone cannot be told apart and are picked up (and counted) again
+    op.execute("""
+        UPDATE inference_run_documents m SET done = true
+        WHERE EXISTS (
+          SELECT 1 FROM document_inference di
+          WHERE di.document_id = m.document_id AND di.event_time = m.event_time
+            AND di.inference_run_id = m.inference_run_id
+        )
+    """)
+
+
+def downgrade() -> None:
+    op.drop_column("inference_run_documents", "done")
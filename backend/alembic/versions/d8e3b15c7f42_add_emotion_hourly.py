@@ -0,0 +1,43 @@
+"""add emotion_hourly
+
+Revision ID: d8e3b15c7f42
+Revises: c4f2a8e61d07
+Create Date: 2026-10-19 12:41:37.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d8e3b15c7f42"
+down_revision: Union[str, Sequence[str], None] = "c4f2a8e61d07"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "emotion_hourly",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("hour", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("org_id", sa.String(length=128), nullable=True),
+        sa.Column("team_id", sa.String(length=128), nullable=True),
+        sa.Column("channel", sa.String(length=64), nullable=True),
+        sa.Column("doc_count", sa.Integer(), nullable=False),
+        sa.Column("negative_count", sa.Integer(), nullable=False),
+        sa.Column("avg_confidence", sa.Float(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("hour", "org_id", "team_id", "channel", name="uq_emotion_hourly_segment"),
+    )
+    op.create_index(op.f("ix_emotion_hourly_hour"), "emotion_hourly", ["hour"], unique=False)
+    op.create_index(op.f("ix_emotion_hourly_org_id"), "emotion_hourly", ["org_id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_emotion_hourly_org_id"), table_name="emotion_hourly")
+    op.drop_index(op.f("ix_emotion_hourly_hour"), table_name="emotion_hourly")
+    op.drop_table("emotion_hourly")
@@ -0,0 +1,58 @@
+"""sparse emotion_cumulative
+
+Revision ID: d9f3b6a41e72
+Revises: c7a5e1f93b20
+Create Date: 2026-10-19 23:48:05.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d9f3b6a41e72"
+down_revision: Union[str, Sequence[str], None] = "c7a5e1f93b20"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_emotion_cumulative_segment_day",
+        "emotion_cumulative",
+        ["org_id", "team_id", "channel", "source", "sentiment", "emotion", "day"],
+        unique=False,
+    )
+    # drop carried rows: a segment's totals only change on days it has emotion_daily rows
+    op.execute("""
+        DELETE FROM emotion_cumulative c
+        USING (
+          SELECT id, cum_doc_count, LAG(cum_doc_count) OVER (
+            PARTITION BY org_id, team_id, channel, source, sentiment, emotion ORDER BY day
+          ) AS prev_doc_count
+          FROM emotion_cumulative
+        ) carried
+        WHERE c.id = carried.id AND carried.cum_doc_count = carried.prev_doc_count
+    """)
+
+
+def downgrade() -> None:
+    # carry every segment's latest row onto each day its org has rows, as before
+    op.execute("""
+        INSERT INTO emotion_cumulative (
+          id, day, org_id, team_id, channel, source, sentiment, emotion,
+          cum_doc_count, cum_confidence_sum, created_at
+        )
+        SELECT gen_random_uuid(), d.day, s.org_id, s.team_id, s.channel, s.source, s.sentiment, s.emotion,
+               s.cum_doc_count, s.cum_confidence_sum, NOW()
+        FROM (SELECT DISTINCT org_id, day FROM emotion_cumulative) d
+        CROSS JOIN LATERAL (
+          SELECT DISTINCT ON (team_id, channel, source, sentiment, emotion) *
+          FROM emotion_cumulative c
+          WHERE c.org_id IS NOT DISTINCT FROM d.org_id AND c.day <= d.day
+          ORDER BY team_id, channel, source, sentiment, emotion, day DESC
+        ) s
+        WHERE s.day < d.day
+    """)
+    op.drop_index("ix_emotion_cumulative_segment_day", table_name="emotion_cumulative")
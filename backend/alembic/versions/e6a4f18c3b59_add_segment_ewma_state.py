@@ -0,0 +1,57 @@
+"""add segment_ewma_state
+
+Revision ID: e6a4f18c3b59
+Revises: 8f0b6d4a2c93
+Create Date: 2026-10-19 16:05:12.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e6a4f18c3b59"
+down_revision: Union[str, Sequence[str], None] = "8f0b6d4a2c93"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "segment_ewma_state",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("grain", sa.String(length=8), nullable=False),
+        sa.Column("alpha", sa.Float(), nullable=False),
+        sa.Column("org_id", sa.String(length=128), nullable=True),
+        sa.Column("team_id", sa.String(length=128), nullable=True),
+        sa.Column("channel", sa.String(length=64), nullable=True),
+        sa.Column("n", sa.Integer(), nullable=False),
+        sa.Column("mean", sa.Float(), nullable=False),
+        sa.Column("var", sa.Float(), nullable=False),
+        sa.Column("last_bucket", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("last_value", sa.Float(), nullable=False),
+        sa.Column("last_total", sa.Integer(), nullable=False),
+        sa.Column("last_mean", sa.Float(), nullable=True),
+        sa.Column("last_std", sa.Float(), nullable=True),
+        sa.Column("last_z", sa.Float(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        # NULL team/channel are real segments, so they must collide for ON CONFLICT (PG15+)
+        sa.UniqueConstraint(
+            "grain", "alpha", "org_id", "team_id", "channel",
+            name="uq_segment_ewma_state_segment",
+            postgresql_nulls_not_distinct=True,
+        ),
+    )
+    op.create_index(op.f("ix_segment_ewma_state_org_id"), "segment_ewma_state", ["org_id"], unique=False)
+    op.create_index(
+        "ix_segment_ewma_state_grain_bucket", "segment_ewma_state", ["grain", "alpha", "last_bucket"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_segment_ewma_state_grain_bucket", table_name="segment_ewma_state")
+    op.drop_index(op.f("ix_segment_ewma_state_org_id"), table_name="segment_ewma_state")
+    op.drop_table("segment_ewma_state")
@@ -0,0 +1,200 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Literal
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+
+from app.core.security import require_api_key, ClientContext
+from app.db.session import get_db
+from app.schemas.aggregates import EmotionWindowResponse, WindowSegmentOut, RollupDayOut, SpikeCandidateOut
+
+router = APIRouter(prefix="/aggregates")
+
+
+@router.get("/emotion-window", response_model=EmotionWindowResponse)
+def get_emotion_window(
+    start: date,
+    end: date,
+    team_id: str | None = None,
+    channel: str | None = None,
+    source: str | None = None,
+    sentiment: str | None = None,
+    emotion: str | None = None,
+    db: Session = Depends(get_db),
+    client: ClientContext = Depends(require_api_key),
+) -> EmotionWindowResponse:
+    """
+    Totals for an arbitrary [start, end] day range, answered from emotion_cumulative
+    as (running totals at end) - (running totals at start - 1): each segment's latest
+    row at or before those days, instead of a GROUP BY over emotion_daily.
+    """
+    if end < start:
+        raise HTTPException(status_code=422, detail="end must be on or after start")
+
+    # cumulative rows are written only on days a segment changed; report the latest one used
+    def as_of(d: date) -> date | None:
+        return db.execute(
+            text("SELECT MAX(day) FROM emotion_cumulative WHERE org_id = :org AND day <= :d"),
+            {"org": client.org_id, "d": d},
+        ).scalar()
+
+    hi_day = as_of(end)
+    lo_day = as_of(start - timedelta(days=1))
+
+    filters = ""
+    params: dict = {"org": client.org_id, "hi": end, "lo": start - timedelta(days=1)}
+    for col, val in (
+        ("team_id", team_id),
+        ("channel", channel),
+        ("source", source),
+        ("sentiment", sentiment),
+        ("emotion", emotion),
+    ):
+        if val:
+            filters += f" AND {col} = :{col}"
+            params[col] = val
+
+    def latest(bound: str, sign: str) -> str:
+        return f"""
+          SELECT DISTINCT ON (team_id, channel, source, sentiment, emotion)
+                 org_id, team_id, channel, source, sentiment, emotion,
+                 {sign}cum_doc_count AS n, {sign}cum_confidence_sum AS c
+          FROM emotion_cumulative
+          WHERE org_id = :org AND day <= :{bound} {filters}
+          ORDER BY team_id, channel, source, sentiment, emotion, day DESC
+        """
+
+    rows = db.execute(text(f"""
+        SELECT org_id, team_id, channel, source, sentiment, emotion,
+               SUM(n)::bigint AS doc_count,
+               SUM(c)::float AS confidence_sum
+        FROM (
+          ({latest("hi", "")})
+          UNION ALL
+          ({latest("lo", "-")})
+        ) w
+        GROUP BY org_id, team_id, channel, source, sentiment, emotion
+        HAVING SUM(n) > 0
+        ORDER BY doc_count DESC
+    """), params).fetchall()
+
+    return EmotionWindowResponse(
+        org_id=client.org_id,
+        start=start,
+        end=end,
+        end_as_of=hi_day,
+        start_as_of=lo_day,
+        items=[
+            WindowSegmentOut(
+                org_id=r.org_id,
+                team_id=r.team_id,
+                channel=r.channel,
+                source=r.source,
+                sentiment=r.sentiment,
+                emotion=r.emotion,
+                doc_count=int(r.doc_count),
+                avg_confidence=float(r.confidence_sum) / int(r.doc_count),
+            )
+            for r in rows
+        ],
+    )
+
+
+@router.get("/daily", response_model=list[RollupDayOut])
+def get_daily_rollup(
+    grain: Literal["org", "team", "channel", "org_emotion", "channel_emotion"] = "org",
+    days: int = Query(30, ge=1, le=365),
+    team_id: str | None = None,
+    channel: str | None = None,
+    db: Session = Depends(get_db),
+    client: ClientContext = Depends(require_api_key),
+) -> list[RollupDayOut]:
+    """
+    Daily series at a pre-aggregated grain from emotion_rollup; grain=org is one row per day.
+    """
+    since = (datetime.now(timezone.utc) - timedelta(days=days)).date()
+
+    sql = """
+        SELECT day, grain, org_id, team_id, channel, emotion, doc_count, negative_count, avg_confidence
+        FROM emotion_rollup
+        WHERE grain = :grain AND org_id = :org AND day >= :since
+    """
+    params: dict = {"grain": grain, "org": client.org_id, "since": since}
+    if team_id:
+        sql += " AND team_id = :team_id"
+        params["team_id"] = team_id
+    if channel:
+        sql += " AND channel = :channel"
+        params["channel"] = channel
+    sql += " ORDER BY day, team_id, channel, emotion"
+
+    rows = db.execute(text(sql), params).fetchall()
+    return [
+        RollupDayOut(
+            day=r.day,
+            grain=r.grain,
+            org_id=r.org_id,
+            team_id=r.team_id,
+            channel=r.channel,
+            emotion=r.emotion,
+            doc_count=int(r.doc_count),
+            negative_count=int(r.negative_count),
+            avg_confidence=r.avg_confidence,
+        )
+        for r in rows
+    ]
+
+
+@router.get("/spike-candidates", response_model=list[SpikeCandidateOut])
+def get_spike_candidates(
+    day: date | None = None,
+    baseline_days: int = Query(30, ge=1, le=365),
+    min_docs: int = Query(10, ge=1),
+    min_z: float | None = None,
+    limit: int = Query(200, ge=1, le=2000),
+    db: Session = Depends(get_db),
+    client: ClientContext = Depends(require_api_key),
+) -> list[SpikeCandidateOut]:
+    """
+    Per-segment robust z-scores materialized by the nightly spike-candidate stage
+    (default: the latest computed day), highest z first.
+    """
+    if day is None:
+        day = db.execute(
+            text("SELECT MAX(day) FROM spike_candidates WHERE org_id = :org"),
+            {"org": client.org_id},
+        ).scalar()
+        if day is None:
+            return []
+
+    sql = """
+        SELECT day, metric, baseline_days, min_docs, org_id, team_id, channel,
+               value, doc_count, median, mad, z
+        FROM spike_candidates
+        WHERE org_id = :org AND day = :day AND baseline_days = :baseline_days AND min_docs = :min_docs
+    """
+    params: dict = {"org": client.org_id, "day": day, "baseline_days": baseline_days, "min_docs": min_docs}
+    if min_z is not None:
+        sql += " AND z >= :min_z"
+        params["min_z"] = min_z
+    sql += " ORDER BY z DESC LIMIT :limit"
+    params["limit"] = limit
+
+    rows = db.execute(text(sql), params).fetchall()
+    return [
+        SpikeCandidateOut(
+            day=r.day,
+            metric=r.metric,
+            baseline_days=int(r.baseline_days),
+            min_docs=int(r.min_docs),
+            org_id=r.org_id,
+            team_id=r.team_id,
+            channel=r.channel,
+            value=float(r.value),
+            doc_count=int(r.doc_count),
+            median=float(r.median),
+            mad=float(r.mad),
+            z=float(r.z),
+        )
+        for r in rows
+    ]
@@ -2,13 +2,14 @@ from fastapi import APIRouter, Depends, Query, HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import desc
 
-from app.core.security import require_api_key
+from app.core.security import require_api_key, ClientContext
 from app.db.session import get_db
 from app.db.models.aggregations import AlertEvent
 from app.db.models.alerts import AlertEvidence
 from app.db.models.document import Document
 from app.db.models.inference import DocumentInference
-from app.schemas.alerts import AlertOut, AlertDetail, EvidenceOut
+from app.schemas.alerts import AlertOut, AlertDetail, EvidenceOut, BacktestRequest, BacktestResponse, BacktestAlertOut
+from app.tasks.alerting import backtest_rule
 
 router = APIRouter(prefix="/alerts", dependencies=[Depends(require_api_key)])
 
@@ -43,11 +44,43 @@ def list_alerts(
             value=float(a.value),
             baseline=a.baseline or {},
             message=a.message,
+            rule_id=str(a.rule_id) if a.rule_id else None,
         )
         for a in rows
     ]
 
 
+@router.post("/backtest", response_model=BacktestResponse)
+def backtest(
+    payload: BacktestRequest,
+    db: Session = Depends(get_db),
+    client: ClientContext = Depends(require_api_key),
+):
+    """Alerts a candidate rule definition would have raised for the caller's org; writes nothing."""
+    if (payload.end - payload.start).days > 366:
+        raise HTTPException(status_code=422, detail="Backtest range is limited to one year")
+    try:
+        alerts = backtest_rule(
+            db,
+            payload.definition,
+            payload.start,
+            payload.end,
+            org_id=client.org_id,
+            team_id=payload.team_id,
+            channel=payload.channel,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    return BacktestResponse(
+        start=payload.start,
+        end=payload.end,
+        definition=payload.definition,
+        alert_count=len(alerts),
+        alerts=[BacktestAlertOut(**a) for a in alerts],
+    )
+
+
 @router.get("/{alert_id}", response_model=AlertDetail)
 def get_alert(alert_id: str, db: Session = Depends(get_db)):
     alert = db.get(AlertEvent, alert_id)
@@ -97,6 +130,7 @@ def get_alert(alert_id: str, db: Session = Depends(get_db)):
         value=float(alert.value),
         baseline=alert.baseline or {},
         message=alert.message,
+        rule_id=str(alert.rule_id) if alert.rule_id else None,
     )
 
     return AlertDetail(alert=alert_out, evidence=evidence_out)
\ No newline at end of file
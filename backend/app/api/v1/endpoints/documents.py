@@ -25,7 +25,7 @@ def list_documents(
     external_id: str | None = None,
     tag: str | None = None,
 
-    # time window on the event timestamp (not created_at)
+    # time window on event time (timestamp, falling back to created_at), not ingestion time
     since: datetime | None = None,
     until: datetime | None = None,
 ):
@@ -46,9 +46,9 @@ def list_documents(
         # If you later switch tags to ARRAY(Text), we can make this clean.
         q = q.filter(func.cast(Document.tags, func.TEXT).ilike(f'%"{tag}"%'))
     if since:
-        q = q.filter(Document.timestamp >= since)
+        q = q.filter(Document.event_time >= since)
     if until:
-        q = q.filter(Document.timestamp <= until)
+        q = q.filter(Document.event_time <= until)
 
     total = q.order_by(None).count()
 
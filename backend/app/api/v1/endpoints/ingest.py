@@ -1,20 +1,38 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 
-from app.core.security import require_api_key
+from app.core import fair_queue, outbox
+from app.core.config import settings
+from app.core.security import require_api_key, ClientContext
 from app.core.pii import redact_pii
 from app.db.session import get_db
 from app.db.models.document import Document
 from app.schemas.ingestion import IngestRequest, IngestResponse, IngestResponseItem
-from app.db.models.inference import InferenceRun
+from app.db.models.inference import InferenceRun, InferenceRunDocument
 from app.tasks.infer_docs import run_emotion_inference
 
 router = APIRouter(prefix="/ingest", dependencies=[Depends(require_api_key)])
 
 @router.post("/tickets", response_model=IngestResponse)
-def ingest_tickets(payload: IngestRequest, db: Session = Depends(get_db)) -> IngestResponse:
+def ingest_tickets(
+    payload: IngestRequest,
+    db: Session = Depends(get_db),
+    client: ClientContext = Depends(require_api_key),
+) -> IngestResponse:
+    # admission control before anything is written: a full backlog for this org is a 429
+    if payload.enqueue_inference:
+        try:
+            fair_queue.admit(client.org_id)
+        except fair_queue.AdmissionRejected as e:
+            raise HTTPException(
+                status_code=429,
+                detail=f"Inference backlog full ({e.pending} jobs pending)",
+                headers={"Retry-After": "30"},
+            )
+
     out_items: list[IngestResponseItem] = []
-    doc_ids: list[str] = []  # <-- collect document IDs for the worker
+    members: list[dict] = []  # run membership rows for the worker (seq order = ingest order)
 
     for item in payload.items:
         redaction = redact_pii(item.text)
@@ -33,7 +51,7 @@ def ingest_tickets(payload: IngestRequest, db: Session = Depends(get_db)) -> Ing
         db.add(doc)
         db.flush()  # assigns doc.id
 
-        doc_ids.append(str(doc.id))  # <-- add doc id for inference
+        members.append({"seq": len(members), "document_id": doc.id, "event_time": doc.event_time})
 
         out_items.append(
             IngestResponseItem(
@@ -45,21 +63,33 @@ def ingest_tickets(payload: IngestRequest, db: Session = Depends(get_db)) -> Ing
 
     inference_run_id: str | None = None
 
-    # If requested, create an inference run record (queued)
+    # If requested, create an inference run record (queued) and its membership
     if payload.enqueue_inference:
         run = InferenceRun(
             model_name="emotion",
             model_version="v1",
             status="queued",
+            document_count=len(members),
         )
         db.add(run)
         db.flush()  # assigns run.id
         inference_run_id = str(run.id)
+        db.execute(insert(InferenceRunDocument), [{**m, "inference_run_id": run.id} for m in members])
 
-    db.commit()  # commit docs + run before the worker reads them
+        # One job per seq range, carrying only (run id, start, end), written to the outbox
+        # in this transaction; the relay hands them to the caller's fair-queue lane. Large
+        # batches go to the bulk inference workers so interactive ingest keeps its latency.
+        bulk = len(members) >= settings.inference_bulk_min_docs
+        chunk = settings.inference_chunk_size
+        for lo in range(0, len(members), chunk):
+            outbox.add(
+                db,
+                run_emotion_inference.name,
+                [inference_run_id, lo, min(lo + chunk, len(members))],
+                org_id=client.org_id,
+                queue="inference_bulk" if bulk else None,
+            )
 
-    # Enqueue celery job after commit
-    if payload.enqueue_inference and inference_run_id:
-        run_emotion_inference.delay(inference_run_id, doc_ids)
+    db.commit()  # docs, run, membership and its dispatches commit together
 
     return IngestResponse(inserted=len(out_items), items=out_items)
\ No newline at end of file
@@ -0,0 +1,14 @@
+from dataclasses import asdict
+from fastapi import APIRouter, Depends
+
+from app.core import fair_queue
+from app.core.security import require_api_key, ClientContext
+from app.schemas.queue import TenantQueueStatsOut
+
+router = APIRouter(prefix="/queue")
+
+
+@router.get("/stats", response_model=TenantQueueStatsOut)
+def get_queue_stats(client: ClientContext = Depends(require_api_key)) -> TenantQueueStatsOut:
+    """Depth, concurrency and wait times of the caller's org in the fair queue."""
+    return TenantQueueStatsOut(**asdict(fair_queue.tenant_stats(client.org_id)))
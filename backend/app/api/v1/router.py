@@ -9,6 +9,8 @@ from app.api.v1.endpoints.tickets import router as tickets_router
 from app.api.v1.endpoints.orgs import router as orgs_router
 from app.api.v1.endpoints.usage import router as usage_router
 from app.api.v1.endpoints.admin_auth import router as admin_auth_router
+from app.api.v1.endpoints.aggregates import router as aggregates_router
+from app.api.v1.endpoints.queue import router as queue_router
 
 api_router = APIRouter()
 
@@ -20,4 +22,6 @@ api_router.include_router(alerts_router, tags=["alerts"])
 api_router.include_router(tickets_router, tags=["tickets"])
 api_router.include_router(orgs_router, tags=["orgs"])
 api_router.include_router(usage_router, tags=["usage"])
-api_router.include_router(admin_auth_router, tags=["admin"])
\ No newline at end of file
+api_router.include_router(admin_auth_router, tags=["admin"])
+api_router.include_router(aggregates_router, tags=["aggregates"])
+api_router.include_router(queue_router, tags=["queue"])
\ No newline at end of file
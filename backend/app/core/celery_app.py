@@ -1,6 +1,9 @@
 from celery import Celery
 from app.core.config import settings
+from app.db.session import configure_engine
 from celery.schedules import crontab
+from celery.signals import worker_init
+from kombu import Queue
 
 celery_app = Celery(
     "eadss",
@@ -8,12 +11,88 @@ celery_app = Celery(
     backend=settings.redis_url,
 )
 
+# One queue per task class, each consumed by its own worker (docker-compose: worker-<queue>),
+# so a long BERTopic fit or nightly rollup never sits in front of interactive inference.
+QUEUE_POLICIES = {
+    # ingest-triggered inference for small batches: short, latency sensitive
+    "inference": {"acks_late": True, "soft_time_limit": 90, "time_limit": 120},
+    # large ingest batches / backfills (fair_queue routes them here by size)
+    "inference_bulk": {"acks_late": True, "soft_time_limit": 1500, "time_limit": 1800},
+    # nightly pipeline, spike detection, rule engine, maintenance
+    "analytics": {"acks_late": True, "soft_time_limit": 3000, "time_limit": 3600},
+    # topic modelling
+    "ml_heavy": {"acks_late": True, "soft_time_limit": 3 * 3600, "time_limit": 3 * 3600 + 300},
+}
+
+TASK_QUEUES = {
+    "infer_docs.": "inference",
+    "fair_queue.": "inference",
+    "aggregations.": "analytics",
+    "alerting.": "analytics",
+    "pipeline.": "analytics",
+    "maintenance.": "analytics",
+    "topic_jobs.": "ml_heavy",
+}
+
+# Redis broker priorities: 0 is the highest; tasks default to the middle
+PRIORITY_HIGH = 0
+PRIORITY_DEFAULT = 5
+
+
+def queue_for(task_name: str) -> str:
+    for prefix, queue in TASK_QUEUES.items():
+        if task_name.startswith(prefix):
+            return queue
+    return "analytics"
+
+
+def queue_options(queue: str | None) -> dict:
+    """
+    send_task options for a message sent to `queue` rather than its task's route: the
+    queue plus that queue's time limits, which the worker applies to the message over
+    the task's annotated ones. Empty when there is no override.
+    """
+    if queue is None:
+        return {}
+    policy = QUEUE_POLICIES[queue]
+    return {"queue": queue, "soft_time_limit": policy["soft_time_limit"], "time_limit": policy["time_limit"]}
+
+
+class QueuePolicyAnnotation:
+    """
+    task_annotations hook: each task gets the acks_late / time limits of the queue its
+    name routes to. Messages sent elsewhere carry their queue's limits (queue_options).
+    """
+
+    def annotate(self, task):
+        return dict(QUEUE_POLICIES[queue_for(task.name)])
+
+    def annotate_any(self):
+        return None
+
+
 celery_app.conf.update(
     task_serializer="json",
     accept_content=["json"],
     result_serializer="json",
     timezone="UTC",
     enable_utc=True,
+    task_queues=[Queue(name) for name in QUEUE_POLICIES],
+    task_default_queue="analytics",
+    task_routes={f"{prefix}*": {"queue": queue} for prefix, queue in TASK_QUEUES.items()},
+    task_annotations=[QueuePolicyAnnotation()],
+    task_default_priority=PRIORITY_DEFAULT,
+    # acks_late: a task is only acknowledged when done; redelivered if its worker dies.
+    # Prefetch is set per worker (--prefetch-multiplier); 1 keeps queued work with the broker.
+    worker_prefetch_multiplier=1,
+    task_reject_on_worker_lost=True,
+    broker_transport_options={
+        "priority_steps": list(range(10)),
+        "sep": ":",
+        "queue_order_strategy": "priority",
+        # must exceed the longest time_limit, or unacked long tasks are redelivered
+        "visibility_timeout": 4 * 3600,
+    },
 )
 
 celery_app.conf.beat_schedule = {
@@ -22,28 +101,56 @@ celery_app.conf.beat_schedule = {
         "schedule": crontab(minute=0, hour=2),  # 02:00 UTC daily
         "args": ("demo", None, 14, 20),
     },
-    "agg-emotion-daily-0010": {
-        "task": "aggregations.compute_emotion_daily",
+    "nightly-pipeline-0010": {
+        "task": "pipeline.run_nightly",
         "schedule": crontab(minute=10, hour=0),  # 00:10 UTC daily
-        "args": (),  # yesterday by default
+        "args": (),  # yesterday; each stage starts when its inputs are done (app.tasks.pipeline)
+    },
+    "agg-emotion-hourly-15m": {
+        "task": "aggregations.compute_emotion_hourly",
+        "schedule": crontab(minute="*/15"),
+        "args": (),  # current + previous hour
+    },
+    "detect-intraday-spikes-15m": {
+        "task": "aggregations.detect_intraday_spikes",
+        "schedule": crontab(minute="5-59/15"),  # 5 min after each hourly refresh
+        "args": (),  # last completed hour
+    },
+    "ewma-state-hourly": {
+        "task": "aggregations.update_ewma_state",
+        "schedule": crontab(minute=10),  # after the :00 hourly refresh moved its lookback on
+        "args": ("hour",),  # latest hour no longer in the emotion_hourly lookback (final)
+    },
+    "ewma-rules-hourly": {
+        "task": "alerting.run_hourly_rules",
+        "schedule": crontab(minute=15),  # hour-grain ewma_spike rules, after the :10 state update
+        "args": (),  # the hour folded in at :10
     },
-    "agg-emotion-rolling-0020": {
-        "task": "aggregations.compute_emotion_rolling",
-        "schedule": crontab(minute=20, hour=0),  # after daily
-        "args": (),  # yesterday, windows [7,30,90]
+    "fair-queue-dispatch-10s": {
+        "task": "fair_queue.dispatch",
+        "schedule": 10.0,  # seconds; completions dispatch immediately, this reclaims expired leases
+        "args": (),
     },
-    "detect-risk-spikes-0030": {
-        "task": "aggregations.detect_risk_spikes",
-        "schedule": crontab(minute=30, hour=0),
-        "args": (),  # yesterday by default
+    "ensure-partitions-0100": {
+        "task": "maintenance.ensure_partitions",
+        "schedule": crontab(minute=0, hour=1),  # creates next months' partitions ahead of time
+        "args": (),
     },
-    "alert-rule-engine-0040": {
-        "task": "alerting.run_rules",
-        "schedule": crontab(minute=40, hour=0),  # after aggregates + spike detection
-        "args": (),  # yesterday
+    "drop-expired-partitions-0130-1st": {
+        "task": "maintenance.drop_expired_partitions",
+        "schedule": crontab(minute=30, hour=1, day_of_month="1"),
+        "args": (),
     },
 }
 
+
+@worker_init.connect
+def _worker_db_pool(**_kwargs) -> None:
+    # runs in the worker's main process before the pool starts: prefork children inherit
+    # this (empty) worker-sized engine and reset it after fork (app.db.session)
+    configure_engine("worker")
+
+
 # Ensure tasks are discovered/registered
 celery_app.autodiscover_tasks(["app.tasks"])
 
@@ -54,4 +161,10 @@ import app.tasks.topic_jobs  # noqa: F401
 
 import app.tasks.aggregations  # noqa: F401
 
-import app.tasks.alerting  # noqa: F401
\ No newline at end of file
+import app.tasks.alerting  # noqa: F401
+
+import app.tasks.maintenance  # noqa: F401
+
+import app.tasks.pipeline  # noqa: F401
+
+import app.tasks.fair_queue  # noqa: F401
\ No newline at end of file
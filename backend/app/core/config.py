@@ -8,4 +8,57 @@ class Settings(BaseSettings):
     redis_url: str
     api_key: str = "dev-local-key"
 
+    # monthly range partitions of documents / document_inference (by event_time)
+    partition_months_ahead: int = 3
+    document_retention_months: int = 24
+
+    # default "compute" of risk_spike rules: "python" (read from the materialized spike_candidates)
+    # or "sql" (median/MAD per rule in Postgres); also where spike_candidates is materialized
+    spike_detection_mode: str = "python"
+
+    # EWMA anomaly state: smoothing factor always maintained (ewma_spike rules may add others)
+    ewma_alpha: float = 0.1
+
+    # emotion_hourly is rebuilt for this many trailing hours (late documents); older hours
+    # are final, and only those are folded into hour-grain EWMA state
+    emotion_hourly_lookback_hours: int = 2
+
+    # rule engine: commit after every N alerts (with their evidence/audit rows); 0 = once per run
+    rule_engine_commit_every: int = 0
+
+    # nightly pipeline: retries of one tenant's failed stage (seconds between attempts)
+    pipeline_stage_max_retries: int = 3
+    pipeline_stage_retry_delay: int = 60
+
+    # per-tenant fair queue (app.core.fair_queue): concurrency per org, backlog admitted per
+    # org before API calls get 429, weighted round-robin weights (org_id -> weight, default 1)
+    fair_queue_max_inflight_per_org: int = 4
+    fair_queue_max_pending_per_org: int = 500
+    fair_queue_weights: dict[str, int] = {}
+    fair_queue_dispatch_batch: int = 64
+    fair_queue_lease_seconds: int = 3600  # a dispatched job's slot is reclaimed after this
+
+    # ingest batches with at least this many documents go to the inference_bulk queue
+    inference_bulk_min_docs: int = 200
+
+    # inference runs: members per task message (seq range) / per keyset page inside a task
+    inference_chunk_size: int = 500
+    inference_page_size: int = 200
+
+    # task outbox relay (python -m app.core.outbox): entries per publish batch, idle poll
+    # interval (seconds), cap on the retry backoff after a failed publish
+    outbox_batch_size: int = 100
+    outbox_poll_interval: float = 0.2
+    outbox_max_backoff_seconds: int = 60
+
+    # connection pools, per process: an API process holds up to pool_size + max_overflow
+    # connections, and so does every worker child (one task at a time). Size them so that
+    # processes x (pool_size + max_overflow) stays under Postgres max_connections.
+    db_api_pool_size: int = 5
+    db_api_max_overflow: int = 10
+    db_api_pool_recycle: int = 1800  # seconds; -1 = never
+    db_worker_pool_size: int = 2
+    db_worker_max_overflow: int = 2
+    db_worker_pool_recycle: int = 1800
+
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,254 @@
+"""
+Per-tenant fair queuing in front of Celery.
+
+Tenant work is not sent to the broker directly: submit() appends it to the org's own
+Redis list, and dispatch() moves jobs to Celery with smooth weighted round-robin across
+orgs, never exceeding an org's concurrency limit. A large backfill therefore only
+queues behind itself, while other tenants' jobs are interleaved ahead of it.
+
+Keys (all under "fq:"):
+  fq:q:<org>         pending jobs (JSON), FIFO
+  fq:active          orgs with pending jobs
+  fq:inflight:<org>  dispatched job ids scored by dispatch time (a lease; stale ones expire)
+  fq:credit          smooth-WRR credit per org, carried across dispatch calls
+  fq:stats:<org>     dispatched / rejected / publish_failed counters and wait times
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import lru_cache
+import json
+import logging
+import time
+import uuid
+
+import redis
+
+from app.core.celery_app import celery_app, queue_options
+from app.core.config import settings
+
+log = logging.getLogger(__name__)
+
+_PREFIX = "fq:"
+ORG_HEADER = "fair_queue_org"  # message header carried by dispatched tasks
+
+
+class AdmissionRejected(Exception):
+    """The org already has fair_queue_max_pending_per_org jobs waiting."""
+
+    def __init__(self, org_id: str, pending: int):
+        super().__init__(f"org {org_id!r} has {pending} pending jobs")
+        self.org_id = org_id
+        self.pending = pending
+
+
+@dataclass(frozen=True)
+class TenantQueueStats:
+    org_id: str
+    pending: int
+    inflight: int
+    max_inflight: int
+    weight: int
+    oldest_wait_ms: int | None
+    dispatched: int
+    rejected: int
+    avg_wait_ms: float | None
+    max_wait_ms: int | None
+
+
+@lru_cache(maxsize=1)
+def _redis() -> redis.Redis:
+    return redis.Redis.from_url(settings.redis_url, decode_responses=True)
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def _pending_key(org_id: str) -> str:
+    # the org's pending job list (Redis); not the Celery queue a job is routed to
+    return f"{_PREFIX}q:{org_id}"
+
+
+def weight(org_id: str) -> int:
+    return max(1, int(settings.fair_queue_weights.get(org_id, 1)))
+
+
+def _live_inflight(r: redis.Redis, org_id: str, now_ms: int) -> int:
+    """In-flight count after expiring leases of jobs whose worker never reported back."""
+    key = f"{_PREFIX}inflight:{org_id}"
+    r.zremrangebyscore(key, "-inf", now_ms - settings.fair_queue_lease_seconds * 1000)
+    return r.zcard(key)
+
+
+def admit(org_id: str) -> None:
+    """Admission control: raises AdmissionRejected when the org's backlog is full."""
+    r = _redis()
+    pending = r.llen(_pending_key(org_id))
+    if pending >= settings.fair_queue_max_pending_per_org:
+        r.hincrby(f"{_PREFIX}stats:{org_id}", "rejected", 1)
+        raise AdmissionRejected(org_id, pending)
+
+
+def submit(
+    task_name: str,
+    org_id: str,
+    args: list | None = None,
+    kwargs: dict | None = None,
+    queue: str | None = None,
+) -> str:
+    """
+    Queues a task for `org_id` and triggers a dispatch; callers check admit() before
+    doing the work the job depends on. `queue` overrides the task's Celery route.
+    Returns the job id (also the Celery task id).
+    """
+    return submit_many([(task_name, org_id, args, kwargs, queue)])[0]
+
+
+def submit_many(jobs: list[tuple[str, str, list | None, dict | None, str | None]]) -> list[str]:
+    """submit() for a batch of (task_name, org_id, args, kwargs, queue): one round trip, one dispatch."""
+    r = _redis()
+    now_ms = _now_ms()
+    job_ids = []
+    pipe = r.pipeline()
+    for task_name, org_id, args, kwargs, queue in jobs:
+        job_id = str(uuid.uuid4())
+        job = {
+            "id": job_id,
+            "task": task_name,
+            "args": args or [],
+            "kwargs": kwargs or {},
+            "queue": queue,
+            "enqueued_at": now_ms,
+        }
+        pipe.rpush(_pending_key(org_id), json.dumps(job))
+        pipe.sadd(f"{_PREFIX}active", org_id)
+        job_ids.append(job_id)
+    pipe.execute()
+
+    dispatch()
+    return job_ids
+
+
+def dispatch(max_jobs: int | None = None) -> int:
+    """
+    Sends up to max_jobs (default fair_queue_dispatch_batch) pending jobs to Celery.
+    Each pick adds every eligible org's weight to its credit and takes the org with the
+    most credit, which then pays back the total weight (smooth weighted round-robin).
+    An org is eligible while it has pending jobs and free concurrency. Only one
+    dispatcher runs at a time; concurrent callers return 0.
+    """
+    r = _redis()
+    lock = r.lock(f"{_PREFIX}dispatch-lock", timeout=30, blocking=False)
+    if not lock.acquire():
+        return 0
+    try:
+        budget = settings.fair_queue_dispatch_batch if max_jobs is None else max_jobs
+        now_ms = _now_ms()
+        credit = {k: int(v) for k, v in r.hgetall(f"{_PREFIX}credit").items()}
+
+        free: dict[str, int] = {}
+        for org_id in r.smembers(f"{_PREFIX}active"):
+            if r.llen(_pending_key(org_id)) == 0:
+                r.srem(f"{_PREFIX}active", org_id)
+                credit.pop(org_id, None)
+                continue
+            slots = settings.fair_queue_max_inflight_per_org - _live_inflight(r, org_id, now_ms)
+            if slots > 0:
+                free[org_id] = slots
+
+        sent = 0
+        while sent < budget and free:
+            total = sum(weight(o) for o in free)
+            for o in free:
+                credit[o] = credit.get(o, 0) + weight(o)
+            org_id = max(free, key=lambda o: (credit[o], o))
+            credit[org_id] -= total
+
+            raw = r.lpop(_pending_key(org_id))
+            if raw is None:
+                del free[org_id]
+                continue
+            if not _send(r, org_id, raw, now_ms):
+                # the job is back at the head of its list; retry the org on the next dispatch
+                credit[org_id] += total
+                del free[org_id]
+                continue
+            sent += 1
+
+            free[org_id] -= 1
+            if free[org_id] == 0 or r.llen(_pending_key(org_id)) == 0:
+                del free[org_id]
+
+        pipe = r.pipeline()
+        pipe.delete(f"{_PREFIX}credit")
+        if credit:
+            pipe.hset(f"{_PREFIX}credit", mapping=credit)
+        pipe.execute()
+        return sent
+    finally:
+        lock.release()
+
+
+def _send(r: redis.Redis, org_id: str, raw: str, now_ms: int) -> bool:
+    """
+    Publishes a popped job. The lease is taken first, so a worker finishing before the
+    stats are written still frees its slot; if the publish fails the lease is dropped
+    and the job pushed back to the head of the org's list. Returns whether it was sent.
+    """
+    job = json.loads(raw)
+    inflight_key = f"{_PREFIX}inflight:{org_id}"
+    stats_key = f"{_PREFIX}stats:{org_id}"
+    r.zadd(inflight_key, {job["id"]: now_ms})
+    try:
+        celery_app.send_task(
+            job["task"],
+            args=job["args"],
+            kwargs=job["kwargs"],
+            task_id=job["id"],
+            headers={ORG_HEADER: org_id},
+            **queue_options(job.get("queue")),
+        )
+    except Exception:
+        pipe = r.pipeline()
+        pipe.lpush(_pending_key(org_id), raw)
+        pipe.zrem(inflight_key, job["id"])
+        pipe.hincrby(stats_key, "publish_failed", 1)
+        pipe.execute()
+        log.exception("publishing job %s (%s) for org %r failed; requeued", job["id"], job["task"], org_id)
+        return False
+
+    wait_ms = max(0, now_ms - int(job["enqueued_at"]))
+    # only the lock holder writes wait stats, so read-compare-set of the max is safe
+    max_wait = max(wait_ms, int(r.hget(stats_key, "wait_ms_max") or 0))
+    pipe = r.pipeline()
+    pipe.hincrby(stats_key, "dispatched", 1)
+    pipe.hincrby(stats_key, "wait_ms_total", wait_ms)
+    pipe.hset(stats_key, mapping={"wait_ms_last": wait_ms, "wait_ms_max": max_wait})
+    pipe.execute()
+    return True
+
+
+def release(org_id: str, job_id: str) -> None:
+    """Frees the org's concurrency slot held by a finished job."""
+    _redis().zrem(f"{_PREFIX}inflight:{org_id}", job_id)
+
+
+def tenant_stats(org_id: str) -> TenantQueueStats:
+    r = _redis()
+    now_ms = _now_ms()
+    head = r.lindex(_pending_key(org_id), 0)
+    stats = r.hgetall(f"{_PREFIX}stats:{org_id}")
+    dispatched = int(stats.get("dispatched", 0))
+    return TenantQueueStats(
+        org_id=org_id,
+        pending=r.llen(_pending_key(org_id)),
+        inflight=_live_inflight(r, org_id, now_ms),
+        max_inflight=settings.fair_queue_max_inflight_per_org,
+        weight=weight(org_id),
+        oldest_wait_ms=(now_ms - int(json.loads(head)["enqueued_at"])) if head else None,
+        dispatched=dispatched,
+        rejected=int(stats.get("rejected", 0)),
+        avg_wait_ms=(int(stats.get("wait_ms_total", 0)) / dispatched) if dispatched else None,
+        max_wait_ms=int(stats["wait_ms_max"]) if "wait_ms_max" in stats else None,
+    )
@@ -0,0 +1,106 @@
+"""
+Transactional outbox for task dispatch.
+
+Request handlers call outbox.add() inside their own transaction instead of talking to
+the broker, so the dispatch commits (or rolls back) with the rows it refers to and the
+request never waits on Redis. The relay (python -m app.core.outbox) claims pending rows
+in id order with FOR UPDATE SKIP LOCKED, publishes them in batches and deletes them in
+the same transaction. Delivery is at-least-once: a relay that dies between publishing
+and committing republishes the batch, so relayed tasks must be idempotent.
+"""
+from __future__ import annotations
+
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core import fair_queue
+from app.core.celery_app import celery_app, queue_options
+from app.core.config import settings
+from app.db.models.outbox import TaskOutbox
+from app.db.session import SessionLocal, configure_engine
+
+log = logging.getLogger(__name__)
+
+
+def add(
+    db: Session,
+    task_name: str,
+    args: list | None = None,
+    kwargs: dict | None = None,
+    org_id: str | None = None,
+    queue: str | None = None,
+) -> None:
+    """Records a dispatch in the caller's transaction; org_id routes it through the fair queue."""
+    db.add(TaskOutbox(task_name=task_name, args=args or [], kwargs=kwargs or {}, org_id=org_id, queue=queue))
+
+
+def relay_batch(db: Session, limit: int | None = None) -> int:
+    """
+    Publishes up to `limit` pending entries and deletes them. A failed publish leaves
+    the batch in place with attempts / last_error set and a backoff on available_at.
+    Returns the number of entries published.
+    """
+    rows = db.execute(text("""
+        SELECT id, task_name, args, kwargs, org_id, queue, attempts
+        FROM task_outbox
+        WHERE available_at <= now()
+        ORDER BY id
+        LIMIT :limit
+        FOR UPDATE SKIP LOCKED
+    """), {"limit": limit or settings.outbox_batch_size}).fetchall()
+    if not rows:
+        return 0
+
+    ids = [r.id for r in rows]
+    try:
+        fair = [(r.task_name, r.org_id, r.args, r.kwargs, r.queue) for r in rows if r.org_id is not None]
+        if fair:
+            fair_queue.submit_many(fair)
+        for r in rows:
+            if r.org_id is None:
+                celery_app.send_task(r.task_name, args=r.args, kwargs=r.kwargs, **queue_options(r.queue))
+    except Exception as e:
+        db.rollback()
+        delay = min(settings.outbox_max_backoff_seconds, 2 ** min(rows[0].attempts, 16))
+        db.execute(text("""
+            UPDATE task_outbox
+            SET attempts = attempts + 1, last_error = :error, available_at = :available_at
+            WHERE id = ANY(:ids)
+        """), {
+            "ids": ids,
+            "error": repr(e),
+            "available_at": datetime.now(timezone.utc) + timedelta(seconds=delay),
+        })
+        db.commit()
+        log.warning("outbox publish failed for %d entries, retrying in %ss: %r", len(ids), delay, e)
+        return 0
+
+    db.execute(text("DELETE FROM task_outbox WHERE id = ANY(:ids)"), {"ids": ids})
+    db.commit()
+    return len(ids)
+
+
+def run_relay() -> None:
+    """Relay loop: drains full batches back to back, polls every outbox_poll_interval when idle."""
+    log.info("outbox relay started")
+    while True:
+        db = SessionLocal()
+        try:
+            published = relay_batch(db)
+        except Exception:
+            log.exception("outbox relay iteration failed")
+            published = 0
+        finally:
+            db.close()
+        if published < settings.outbox_batch_size:
+            time.sleep(settings.outbox_poll_interval)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    configure_engine("worker")
+    run_relay()
@@ -1,24 +1,31 @@
 from app.db.models.document import Document
 from app.db.models.audit_log import AuditLog
-from app.db.models.inference import InferenceRun, DocumentInference
+from app.db.models.inference import InferenceRun, InferenceRunDocument, DocumentInference
 from app.db.models.topic import Topic
 from app.db.models.document_topic import DocumentTopic
-from app.db.models.aggregations import EmotionDaily, EmotionRolling, AlertEvent
+from app.db.models.aggregations import EmotionDaily, EmotionRolling, EmotionHourly, EmotionRollup, EmotionCumulative, SegmentEwmaState, SpikeCandidateStat, AlertEvent
 from app.db.models.alerts import AlertRule, AlertEvidence
 from app.db.models.api_key import ApiKey
 from app.db.models.org import Organization
 from app.db.models.usage import UsageEvent
 from app.db.models.admin_user import AdminUser
 from app.db.models.admin_membership import AdminMembership
+from app.db.models.outbox import TaskOutbox
 
 __all__ = ["Document", 
            "AuditLog", 
            "InferenceRun", 
+           "InferenceRunDocument",
            "DocumentInference", 
            "Topic", 
            "DocumentTopic", 
            "EmotionDaily", 
            "EmotionRolling", 
+           "EmotionHourly",
+           "EmotionRollup",
+           "EmotionCumulative",
+           "SegmentEwmaState",
+           "SpikeCandidateStat",
            "AlertEvent", 
            "AlertRule", 
            "AlertEvidence",
@@ -26,5 +33,6 @@ __all__ = ["Document",
            "Organization",
            "UsageEvent",
            "AdminUser",
-           "AdminMembership"
+           "AdminMembership",
+           "TaskOutbox"
            ]
\ No newline at end of file
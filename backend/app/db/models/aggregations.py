@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime, date
 
-from sqlalchemy import String, DateTime, Integer, Float, Date, JSON, UniqueConstraint, Index
+from sqlalchemy import String, DateTime, Integer, BigInteger, Float, Date, JSON, UniqueConstraint, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column
 
@@ -32,7 +32,8 @@ class EmotionDaily(Base):
     __table_args__ = (
         UniqueConstraint(
             "day", "org_id", "team_id", "channel", "source", "sentiment", "emotion",
-            name="uq_emotion_daily_segment"
+            name="uq_emotion_daily_segment",
+            postgresql_nulls_not_distinct=True,
         ),
         Index("ix_emotion_daily_day_org_team", "day", "org_id", "team_id"),
     )
@@ -55,6 +56,8 @@ class EmotionRolling(Base):
     emotion: Mapped[str | None] = mapped_column(String(64), nullable=True, index=True)
 
     doc_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # running sum of doc_count * avg_confidence, so windows can be slid incrementally
+    confidence_sum: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
     avg_confidence: Mapped[float | None] = mapped_column(Float, nullable=True)
 
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
@@ -62,12 +65,193 @@ class EmotionRolling(Base):
     __table_args__ = (
         UniqueConstraint(
             "as_of_day", "window_days", "org_id", "team_id", "channel", "source", "sentiment", "emotion",
-            name="uq_emotion_rolling_segment"
+            name="uq_emotion_rolling_segment",
+            postgresql_nulls_not_distinct=True,
         ),
         Index("ix_emotion_rolling_asof_org_team", "as_of_day", "org_id", "team_id"),
     )
 
 
+class EmotionHourly(Base):
+    """
+    Intraday tier at the (org_id, team_id, channel) segment grain, rebuilt for the
+    most recent hours only. Counts are documents (not exploded emotion labels).
+    """
+    __tablename__ = "emotion_hourly"
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+
+    hour: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
+
+    org_id: Mapped[str | None] = mapped_column(String(128), nullable=True, index=True)
+    team_id: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    channel: Mapped[str | None] = mapped_column(String(64), nullable=True)
+
+    doc_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    negative_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    avg_confidence: Mapped[float | None] = mapped_column(Float, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("hour", "org_id", "team_id", "channel", name="uq_emotion_hourly_segment"),
+    )
+
+
+class EmotionRollup(Base):
+    """
+    Coarser daily grains of emotion_daily, produced in the same scan via GROUPING SETS.
+    grain: "org" (org_id), "team" (org_id, team_id), "channel" (org_id, team_id, channel),
+    "org_emotion" (org_id, emotion), "channel_emotion" (org_id, team_id, channel, emotion).
+    Dimensions outside the grain are NULL.
+    Counts are label rows, matching SUM(doc_count) over emotion_daily.
+    """
+    __tablename__ = "emotion_rollup"
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+
+    day: Mapped[date] = mapped_column(Date, nullable=False, index=True)
+    grain: Mapped[str] = mapped_column(String(16), nullable=False)
+
+    org_id: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    team_id: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    channel: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    emotion: Mapped[str | None] = mapped_column(String(64), nullable=True)
+
+    doc_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    negative_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    avg_confidence: Mapped[float | None] = mapped_column(Float, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint(
+            "day", "grain", "org_id", "team_id", "channel", "emotion",
+            name="uq_emotion_rollup_segment",
+            postgresql_nulls_not_distinct=True,
+        ),
+        Index("ix_emotion_rollup_grain_day_org", "grain", "day", "org_id"),
+    )
+
+
+class EmotionCumulative(Base):
+    """
+    Per-segment running totals: one row per segment per day it has emotion_daily
+    rows, carrying the sums of every emotion_daily row up to and including that
+    day. Any [start, end] window is the difference of each segment's latest rows
+    at or before end and start - 1.
+    """
+    __tablename__ = "emotion_cumulative"
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+
+    day: Mapped[date] = mapped_column(Date, nullable=False, index=True)
+
+    org_id: Mapped[str | None] = mapped_column(String(128), nullable=True, index=True)
+    team_id: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    channel: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    source: Mapped[str | None] = mapped_column(String(64), nullable=True)
+
+    sentiment: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    emotion: Mapped[str | None] = mapped_column(String(64), nullable=True)
+
+    cum_doc_count: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    cum_confidence_sum: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint(
+            "day", "org_id", "team_id", "channel", "source", "sentiment", "emotion",
+            name="uq_emotion_cumulative_segment"
+        ),
+        Index("ix_emotion_cumulative_org_day", "org_id", "day"),
+        # each segment's latest row at or before a day (DISTINCT ON ... ORDER BY day DESC)
+        Index(
+            "ix_emotion_cumulative_segment_day",
+            "org_id", "team_id", "channel", "source", "sentiment", "emotion", "day",
+        ),
+    )
+
+
+class SegmentEwmaState(Base):
+    """
+    Streaming anomaly state: exponentially weighted mean/variance of negative_rate per
+    (org_id, team_id, channel), advanced one bucket (grain 'day' or 'hour') at a time.
+    last_* describe the most recent bucket, scored against the state before it was folded in.
+    """
+    __tablename__ = "segment_ewma_state"
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+
+    grain: Mapped[str] = mapped_column(String(8), nullable=False)  # "day" | "hour"
+    alpha: Mapped[float] = mapped_column(Float, nullable=False)
+
+    org_id: Mapped[str | None] = mapped_column(String(128), nullable=True, index=True)
+    team_id: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    channel: Mapped[str | None] = mapped_column(String(64), nullable=True)
+
+    n: Mapped[int] = mapped_column(Integer, nullable=False, default=0)  # buckets folded in
+    mean: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    var: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+
+    last_bucket: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    last_value: Mapped[float] = mapped_column(Float, nullable=False)
+    last_total: Mapped[int] = mapped_column(Integer, nullable=False)
+    last_mean: Mapped[float | None] = mapped_column(Float, nullable=True)
+    last_std: Mapped[float | None] = mapped_column(Float, nullable=True)
+    last_z: Mapped[float | None] = mapped_column(Float, nullable=True)
+
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint(
+            "grain", "alpha", "org_id", "team_id", "channel",
+            name="uq_segment_ewma_state_segment",
+            postgresql_nulls_not_distinct=True,
+        ),
+        Index("ix_segment_ewma_state_grain_bucket", "grain", "alpha", "last_bucket"),
+    )
+
+
+class SpikeCandidateStat(Base):
+    """
+    Per-segment robust z-score statistics of negative_rate for one day and one
+    (baseline_days, min_docs) window, materialized once by aggregations.compute_spike_candidates
+    and read by detect_risk_spikes, the rule engine and dashboards. Only segments with
+    enough history are stored; thresholds are applied by the readers.
+    """
+    __tablename__ = "spike_candidates"
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+
+    day: Mapped[date] = mapped_column(Date, nullable=False)
+    metric: Mapped[str] = mapped_column(String(64), nullable=False, default="negative_rate")
+    baseline_days: Mapped[int] = mapped_column(Integer, nullable=False)
+    min_docs: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    org_id: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    team_id: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    channel: Mapped[str | None] = mapped_column(String(64), nullable=True)
+
+    value: Mapped[float] = mapped_column(Float, nullable=False)
+    doc_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    median: Mapped[float] = mapped_column(Float, nullable=False)
+    mad: Mapped[float] = mapped_column(Float, nullable=False)
+    z: Mapped[float] = mapped_column(Float, nullable=False)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint(
+            "day", "metric", "baseline_days", "min_docs", "org_id", "team_id", "channel",
+            name="uq_spike_candidates_segment",
+            postgresql_nulls_not_distinct=True,
+        ),
+        Index("ix_spike_candidates_org_day", "org_id", "day"),
+    )
+
+
 class AlertEvent(Base):
     __tablename__ = "alerts"
 
@@ -90,6 +274,24 @@ class AlertEvent(Base):
 
     message: Mapped[str | None] = mapped_column(String(512), nullable=True)
 
+    # rule-engine alerts carry their AlertRule id (no FK: history outlives the rule);
+    # NULL for alerts raised by the fixed detectors (detect_risk_spikes, intraday)
+    rule_id: Mapped[uuid.UUID | None] = mapped_column(UUID(as_uuid=True), nullable=True)
+
     __table_args__ = (
         Index("ix_alerts_day_org_team_type", "day", "org_id", "team_id", "alert_type"),
+        Index("ix_alerts_day_rule_id", "day", "rule_id"),
+        # upsert keys: one alert per (day, rule, segment) / (day, type, segment) for daily detectors
+        Index(
+            "ux_alerts_rule_segment", "day", "rule_id", "org_id", "team_id", "channel",
+            unique=True,
+            postgresql_nulls_not_distinct=True,
+            postgresql_where=text("rule_id IS NOT NULL"),
+        ),
+        Index(
+            "ux_alerts_detector_segment", "day", "alert_type", "org_id", "team_id", "channel",
+            unique=True,
+            postgresql_nulls_not_distinct=True,
+            postgresql_where=text("rule_id IS NULL AND alert_type <> 'intraday_spike'"),
+        ),
     )
\ No newline at end of file
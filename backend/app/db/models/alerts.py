@@ -16,6 +16,11 @@ class AlertRule(Base):
 
     # JSON rule definition (simple engine reads this)
     # example: {"type":"risk_spike","metric":"negative_rate","z_threshold":3.5,"baseline_days":30,...}
+    # optional "compute": "python" | "sql" picks where median/MAD run (default: settings.spike_detection_mode)
+    # {"type":"metric_spike","metric":"emotion_share"|"volume"|"avg_confidence"|"negative_rate","emotion":"fear",...}
+    #   runs through the columnar evaluator (app/utils/rule_eval.py); optional "min_lift" overrides the metric default
+    # {"type":"ewma_spike","alpha":0.1,"z_threshold":3.5,"min_docs":10,"min_history":7,...} reads segment_ewma_state
+    #   optional "grain": "hour" scores hourly state, evaluated by alerting.run_hourly_rules (default "day")
     definition: Mapped[dict] = mapped_column(JSON, nullable=False, default=dict)
 
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
@@ -33,9 +38,9 @@ class AlertEvidence(Base):
         index=True,
     )
 
+    # no FK: documents is partitioned (PK is (id, event_time)); rows are cleaned up on partition drop
     document_id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True),
-        ForeignKey("documents.id", ondelete="CASCADE"),
         nullable=False,
         index=True,
     )
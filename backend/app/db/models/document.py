@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import String, Text, DateTime, JSON
+from sqlalchemy import String, Text, DateTime, JSON, Index, event
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -28,7 +28,33 @@ class Document(Base):
     # event time from payload
     timestamp: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True, index=True)
 
+    # partition key: COALESCE(timestamp, created_at), set on insert (see _set_event_time).
+    # The table is range-partitioned by month on this column, so it is part of the
+    # database primary key; the ORM still identifies documents by id alone.
+    event_time: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
-    inference_links = relationship("DocumentInference", back_populates="document", cascade="all, delete-orphan")
\ No newline at end of file
+    inference_links = relationship("DocumentInference", back_populates="document", cascade="all, delete-orphan")
+
+    __mapper_args__ = {"primary_key": [id]}
+
+    __table_args__ = (
+        # segment + time range (aggregation, alert evidence); covers id for the inference join
+        Index(
+            "ix_documents_org_team_channel_event_time",
+            "org_id", "team_id", "channel", "event_time",
+            postgresql_include=["id"],
+        ),
+        # org-scoped listings filtered by time
+        Index("ix_documents_org_event_time", "org_id", "event_time"),
+    )
+
+
+@event.listens_for(Document, "before_insert")
+def _set_event_time(mapper, connection, target: Document) -> None:
+    if target.created_at is None:
+        target.created_at = datetime.utcnow()
+    if target.event_time is None:
+        target.event_time = target.timestamp or target.created_at
\ No newline at end of file
@@ -13,9 +13,9 @@ class DocumentTopic(Base):
 
     run_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), nullable=False, index=True)
 
+    # no FK: documents is partitioned (PK is (id, event_time)); rows are cleaned up on partition drop
     document_id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True),
-        ForeignKey("documents.id", ondelete="CASCADE"),
         nullable=False,
         index=True,
     )
@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import String, DateTime, ForeignKey, JSON, Float
+from sqlalchemy import Boolean, String, DateTime, ForeignKey, ForeignKeyConstraint, Index, Integer, JSON, Float, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -27,9 +27,38 @@ class InferenceRun(Base):
     params: Mapped[dict | None] = mapped_column(JSON, nullable=True)
     summary: Mapped[dict | None] = mapped_column(JSON, nullable=True)
 
+    # runs over inference_run_documents: members, and members processed so far (advanced by
+    # each chunk task under a row lock; the run completes when they meet)
+    document_count: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    documents_done: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default=text("0"))
+
     documents = relationship("DocumentInference", back_populates="inference_run", cascade="all, delete-orphan")
 
 
+class InferenceRunDocument(Base):
+    """
+    Run membership: task messages carry (run id, seq range) instead of document ids,
+    and workers page through their range by (inference_run_id, seq).
+    """
+    __tablename__ = "inference_run_documents"
+
+    inference_run_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        ForeignKey("inference_runs.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    seq: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+    # no FK: documents is partitioned and its partitions are dropped for retention;
+    # members whose document is gone are skipped (and counted as done)
+    document_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), nullable=False)
+    event_time: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+    # set in the transaction that infers (or skips) the member; progress counts these flips,
+    # so a redelivered chunk neither redoes nor recounts a member
+    done: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False, server_default=text("false"))
+
+
 class DocumentInference(Base):
     __tablename__ = "document_inference"
 
@@ -37,11 +66,13 @@ class DocumentInference(Base):
 
     document_id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True),
-        ForeignKey("documents.id", ondelete="CASCADE"),
         nullable=False,
         index=True,
     )
 
+    # copy of the document's event_time: partition key, and half of the FK to documents
+    event_time: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+
     inference_run_id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True),
         ForeignKey("inference_runs.id", ondelete="CASCADE"),
@@ -62,4 +93,20 @@ class DocumentInference(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
 
     document = relationship("Document", back_populates="inference_links")
-    inference_run = relationship("InferenceRun", back_populates="documents")
\ No newline at end of file
+    inference_run = relationship("InferenceRun", back_populates="documents")
+
+    __mapper_args__ = {"primary_key": [id]}
+
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["document_id", "event_time"],
+            ["documents.id", "documents.event_time"],
+            ondelete="CASCADE",
+        ),
+        # join from documents on (id, event_time) and pick the latest inference without a heap visit
+        Index(
+            "ix_document_inference_document_event_time",
+            "document_id", "event_time", "created_at",
+            postgresql_include=["sentiment", "calibrated_confidence"],
+        ),
+    )
\ No newline at end of file
@@ -0,0 +1,37 @@
+from datetime import datetime
+from sqlalchemy import String, DateTime, Integer, BigInteger, Identity, JSON, Text, Index, text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+class TaskOutbox(Base):
+    """
+    Transactional outbox: task dispatches written in the same transaction as the rows
+    they refer to, and published to the broker by the relay (app.core.outbox).
+    Rows are deleted once published.
+    """
+    __tablename__ = "task_outbox"
+
+    # identity, not uuid: the relay publishes in insert order
+    id: Mapped[int] = mapped_column(BigInteger, Identity(), primary_key=True)
+
+    task_name: Mapped[str] = mapped_column(String(255), nullable=False)
+    args: Mapped[list] = mapped_column(JSON, nullable=False, default=list)
+    kwargs: Mapped[dict] = mapped_column(JSON, nullable=False, default=dict)
+
+    # fair-queue lane (None: sent straight to the broker) and optional queue override
+    org_id: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    queue: Mapped[str | None] = mapped_column(String(64), nullable=True)
+
+    # failed publishes are retried from available_at on
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default=text("0"))
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    available_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=text("now()")
+    )
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_task_outbox_available_id", "available_at", "id"),
+    )
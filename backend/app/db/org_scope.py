@@ -0,0 +1,20 @@
+"""
+Tenant scoping of the nightly jobs.
+
+Jobs take an org_id: None means every org, NO_ORG means only rows without an org
+(documents ingested without one), anything else that org alone.
+"""
+from __future__ import annotations
+
+# org_id value of the org-less lane (org_id IS NULL)
+NO_ORG = "__no_org__"
+
+
+def org_filter(alias: str | None, org_id: str | None) -> str:
+    """` AND <alias>.org_id ...` restricting a query to org_id's lane (bound as :org_id)."""
+    col = f"{alias}.org_id" if alias else "org_id"
+    if org_id is None:
+        return ""
+    if org_id == NO_ORG:
+        return f" AND {col} IS NULL"
+    return f" AND {col} = :org_id"
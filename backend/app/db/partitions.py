@@ -0,0 +1,164 @@
+"""
+Monthly range partitions for the event-time partitioned tables.
+
+documents and document_inference are partitioned on event_time with one
+partition per UTC month (`<table>_pYYYY_MM`) plus a `<table>_default` catch-all.
+Future partitions are created ahead of time; retention drops whole partitions.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import date, datetime, timezone
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+log = logging.getLogger(__name__)
+
+# referencing table first: document_inference partitions must go before documents'
+PARTITIONED_TABLES = ("document_inference", "documents")
+
+# tables that point at documents without an FK (see models) and need explicit cleanup
+_DOCUMENT_REFERENCES = ("alert_evidence", "document_topics")
+
+
+def month_start(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+
+def add_months(d: date, n: int) -> date:
+    y, m = divmod(d.month - 1 + n, 12)
+    return date(d.year + y, m + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y_%m}"
+
+
+def list_partitions(db: Session, table: str) -> dict[date, str]:
+    """Monthly partitions of `table` keyed by month start (the default partition is skipped)."""
+    rows = db.execute(text("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = :table
+    """), {"table": table}).fetchall()
+
+    out: dict[date, str] = {}
+    prefix = f"{table}_p"
+    for (name,) in rows:
+        if not name.startswith(prefix):
+            continue
+        try:
+            y, m = name[len(prefix):].split("_")
+            out[date(int(y), int(m), 1)] = name
+        except ValueError:
+            continue
+    return out
+
+
+def _month_bounds(m: date) -> tuple[datetime, datetime]:
+    nxt = add_months(m, 1)
+    return (
+        datetime(m.year, m.month, 1, tzinfo=timezone.utc),
+        datetime(nxt.year, nxt.month, 1, tzinfo=timezone.utc),
+    )
+
+
+def _create_month(db: Session, m: date, tables: list[str]) -> None:
+    """
+    Creates the partitions of `tables` for month m. Rows of that month already sitting in
+    the default partitions (e.g. future-dated documents) would make CREATE ... PARTITION OF
+    fail, so they are parked in temp tables, deleted, and re-inserted once the partitions
+    exist. document_inference rows go first and come back last: deleting documents
+    cascades to them.
+    """
+    lo, hi = _month_bounds(m)
+    bounds = {"lo": lo, "hi": hi}
+    moved = [t for t in PARTITIONED_TABLES if t in tables or (t == "document_inference" and "documents" in tables)]
+
+    for table in moved:
+        db.execute(text(
+            f'CREATE TEMP TABLE "_move_{table}" ON COMMIT DROP AS '
+            f"SELECT * FROM {table} WHERE event_time >= :lo AND event_time < :hi"
+        ), bounds)
+        db.execute(text(f"DELETE FROM {table} WHERE event_time >= :lo AND event_time < :hi"), bounds)
+
+    for table in reversed(PARTITIONED_TABLES):
+        if table in tables:
+            db.execute(text(
+                f'CREATE TABLE IF NOT EXISTS "{partition_name(table, m)}" PARTITION OF "{table}" '
+                f"FOR VALUES FROM ('{m.isoformat()} 00:00:00+00') TO ('{add_months(m, 1).isoformat()} 00:00:00+00')"
+            ))
+
+    for table in reversed(moved):
+        n = db.execute(text(f'INSERT INTO {table} SELECT * FROM "_move_{table}"')).rowcount
+        if n:
+            log.info("moved %d %s rows of %s out of the default partition", n, table, m.isoformat())
+
+
+def ensure_monthly_partitions(db: Session, start: date, months_ahead: int) -> tuple[list[str], dict[str, str]]:
+    """
+    Creates any missing monthly partitions from start's month through months_ahead
+    months after it, one transaction per month, so a month that fails does not hold
+    back the others. Returns the names of partitions created and the error of each
+    month that failed.
+    """
+    created: list[str] = []
+    failed: dict[str, str] = {}
+    first = month_start(start)
+    existing = {table: list_partitions(db, table) for table in PARTITIONED_TABLES}
+    for i in range(months_ahead + 1):
+        m = add_months(first, i)
+        missing = [t for t in PARTITIONED_TABLES if m not in existing[t]]
+        if not missing:
+            continue
+        try:
+            _create_month(db, m, missing)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            log.warning("creating %s partitions failed: %r", m.isoformat(), e)
+            failed[m.isoformat()] = repr(e)
+            continue
+        created.extend(partition_name(t, m) for t in reversed(PARTITIONED_TABLES) if t in missing)
+    return created, failed
+
+
+def drop_partitions_before(db: Session, cutoff: date) -> list[str]:
+    """
+    Retention: drops every monthly partition that ends on or before cutoff's month,
+    plus matching rows in the default partitions. Returns the names of partitions dropped.
+    """
+    cutoff_month = month_start(cutoff)
+    dropped: list[str] = []
+
+    expired = {
+        table: {m: name for m, name in list_partitions(db, table).items() if add_months(m, 1) <= cutoff_month}
+        for table in PARTITIONED_TABLES
+    }
+
+    for m, name in sorted(expired["documents"].items()):
+        for ref in _DOCUMENT_REFERENCES:
+            db.execute(text(f'DELETE FROM {ref} WHERE document_id IN (SELECT id FROM "{name}")'))
+
+    for table in PARTITIONED_TABLES:
+        for m, name in sorted(expired[table].items()):
+            if table == "documents":
+                # detach first: verifies no document_inference rows still reference it
+                db.execute(text(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"'))
+            db.execute(text(f'DROP TABLE "{name}"'))
+            dropped.append(name)
+
+    # out-of-range stragglers that landed in the default partitions
+    cutoff_ts = datetime(cutoff_month.year, cutoff_month.month, 1, tzinfo=timezone.utc)
+    for ref in _DOCUMENT_REFERENCES:
+        db.execute(
+            text(f"DELETE FROM {ref} WHERE document_id IN (SELECT id FROM documents_default WHERE event_time < :c)"),
+            {"c": cutoff_ts},
+        )
+    for table in PARTITIONED_TABLES:
+        db.execute(text(f"DELETE FROM {table}_default WHERE event_time < :c"), {"c": cutoff_ts})
+
+    return dropped
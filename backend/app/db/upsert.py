@@ -0,0 +1,57 @@
+"""
+Upsert-based idempotency for recomputed tables.
+
+A job that recomputes a slice (one day, one window, ...) makes the stored slice equal
+to its fresh result without DELETE-then-INSERT: rows are written with
+INSERT ... ON CONFLICT DO UPDATE only when a value actually changed, and rows of the
+slice that are no longer produced are removed by a NULL-safe anti-join. Unchanged
+rows are not touched, so re-runs cause no tuple churn. The conflict targets are
+NULLS NOT DISTINCT constraints/indexes, since NULL segment dimensions are real keys.
+"""
+from __future__ import annotations
+
+
+def changed_predicate(target: str, values: list[str], json_values: tuple[str, ...] = ()) -> str:
+    """`(target.v, ...) IS DISTINCT FROM (EXCLUDED.v, ...)`; json columns compared as jsonb."""
+    def col(prefix: str, c: str) -> str:
+        return f"CAST({prefix}.{c} AS jsonb)" if c in json_values else f"{prefix}.{c}"
+
+    old = ", ".join(col(target, c) for c in values)
+    new = ", ".join(col("EXCLUDED", c) for c in values)
+    return f"({old}) IS DISTINCT FROM ({new})"
+
+
+def null_safe_match(left: str, right: str, keys: list[str]) -> str:
+    return " AND ".join(f"{left}.{c} IS NOT DISTINCT FROM {right}.{c}" for c in keys)
+
+
+def upsert_replace_ctes(
+    name: str,
+    source: str,
+    target: str,
+    constraint: str,
+    keys: list[str],
+    values: list[str],
+    scope: str,
+) -> str:
+    """
+    Two data-modifying CTEs (`<name>_upserted`, `<name>_removed`) that make the rows of
+    `target` matching `scope` (a predicate on alias t) equal to the CTE `source`, which
+    must expose keys + values. id and created_at are only set on insert.
+    """
+    cols = ", ".join(keys + values)
+    assignments = ", ".join(f"{c} = EXCLUDED.{c}" for c in values)
+    return f"""
+        {name}_upserted AS (
+          INSERT INTO {target} AS t (id, {cols}, created_at)
+          SELECT gen_random_uuid(), {cols}, NOW() FROM {source}
+          ON CONFLICT ON CONSTRAINT {constraint} DO UPDATE SET {assignments}
+          WHERE {changed_predicate("t", values)}
+          RETURNING 1
+        ),
+        {name}_removed AS (
+          DELETE FROM {target} t
+          WHERE {scope}
+            AND NOT EXISTS (SELECT 1 FROM {source} s WHERE {null_safe_match("s", "t", keys)})
+          RETURNING 1
+        )"""
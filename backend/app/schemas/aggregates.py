@@ -0,0 +1,46 @@
+from datetime import date
+from pydantic import BaseModel
+
+class WindowSegmentOut(BaseModel):
+    org_id: str | None = None
+    team_id: str | None = None
+    channel: str | None = None
+    source: str | None = None
+    sentiment: str | None = None
+    emotion: str | None = None
+    doc_count: int
+    avg_confidence: float | None = None
+
+class EmotionWindowResponse(BaseModel):
+    org_id: str
+    start: date
+    end: date
+    # latest day with a cumulative row (any segment changing) at or before end / start - 1
+    end_as_of: date | None = None
+    start_as_of: date | None = None
+    items: list[WindowSegmentOut]
+
+class RollupDayOut(BaseModel):
+    day: date
+    grain: str
+    org_id: str | None = None
+    team_id: str | None = None
+    channel: str | None = None
+    emotion: str | None = None
+    doc_count: int
+    negative_count: int
+    avg_confidence: float | None = None
+
+class SpikeCandidateOut(BaseModel):
+    day: date
+    metric: str
+    baseline_days: int
+    min_docs: int
+    org_id: str | None = None
+    team_id: str | None = None
+    channel: str | None = None
+    value: float
+    doc_count: int
+    median: float
+    mad: float
+    z: float
@@ -14,6 +14,7 @@ class AlertOut(BaseModel):
     value: float
     baseline: dict
     message: str | None = None
+    rule_id: str | None = None
 
 class EvidenceOut(BaseModel):
     document_id: str
@@ -30,4 +31,32 @@ class EvidenceOut(BaseModel):
 
 class AlertDetail(BaseModel):
     alert: AlertOut
-    evidence: list[EvidenceOut]
\ No newline at end of file
+    evidence: list[EvidenceOut]
+
+class BacktestRequest(BaseModel):
+    start: date
+    end: date
+    # candidate AlertRule.definition (risk_spike): baseline_days, z_threshold, min_docs
+    definition: dict = {}
+    team_id: str | None = None
+    channel: str | None = None
+
+class BacktestAlertOut(BaseModel):
+    day: date
+    severity: str
+    org_id: str | None = None
+    team_id: str | None = None
+    channel: str | None = None
+    metric: str
+    value: float
+    doc_count: int
+    median: float
+    mad: float
+    z: float
+
+class BacktestResponse(BaseModel):
+    start: date
+    end: date
+    definition: dict
+    alert_count: int
+    alerts: list[BacktestAlertOut]
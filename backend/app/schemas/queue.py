@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+
+class TenantQueueStatsOut(BaseModel):
+    org_id: str
+    pending: int
+    inflight: int
+    max_inflight: int
+    weight: int
+    # age of the oldest job still waiting for a slot
+    oldest_wait_ms: int | None = None
+    # totals since the counters were created
+    dispatched: int
+    rejected: int
+    avg_wait_ms: float | None = None
+    max_wait_ms: int | None = None
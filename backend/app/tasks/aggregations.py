@@ -1,29 +1,59 @@
 from __future__ import annotations
 
 from datetime import datetime, timezone, timedelta, date
+import json
 
-from sqlalchemy import text
+import numpy as np
+from sqlalchemy import delete, insert, text
 
 from app.core.celery_app import celery_app
+from app.core.config import settings
 from app.db.session import SessionLocal
-import statistics
+from app.db.org_scope import org_filter as _org_filter
+from app.db.upsert import changed_predicate, null_safe_match, upsert_replace_ctes
+from app.db.models.aggregations import SegmentEwmaState
+from app.utils.ewma import advance_ewma_state, day_bucket, ewma_state_rows, replay_ewma
+from app.utils.spikes import (
+    MIN_LIFT,
+    load_segment_series,
+    materialize_spike_candidates,
+    materialized_windows,
+    read_spike_candidates,
+    robust_z,
+)
 
 
 def _day_utc(d: date) -> str:
     return d.isoformat()
 
-def _median(xs: list[float]) -> float:
-    return statistics.median(xs)
+def _hour_floor(dt: datetime) -> datetime:
+    return dt.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
 
-def _mad(xs: list[float], med: float) -> float:
-    return statistics.median([abs(x - med) for x in xs])
+
+def _daily_upsert(org_filter: str) -> str:
+    return upsert_replace_ctes(
+        "daily", "daily", "emotion_daily", "uq_emotion_daily_segment",
+        keys=["day", "org_id", "team_id", "channel", "source", "sentiment", "emotion"],
+        values=["doc_count", "avg_confidence"],
+        scope="t.day = :day" + org_filter,
+    )
+
+
+def _rollup_upsert(org_filter: str) -> str:
+    return upsert_replace_ctes(
+        "rollup", "rollup", "emotion_rollup", "uq_emotion_rollup_segment",
+        keys=["day", "grain", "org_id", "team_id", "channel", "emotion"],
+        values=["doc_count", "negative_count", "avg_confidence"],
+        scope="t.day = :day" + org_filter,
+    )
 
 
 @celery_app.task(name="aggregations.compute_emotion_daily")
-def compute_emotion_daily(day: str | None = None) -> dict:
+def compute_emotion_daily(day: str | None = None, org_id: str | None = None) -> dict:
     """
     Computes daily aggregates for a given UTC day (YYYY-MM-DD).
-    If day is None, computes yesterday.
+    If day is None, computes yesterday. With org_id, only that org is recomputed.
+    Also writes the coarser emotion_rollup grains from the same scan.
     """
     db = SessionLocal()
     try:
@@ -35,50 +65,83 @@ def compute_emotion_daily(day: str | None = None) -> dict:
         day_start = datetime(day_date.year, day_date.month, day_date.day, tzinfo=timezone.utc)
         day_end = day_start + timedelta(days=1)
 
-        # Delete existing aggregates for idempotency
-        db.execute(
-            text("DELETE FROM emotion_daily WHERE day = :day"),
-            {"day": day_date},
-        )
-
         # We flatten emotion_labels (JSON array) to one row per emotion label.
         # If emotion_labels is NULL, we still store a row with emotion=NULL (optional).
         #
-        # Note: Documents use timestamp when present, else created_at.
-        sql = text("""
+        # Note: Documents use timestamp when present, else created_at; that is stored as
+        # event_time, the monthly partition key of both documents and document_inference.
+        # Filtering and joining on it lets the planner prune to the day's partition and
+        # join partition-by-partition.
+        #
+        # One scan feeds both tables: GROUPING SETS emits the finest grain (g = 0,
+        # emotion_daily) together with the org/team/channel/org_emotion/channel_emotion rollups.
+        #
+        # Idempotency is by upsert: changed rows are rewritten via ON CONFLICT, rows of the
+        # day that no longer exist are removed by an anti-join, unchanged rows are not touched.
+        sql = text(f"""
             WITH base AS (
               SELECT
-                DATE_TRUNC('day', COALESCE(d.timestamp, d.created_at))::date AS day,
+                DATE_TRUNC('day', d.event_time AT TIME ZONE 'UTC')::date AS day,
                 d.org_id, d.team_id, d.channel, d.source,
                 di.sentiment,
                 di.emotion_labels,
                 di.calibrated_confidence
               FROM document_inference di
-              JOIN documents d ON d.id = di.document_id
-              WHERE COALESCE(d.timestamp, d.created_at) >= :start
-                AND COALESCE(d.timestamp, d.created_at) <  :end
+              JOIN documents d ON d.id = di.document_id AND d.event_time = di.event_time
+              WHERE d.event_time >= :start AND d.event_time < :end
+                AND di.event_time >= :start AND di.event_time < :end{_org_filter("d", org_id)}
             ),
             exploded AS (
               SELECT
                 day, org_id, team_id, channel, source,
                 sentiment,
-                jsonb_array_elements_text(COALESCE(emotion_labels::jsonb, '["__none__"]'::jsonb)) AS emotion,
+                NULLIF(e.label, '__none__') AS emotion,
                 calibrated_confidence
               FROM base
-            )
-            INSERT INTO emotion_daily (
-              id, day, org_id, team_id, channel, source, sentiment, emotion, doc_count, avg_confidence, created_at
-            )
+              CROSS JOIN LATERAL jsonb_array_elements_text(
+                COALESCE(emotion_labels::jsonb, '["__none__"]'::jsonb)
+              ) AS e(label)
+            ),
+            agg AS (
+              SELECT
+                day, org_id, team_id, channel, source, sentiment, emotion,
+                GROUPING(team_id, channel, source, sentiment, emotion) AS g,
+                COUNT(*)::int AS doc_count,
+                SUM(CASE WHEN sentiment = 'negative' THEN 1 ELSE 0 END)::int AS negative_count,
+                AVG(calibrated_confidence)::float AS avg_confidence
+              FROM exploded
+              GROUP BY GROUPING SETS (
+                (day, org_id, team_id, channel, source, sentiment, emotion),
+                (day, org_id),
+                (day, org_id, team_id),
+                (day, org_id, team_id, channel),
+                (day, org_id, emotion),
+                (day, org_id, team_id, channel, emotion)
+              )
+            ),
+            daily AS (
+              SELECT day, org_id, team_id, channel, source, sentiment, emotion, doc_count, avg_confidence
+              FROM agg
+              WHERE g = 0
+            ),
+            rollup AS (
+              SELECT
+                day,
+                CASE g
+                  WHEN 31 THEN 'org' WHEN 15 THEN 'team' WHEN 7 THEN 'channel'
+                  WHEN 6 THEN 'channel_emotion' ELSE 'org_emotion'
+                END AS grain,
+                org_id, team_id, channel, emotion,
+                doc_count, negative_count, avg_confidence
+              FROM agg
+              WHERE g <> 0
+            ),
+            {_daily_upsert(_org_filter("t", org_id))},
+            {_rollup_upsert(_org_filter("t", org_id))}
             SELECT
-              gen_random_uuid(),
-              day, org_id, team_id, channel, source,
-              sentiment,
-              NULLIF(emotion, '__none__') AS emotion,
-              COUNT(*)::int AS doc_count,
-              AVG(calibrated_confidence)::float AS avg_confidence,
-              NOW()
-            FROM exploded
-            GROUP BY day, org_id, team_id, channel, source, sentiment, NULLIF(emotion, '__none__')
+              (SELECT COUNT(*) FROM daily) AS daily_rows,
+              (SELECT COUNT(*) FROM daily_upserted) + (SELECT COUNT(*) FROM rollup_upserted) AS written,
+              (SELECT COUNT(*) FROM daily_removed) + (SELECT COUNT(*) FROM rollup_removed) AS removed
         """)
 
         # gen_random_uuid() needs pgcrypto; if not installed, we’ll replace with uuid in Python.
@@ -88,22 +151,113 @@ def compute_emotion_daily(day: str | None = None) -> dict:
         # We'll use a safer method: insert without id and let Python generate is not possible with pure SQL.
         # Instead, ensure pgcrypto exists:
         db.execute(text("CREATE EXTENSION IF NOT EXISTS pgcrypto;"))
+        db.execute(text("SET LOCAL enable_partitionwise_join = on"))
+        db.execute(text("SET LOCAL enable_partitionwise_aggregate = on"))
 
-        db.execute(sql, {"start": day_start, "end": day_end})
+        res = db.execute(sql, {"start": day_start, "end": day_end, "day": day_date, "org_id": org_id}).one()
         db.commit()
 
-        # Count inserted rows
-        res = db.execute(text("SELECT COUNT(*) FROM emotion_daily WHERE day=:day"), {"day": day_date}).scalar()
-        return {"ok": True, "day": _day_utc(day_date), "rows": int(res or 0)}
+        return {
+            "ok": True,
+            "day": _day_utc(day_date),
+            "org_id": org_id,
+            "rows": int(res.daily_rows),
+            "written": int(res.written),
+            "removed": int(res.removed),
+        }
 
     finally:
         db.close()
 
+def _rolling_upsert(org_filter: str) -> str:
+    return upsert_replace_ctes(
+        "rolling", "new_window", "emotion_rolling", "uq_emotion_rolling_segment",
+        keys=["as_of_day", "window_days", "org_id", "team_id", "channel", "source", "sentiment", "emotion"],
+        values=["doc_count", "confidence_sum", "avg_confidence"],
+        scope="t.as_of_day = :as_of AND t.window_days = :w" + org_filter,
+    )
+
+
+def _rebuild_rolling_window(db, as_of: date, w: int, org_id: str | None = None) -> None:
+    """Full re-sum of emotion_daily over the window (used on first run and to correct drift)."""
+    db.execute(text(f"""
+        WITH new_window AS (
+          SELECT
+            CAST(:as_of AS date) AS as_of_day, CAST(:w AS int) AS window_days,
+            org_id, team_id, channel, source, sentiment, emotion,
+            SUM(doc_count)::int AS doc_count,
+            SUM(doc_count * COALESCE(avg_confidence, 0))::float AS confidence_sum,
+            CASE WHEN SUM(doc_count) > 0
+              THEN SUM(doc_count * COALESCE(avg_confidence, 0)) / SUM(doc_count)
+              ELSE NULL
+            END::float AS avg_confidence
+          FROM emotion_daily e
+          WHERE day >= :start AND day <= :as_of{_org_filter("e", org_id)}
+          GROUP BY org_id, team_id, channel, source, sentiment, emotion
+        ),
+        {_rolling_upsert(_org_filter("t", org_id))}
+        SELECT 1
+    """), {"as_of": as_of, "start": as_of - timedelta(days=w - 1), "w": w, "org_id": org_id})
+
+
+def _slide_rolling_window(db, as_of: date, w: int, org_id: str | None = None) -> None:
+    """
+    Slides yesterday's window forward by one day: previous sums + the new day - the day
+    that fell out of the window. Touches three day-slices regardless of window size.
+    """
+    # UNION ALL + GROUP BY (rather than joins) so NULL segment dimensions line up
+    db.execute(text(f"""
+        WITH new_window AS (
+          SELECT
+            CAST(:as_of AS date) AS as_of_day, CAST(:w AS int) AS window_days,
+            org_id, team_id, channel, source, sentiment, emotion,
+            SUM(doc_count)::int AS doc_count,
+            SUM(confidence_sum)::float AS confidence_sum,
+            (SUM(confidence_sum) / SUM(doc_count))::float AS avg_confidence
+          FROM (
+            SELECT org_id, team_id, channel, source, sentiment, emotion,
+                   doc_count, confidence_sum
+            FROM emotion_rolling r
+            WHERE as_of_day = :prev AND window_days = :w{_org_filter("r", org_id)}
+            UNION ALL
+            SELECT org_id, team_id, channel, source, sentiment, emotion,
+                   doc_count, doc_count * COALESCE(avg_confidence, 0)
+            FROM emotion_daily e
+            WHERE day = :as_of{_org_filter("e", org_id)}
+            UNION ALL
+            SELECT org_id, team_id, channel, source, sentiment, emotion,
+                   -doc_count, -(doc_count * COALESCE(avg_confidence, 0))
+            FROM emotion_daily e
+            WHERE day = :dropped{_org_filter("e", org_id)}
+          ) delta
+          GROUP BY org_id, team_id, channel, source, sentiment, emotion
+          HAVING SUM(doc_count) > 0
+        ),
+        {_rolling_upsert(_org_filter("t", org_id))}
+        SELECT 1
+    """), {
+        "as_of": as_of,
+        "prev": as_of - timedelta(days=1),
+        "dropped": as_of - timedelta(days=w),
+        "w": w,
+        "org_id": org_id,
+    })
+
+
 @celery_app.task(name="aggregations.compute_emotion_rolling")
-def compute_emotion_rolling(as_of_day: str | None = None, windows: list[int] | None = None) -> dict:
+def compute_emotion_rolling(
+    as_of_day: str | None = None,
+    windows: list[int] | None = None,
+    full_rebuild: bool = False,
+    org_id: str | None = None,
+) -> dict:
     """
     Computes rolling windows (7/30/90) ending at as_of_day (inclusive).
-    If as_of_day is None, uses yesterday.
+    If as_of_day is None, uses yesterday. With org_id, only that org's windows are computed.
+
+    Windows are maintained incrementally from the previous day's window. A full
+    re-sum happens when full_rebuild is set (periodic drift correction) or when
+    there is no previous window to slide from.
     """
     db = SessionLocal()
     try:
@@ -116,54 +270,207 @@ def compute_emotion_rolling(as_of_day: str | None = None, windows: list[int] | N
 
         db.execute(text("CREATE EXTENSION IF NOT EXISTS pgcrypto;"))
 
+        modes: dict[int, str] = {}
         for w in windows:
-            start_day = as_of - timedelta(days=w - 1)
+            # idempotent: both paths upsert the window and drop rows that fell out of it
+            has_prev = db.execute(
+                text(f"""
+                    SELECT EXISTS (
+                      SELECT 1 FROM emotion_rolling r
+                      WHERE as_of_day=:d AND window_days=:w{_org_filter("r", org_id)}
+                    )
+                """),
+                {"d": as_of - timedelta(days=1), "w": w, "org_id": org_id},
+            ).scalar()
 
-            # idempotency
-            db.execute(
-                text("DELETE FROM emotion_rolling WHERE as_of_day=:d AND window_days=:w"),
-                {"d": as_of, "w": w},
+            if full_rebuild or not has_prev:
+                _rebuild_rolling_window(db, as_of, w, org_id)
+                modes[w] = "rebuild"
+            else:
+                _slide_rolling_window(db, as_of, w, org_id)
+                modes[w] = "incremental"
+
+        db.commit()
+        return {"ok": True, "as_of_day": as_of.isoformat(), "org_id": org_id, "windows": windows, "modes": modes}
+
+    finally:
+        db.close()
+
+def _advance_cumulative(db, start: date, end: date, org_id: str | None = None) -> None:
+    """
+    Rewrites the cumulative rows for days [start, end]. Rows are sparse: a segment
+    gets a row only on days it has emotion_daily rows, carrying its running totals
+    through that day (its latest row before start plus every emotion_daily row since),
+    so readers take each segment's latest row at or before the day they need.
+    """
+    db.execute(
+        text(f"DELETE FROM emotion_cumulative c WHERE day >= :start AND day <= :end{_org_filter('c', org_id)}"),
+        {"start": start, "end": end, "org_id": org_id},
+    )
+    # the base rows sort before start, so a running sum per segment adds each day onto them;
+    # PARTITION BY / DISTINCT ON (rather than joins) so NULL segment dimensions line up
+    db.execute(text(f"""
+        INSERT INTO emotion_cumulative (
+          id, day, org_id, team_id, channel, source, sentiment, emotion,
+          cum_doc_count, cum_confidence_sum, created_at
+        )
+        SELECT gen_random_uuid(), day, org_id, team_id, channel, source, sentiment, emotion,
+               cum_doc_count, cum_confidence_sum, NOW()
+        FROM (
+          SELECT
+            day, is_daily, org_id, team_id, channel, source, sentiment, emotion,
+            (SUM(doc_count) OVER seg)::bigint AS cum_doc_count,
+            (SUM(confidence_sum) OVER seg)::float AS cum_confidence_sum
+          FROM (
+            (
+              SELECT DISTINCT ON (org_id, team_id, channel, source, sentiment, emotion)
+                     day, false AS is_daily, org_id, team_id, channel, source, sentiment, emotion,
+                     cum_doc_count AS doc_count, cum_confidence_sum AS confidence_sum
+              FROM emotion_cumulative c
+              WHERE day < :start{_org_filter("c", org_id)}
+              ORDER BY org_id, team_id, channel, source, sentiment, emotion, day DESC
             )
+            UNION ALL
+            SELECT day, true, org_id, team_id, channel, source, sentiment, emotion,
+                   doc_count, doc_count * COALESCE(avg_confidence, 0)
+            FROM emotion_daily e
+            WHERE day >= :start AND day <= :end{_org_filter("e", org_id)}
+          ) delta
+          WINDOW seg AS (PARTITION BY org_id, team_id, channel, source, sentiment, emotion ORDER BY day)
+        ) running
+        WHERE is_daily
+    """), {"start": start, "end": end, "org_id": org_id})
+
+
+@celery_app.task(name="aggregations.compute_emotion_cumulative")
+def compute_emotion_cumulative(
+    day: str | None = None,
+    full_rebuild: bool = False,
+    org_id: str | None = None,
+) -> dict:
+    """
+    Extends the per-segment prefix sums (emotion_cumulative) through `day`.
+    If day is None, uses yesterday. With org_id, only that org's sums are extended.
 
-            sql = text("""
-                INSERT INTO emotion_rolling (
-                  id, as_of_day, window_days,
-                  org_id, team_id, channel, source, sentiment, emotion,
-                  doc_count, avg_confidence, created_at
-                )
-                SELECT
-                  gen_random_uuid(),
-                  :as_of::date AS as_of_day,
-                  :w::int AS window_days,
-                  org_id, team_id, channel, source, sentiment, emotion,
-                  SUM(doc_count)::int AS doc_count,
-                  CASE WHEN SUM(doc_count) > 0
-                    THEN SUM(doc_count * COALESCE(avg_confidence, 0)) / SUM(doc_count)
-                    ELSE NULL
-                  END::float AS avg_confidence,
-                  NOW()
-                FROM emotion_daily
-                WHERE day >= :start::date AND day <= :as_of::date
-                GROUP BY org_id, team_id, channel, source, sentiment, emotion
-            """)
-            db.execute(sql, {"as_of": as_of, "start": start_day, "w": w})
+    Normally this folds in the days since the latest cumulative row. Re-running a
+    past day also re-advances every later day in the same transaction, so they
+    never go stale. A full rebuild replays every day from the first emotion_daily row.
+    """
+    db = SessionLocal()
+    try:
+        if day is None:
+            day_date = (datetime.now(timezone.utc) - timedelta(days=1)).date()
+        else:
+            day_date = date.fromisoformat(day)
+
+        db.execute(text("CREATE EXTENSION IF NOT EXISTS pgcrypto;"))
+
+        org = {"org_id": org_id}
+        if full_rebuild:
+            db.execute(text(f"DELETE FROM emotion_cumulative c WHERE TRUE{_org_filter('c', org_id)}"), org)
+            first = db.execute(
+                text(f"SELECT MIN(day) FROM emotion_daily e WHERE TRUE{_org_filter('e', org_id)}"), org
+            ).scalar()
+            if first is not None and first <= day_date:
+                _advance_cumulative(db, first, day_date, org_id)
+            db.commit()
+            return {"ok": True, "day": day_date.isoformat(), "org_id": org_id, "mode": "rebuild"}
+
+        # idempotency: rewrite from the day after the latest earlier row (days without
+        # activity leave no row; with none, from the first emotion_daily row) through this
+        # day, or through the latest row if later days were already computed
+        bounds = db.execute(
+            text(f"""
+                SELECT MAX(day) FILTER (WHERE day < :day) AS prev, MAX(day) AS last
+                FROM emotion_cumulative c WHERE TRUE{_org_filter('c', org_id)}
+            """),
+            {"day": day_date, **org},
+        ).one()
+        if bounds.prev is not None:
+            start = bounds.prev + timedelta(days=1)
+        else:
+            first = db.execute(
+                text(f"SELECT MIN(day) FROM emotion_daily e WHERE TRUE{_org_filter('e', org_id)}"), org
+            ).scalar()
+            start = min(first or day_date, day_date)
+        end = max(day_date, bounds.last or day_date)
+
+        _advance_cumulative(db, start, end, org_id)
+        db.commit()
+
+        res = db.execute(
+            text(f"SELECT COUNT(*) FROM emotion_cumulative c WHERE day=:day{_org_filter('c', org_id)}"),
+            {"day": day_date, **org},
+        ).scalar()
+        return {
+            "ok": True,
+            "day": day_date.isoformat(),
+            "org_id": org_id,
+            "mode": "incremental",
+            "through": end.isoformat(),
+            "rows": int(res or 0),
+        }
+
+    finally:
+        db.close()
+
+DEFAULT_SPIKE_WINDOW = (30, 10)  # (baseline_days, min_docs) used by detect_risk_spikes
+
+
+def _spike_windows(db) -> set[tuple[int, int]]:
+    """The default window plus every (baseline_days, min_docs) of an enabled in-process risk_spike rule."""
+    rows = db.execute(text("""
+        SELECT definition FROM alert_rules
+        WHERE is_enabled AND definition::jsonb ->> 'type' = 'risk_spike'
+    """)).fetchall()
+    windows = {DEFAULT_SPIKE_WINDOW}
+    for (d,) in rows:
+        d = d or {}
+        if d.get("compute", settings.spike_detection_mode) == "sql":
+            continue
+        windows.add((int(d.get("baseline_days", 30)), int(d.get("min_docs", 10))))
+    return windows
 
+
+@celery_app.task(name="aggregations.compute_spike_candidates")
+def compute_spike_candidates(day: str | None = None, org_id: str | None = None) -> dict:
+    """
+    Materializes per-segment negative_rate robust z-score statistics for one UTC day
+    (default: yesterday) into spike_candidates, for every window the detectors need,
+    in-process or in Postgres per settings.spike_detection_mode.
+    With org_id, only that org's segments are materialized.
+    """
+    db = SessionLocal()
+    try:
+        if day is None:
+            target_day = (datetime.now(timezone.utc) - timedelta(days=1)).date()
+        else:
+            target_day = date.fromisoformat(day)
+
+        windows = _spike_windows(db)
+        rows = materialize_spike_candidates(db, target_day, windows, org_id, settings.spike_detection_mode)
         db.commit()
-        return {"ok": True, "as_of_day": as_of.isoformat(), "windows": windows}
+
+        return {"ok": True, "day": target_day.isoformat(), "org_id": org_id, "windows": sorted(windows), "rows": rows}
 
     finally:
         db.close()
 
+
 @celery_app.task(name="aggregations.detect_risk_spikes")
 def detect_risk_spikes(
     day: str | None = None,
-    baseline_days: int = 30,
+    baseline_days: int = DEFAULT_SPIKE_WINDOW[0],
     z_threshold: float = 3.5,
-    min_docs: int = 10,
+    min_docs: int = DEFAULT_SPIKE_WINDOW[1],
+    org_id: str | None = None,
 ) -> dict:
     """
     Detect spikes in negative_rate per (org_id, team_id, channel).
-    Uses robust z-score against the previous baseline_days (excluding target day).
+    Reads the robust z-scores (previous baseline_days, excluding target day) from
+    spike_candidates, materializing the window first if the stage has not run.
+    Only this detector's own alerts (rule_id IS NULL) are replaced, and with org_id
+    only that org's.
     """
     db = SessionLocal()
     try:
@@ -172,95 +479,314 @@ def detect_risk_spikes(
         else:
             target_day = date.fromisoformat(day)
 
-        start_baseline = target_day - timedelta(days=baseline_days)
+        window = (int(baseline_days), int(min_docs))
+        if window not in materialized_windows(db, target_day, org_id):
+            materialize_spike_candidates(db, target_day, {window}, org_id, settings.spike_detection_mode)
+
+        spikes = read_spike_candidates(db, target_day, baseline_days, min_docs, z_threshold, org_id)
+
+        # Idempotency by upsert on ux_alerts_detector_segment: changed alerts are rewritten,
+        # alerts for segments that no longer spike are removed, unchanged ones are not touched
+        res = db.execute(text(f"""
+            WITH new AS (
+              SELECT *
+              FROM unnest(
+                CAST(:orgs AS text[]), CAST(:teams AS text[]), CAST(:chans AS text[]),
+                CAST(:sevs AS text[]), CAST(:vals AS float8[]), CAST(:baselines AS text[]), CAST(:msgs AS text[])
+              ) AS n(org_id, team_id, channel, severity, value, baseline, message)
+            ),
+            upserted AS (
+              INSERT INTO alerts AS t (
+                id, created_at, day, alert_type, severity,
+                org_id, team_id, channel,
+                metric, value, baseline, message
+              )
+              SELECT
+                gen_random_uuid(), NOW(), :day, 'risk_spike', severity,
+                org_id, team_id, channel,
+                'negative_rate', value, CAST(baseline AS json), message
+              FROM new
+              ON CONFLICT (day, alert_type, org_id, team_id, channel)
+                WHERE rule_id IS NULL AND alert_type <> 'intraday_spike'
+              DO UPDATE SET
+                severity = EXCLUDED.severity, value = EXCLUDED.value,
+                baseline = EXCLUDED.baseline, message = EXCLUDED.message
+              WHERE {changed_predicate("t", ["severity", "value", "baseline", "message"], ("baseline",))}
+              RETURNING 1
+            ),
+            removed AS (
+              DELETE FROM alerts t
+              WHERE t.day = :day AND t.alert_type = 'risk_spike' AND t.rule_id IS NULL{_org_filter("t", org_id)}
+                AND NOT EXISTS (
+                  SELECT 1 FROM new n WHERE {null_safe_match("n", "t", ["org_id", "team_id", "channel"])}
+                )
+              RETURNING 1
+            )
+            SELECT (SELECT COUNT(*) FROM upserted) AS written, (SELECT COUNT(*) FROM removed) AS removed
+        """), {
+            "day": target_day,
+            "orgs": [sp.segment[0] for sp in spikes],
+            "teams": [sp.segment[1] for sp in spikes],
+            "chans": [sp.segment[2] for sp in spikes],
+            "sevs": [sp.severity for sp in spikes],
+            "vals": [sp.value for sp in spikes],
+            "baselines": [
+                json.dumps({
+                    "median": sp.median,
+                    "mad": sp.mad,
+                    "z": sp.z,
+                    "baseline_days": int(baseline_days),
+                    "min_docs": int(min_docs),
+                })
+                for sp in spikes
+            ],
+            "msgs": [
+                f"Risk spike: negative_rate={sp.value:.2f} vs median={sp.median:.2f} (z={sp.z:.2f})"
+                for sp in spikes
+            ],
+            "org_id": org_id,
+        }).one()
 
-        # Fetch daily totals by segment for baseline + target
-        rows = db.execute(text("""
-            SELECT day, org_id, team_id, channel,
-                   SUM(CASE WHEN sentiment='negative' THEN doc_count ELSE 0 END)::int AS neg,
-                   SUM(doc_count)::int AS total
-            FROM emotion_daily
-            WHERE day >= :start AND day <= :target
-            GROUP BY day, org_id, team_id, channel
-        """), {"start": start_baseline, "target": target_day}).fetchall()
-
-        # Organize by segment
-        from collections import defaultdict
-        seg_to_series: dict[tuple, list[tuple[date, float, int]]] = defaultdict(list)
+        db.commit()
+        return {
+            "ok": True,
+            "day": target_day.isoformat(),
+            "org_id": org_id,
+            "alerts": len(spikes),
+            "written": int(res.written),
+            "removed": int(res.removed),
+        }
+
+    finally:
+        db.close()
+
+
+@celery_app.task(name="aggregations.compute_emotion_hourly")
+def compute_emotion_hourly(hour: str | None = None, lookback_hours: int | None = None) -> dict:
+    """
+    Rebuilds emotion_hourly for the `lookback_hours` hours (default:
+    settings.emotion_hourly_lookback_hours) ending at `hour` (ISO timestamp,
+    truncated to the hour; default: the current hour).
+    Only the trailing hours are touched, so this is cheap enough to run every few minutes
+    and still picks up documents that arrive late for the previous hour.
+    """
+    db = SessionLocal()
+    try:
+        if hour is None:
+            end_hour = _hour_floor(datetime.now(timezone.utc))
+        else:
+            end_hour = _hour_floor(datetime.fromisoformat(hour))
+
+        lookback = settings.emotion_hourly_lookback_hours if lookback_hours is None else lookback_hours
+        start = end_hour - timedelta(hours=max(1, int(lookback)) - 1)
+        end = end_hour + timedelta(hours=1)
+
+        db.execute(text("CREATE EXTENSION IF NOT EXISTS pgcrypto;"))
+
+        # idempotency
+        db.execute(
+            text("DELETE FROM emotion_hourly WHERE hour >= :start AND hour < :end"),
+            {"start": start, "end": end},
+        )
 
+        db.execute(text("""
+            INSERT INTO emotion_hourly (
+              id, hour, org_id, team_id, channel, doc_count, negative_count, avg_confidence, created_at
+            )
+            SELECT
+              gen_random_uuid(),
+              DATE_TRUNC('hour', d.event_time) AS hour,
+              d.org_id, d.team_id, d.channel,
+              COUNT(*)::int,
+              SUM(CASE WHEN di.sentiment = 'negative' THEN 1 ELSE 0 END)::int,
+              AVG(di.calibrated_confidence)::float,
+              NOW()
+            FROM document_inference di
+            JOIN documents d ON d.id = di.document_id AND d.event_time = di.event_time
+            WHERE d.event_time >= :start AND d.event_time < :end
+              AND di.event_time >= :start AND di.event_time < :end
+            GROUP BY 2, d.org_id, d.team_id, d.channel
+        """), {"start": start, "end": end})
+        db.commit()
+
+        return {"ok": True, "from": start.isoformat(), "to": end.isoformat()}
+
+    finally:
+        db.close()
+
+@celery_app.task(name="aggregations.detect_intraday_spikes")
+def detect_intraday_spikes(
+    hour: str | None = None,
+    baseline_days: int = 14,
+    z_threshold: float = 3.5,
+    min_docs: int = 5,
+) -> dict:
+    """
+    Detect negative_rate spikes per (org_id, team_id, channel) for one completed hour
+    (default: the last completed hour). The baseline is the same hour-of-day on each of
+    the previous baseline_days days, so normal daily rhythms are not flagged.
+    """
+    db = SessionLocal()
+    try:
+        if hour is None:
+            target_hour = _hour_floor(datetime.now(timezone.utc)) - timedelta(hours=1)
+        else:
+            target_hour = _hour_floor(datetime.fromisoformat(hour))
+
+        baseline_hours = [target_hour - timedelta(days=i) for i in range(1, baseline_days + 1)]
+
+        hours = [target_hour] + baseline_hours
+        rows = db.execute(text("""
+            SELECT hour, org_id, team_id, channel, negative_count, doc_count
+            FROM emotion_hourly
+            WHERE hour = ANY(:hours)
+        """), {"hours": hours}).fetchall()
+
+        # (segment x hour) matrix: column 0 is the target hour, the rest its same-hour baseline
+        col = {h: j for j, h in enumerate(hours)}
+        seg_index: dict[tuple, int] = {}
         for r in rows:
-            d = r[0]
-            org_id, team_id, channel = r[1], r[2], r[3]
-            neg, total = int(r[4] or 0), int(r[5] or 0)
-            rate = (neg / total) if total > 0 else 0.0
-            seg_to_series[(org_id, team_id, channel)].append((d, rate, total))
+            seg_index.setdefault((r[1], r[2], r[3]), len(seg_index))
+        neg = np.zeros((len(seg_index), len(hours)), dtype=np.int64)
+        total = np.zeros((len(seg_index), len(hours)), dtype=np.int64)
+        for r in rows:
+            i, j = seg_index[(r[1], r[2], r[3])], col[r[0]]
+            neg[i, j] = int(r[4] or 0)
+            total[i, j] = int(r[5] or 0)
+        rate = np.where(total > 0, neg / np.maximum(total, 1), 0.0)
+
+        med, mad, z, ok = robust_z(rate[:, 1:], total[:, 1:], rate[:, 0], total[:, 0], min_docs)
+        hit = ok & (z >= z_threshold) & (rate[:, 0] >= med + MIN_LIFT)
+        segments = list(seg_index)
 
-        # Clear existing alerts for idempotency (same day/type)
+        target_day = target_hour.date()
+        hour_key = target_hour.isoformat()
+
+        # Clear existing alerts for idempotency (same hour/type)
         db.execute(
-            text("DELETE FROM alerts WHERE day=:day AND alert_type='risk_spike'"),
-            {"day": target_day},
+            text("""
+                DELETE FROM alerts
+                WHERE day=:day AND alert_type='intraday_spike' AND (baseline::jsonb ->> 'hour') = :hour
+            """),
+            {"day": target_day, "hour": hour_key},
         )
 
         inserted = 0
-        for (org_id, team_id, channel), series in seg_to_series.items():
-            series.sort(key=lambda x: x[0])
-
-            # separate baseline and target
-            baseline = [(d, rate, total) for (d, rate, total) in series if d < target_day]
-            target = [(d, rate, total) for (d, rate, total) in series if d == target_day]
-            if not target:
-                continue
-
-            x_day, x_rate, x_total = target[0]
-            if x_total < min_docs:
-                continue
-
-            baseline_rates = [rate for (_d, rate, total) in baseline if total >= min_docs]
-            if len(baseline_rates) < 7:
-                continue  # not enough history
-
-            med = _median(baseline_rates)
-            mad = _mad(baseline_rates, med)
-            denom = 1.4826 * mad if mad > 1e-9 else 1e-9
-            z = (x_rate - med) / denom
-
-            # Only alert on upward spikes that pass threshold and are meaningfully higher
-            if z >= z_threshold and x_rate >= med + 0.10:
-                severity = "high" if z >= z_threshold * 1.5 else "medium"
-                msg = f"Risk spike: negative_rate={x_rate:.2f} vs median={med:.2f} (z={z:.2f})"
-
-                db.execute(text("""
-                    INSERT INTO alerts (
-                      id, created_at, day, alert_type, severity,
-                      org_id, team_id, channel,
-                      metric, value, baseline, message
-                    )
-                    VALUES (
-                      gen_random_uuid(), NOW(), :day, 'risk_spike', :sev,
-                      :org, :team, :chan,
-                      'negative_rate', :val,
-                      :baseline::jsonb, :msg
-                    )
-                """), {
-                    "day": target_day,
-                    "sev": severity,
-                    "org": org_id,
-                    "team": team_id,
-                    "chan": channel,
-                    "val": float(x_rate),
-                    "baseline": {
-                        "median": float(med),
-                        "mad": float(mad),
-                        "z": float(z),
-                        "baseline_days": int(baseline_days),
-                        "min_docs": int(min_docs),
-                    },
-                    "msg": msg,
-                })
-                inserted += 1
+        for i in np.flatnonzero(hit):
+            org_id, team_id, channel = segments[i]
+            x_rate, m, d, zi = float(rate[i, 0]), float(med[i]), float(mad[i]), float(z[i])
+            severity = "high" if zi >= z_threshold * 1.5 else "medium"
+            msg = (
+                f"Intraday spike {target_hour:%H}:00 UTC: negative_rate={x_rate:.2f} "
+                f"vs median={m:.2f} (z={zi:.2f})"
+            )
+
+            db.execute(text("""
+                INSERT INTO alerts (
+                  id, created_at, day, alert_type, severity,
+                  org_id, team_id, channel,
+                  metric, value, baseline, message
+                )
+                VALUES (
+                  gen_random_uuid(), NOW(), :day, 'intraday_spike', :sev,
+                  :org, :team, :chan,
+                  'negative_rate', :val,
+                  CAST(:baseline AS json), :msg
+                )
+            """), {
+                "day": target_day,
+                "sev": severity,
+                "org": org_id,
+                "team": team_id,
+                "chan": channel,
+                "val": x_rate,
+                "baseline": json.dumps({
+                    "hour": hour_key,
+                    "median": m,
+                    "mad": d,
+                    "z": zi,
+                    "baseline_days": int(baseline_days),
+                    "min_docs": int(min_docs),
+                }),
+                "msg": msg,
+            })
+            inserted += 1
+
+        db.commit()
+        return {"ok": True, "hour": hour_key, "alerts_inserted": inserted}
+
+    finally:
+        db.close()
+
+
+def _ewma_alphas(db) -> list[float]:
+    """settings.ewma_alpha plus any alpha requested by an enabled ewma_spike rule."""
+    rows = db.execute(text("""
+        SELECT DISTINCT CAST(definition::jsonb ->> 'alpha' AS float)
+        FROM alert_rules
+        WHERE is_enabled AND definition::jsonb ->> 'type' = 'ewma_spike' AND definition::jsonb ->> 'alpha' IS NOT NULL
+    """)).fetchall()
+    return sorted({float(settings.ewma_alpha)} | {float(r[0]) for r in rows if r[0] is not None})
+
+
+@celery_app.task(name="aggregations.update_ewma_state")
+def update_ewma_state(grain: str = "day", bucket: str | None = None, org_id: str | None = None) -> dict:
+    """
+    Folds one bucket into segment_ewma_state: a UTC day (default: yesterday, after
+    emotion_daily/rollup) or an hour (default: the latest hour compute_emotion_hourly
+    no longer rebuilds, so late documents are in it).
+    With org_id, only that org's segments are advanced.
+    """
+    db = SessionLocal()
+    try:
+        if grain == "day":
+            d = date.fromisoformat(bucket) if bucket else (datetime.now(timezone.utc) - timedelta(days=1)).date()
+            ts = day_bucket(d)
+        elif grain == "hour":
+            ts = _hour_floor(datetime.fromisoformat(bucket)) if bucket else (
+                _hour_floor(datetime.now(timezone.utc)) - timedelta(hours=settings.emotion_hourly_lookback_hours)
+            )
+        else:
+            raise ValueError(f"unknown EWMA grain: {grain!r}")
+
+        db.execute(text("CREATE EXTENSION IF NOT EXISTS pgcrypto;"))
 
+        updated = {}
+        for alpha in _ewma_alphas(db):
+            updated[str(alpha)] = advance_ewma_state(db, grain, ts, alpha, org_id)
         db.commit()
-        return {"ok": True, "day": target_day.isoformat(), "alerts_inserted": inserted}
+
+        return {"ok": True, "grain": grain, "bucket": ts.isoformat(), "org_id": org_id, "segments": updated}
 
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+@celery_app.task(name="aggregations.backfill_ewma_state")
+def backfill_ewma_state(start: str, end: str | None = None, alpha: float | None = None) -> dict:
+    """
+    Rebuilds day-grain EWMA state by replaying the daily channel rollup (itself built from
+    emotion_daily) over [start, end] (default end: yesterday). Replaces existing day state
+    for each alpha; nightly update_ewma_state continues from the last replayed day.
+    """
+    db = SessionLocal()
+    try:
+        start_day = date.fromisoformat(start)
+        end_day = date.fromisoformat(end) if end else (datetime.now(timezone.utc) - timedelta(days=1)).date()
+        alphas = [float(alpha)] if alpha is not None else _ewma_alphas(db)
+
+        series = load_segment_series(db, start_day, end_day)
+
+        written = {}
+        for a in alphas:
+            rows = ewma_state_rows(series, replay_ewma(series, a), a)
+            db.execute(delete(SegmentEwmaState).where(SegmentEwmaState.grain == "day", SegmentEwmaState.alpha == a))
+            if rows:
+                db.execute(insert(SegmentEwmaState), rows)
+            written[str(a)] = len(rows)
+        db.commit()
+
+        return {"ok": True, "from": start_day.isoformat(), "to": end_day.isoformat(), "segments": written}
+
+    finally:
+        db.close()
@@ -1,19 +1,34 @@
 from __future__ import annotations
 
 from datetime import datetime, timedelta, timezone, date
+import re
 import uuid
 
-from sqlalchemy import text, desc, and_, or_, func
+from sqlalchemy import TextClause, insert, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 
 from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.db import org_scope
 from app.db.session import SessionLocal
+from app.db.upsert import changed_predicate
 from app.db.models.aggregations import AlertEvent
 from app.db.models.alerts import AlertRule, AlertEvidence
-from app.db.models.document import Document
-from app.db.models.inference import DocumentInference
 from app.db.models.audit_log import AuditLog
-from app.utils.explain import find_keyword_spans, compute_contribution
+from app.utils.explain import keyword_matcher
+from app.utils.ewma import ewma_spikes
+from app.utils.rule_eval import RuleOp, compile_rule, evaluate_rules, load_segment_table
+from app.utils.spikes import (
+    MIN_HISTORY,
+    load_segment_series,
+    detect_spikes_sql,
+    backtest_spikes,
+    materialize_spike_candidates,
+    materialized_windows,
+    read_spike_candidates,
+    SpikeCandidate,
+)
 
 
 def utc_yesterday() -> date:
@@ -32,37 +47,365 @@ def audit(db: Session, action: str, entity_type: str | None, entity_id: str | No
     )
 
 
+EVIDENCE_TARGET_EMOTIONS = {"sadness", "fear", "fatigue", "anger"}
+
+
+_SEGMENT_DIMS = ("org_id", "team_id", "channel")
+
+
+def _evidence_statement(
+    day_start: datetime,
+    day_end: datetime,
+    requests: list[tuple[tuple, list[str], int]],
+    matchers: list,
+) -> tuple[TextClause, dict] | None:
+    """
+    The select_evidence query and its binds (None when no request wants evidence).
+
+    Requests are joined to documents in one branch per NULL pattern of their segment:
+    `d.col = r.col` for set dimensions and `d.col IS NULL` for the others. Unlike
+    IS NOT DISTINCT FROM, both are index conditions on
+    ix_documents_org_team_channel_event_time, so each segment is an index range scan
+    over the day instead of a pass over all the day's documents per request.
+    """
+    patterns = sorted({tuple(v is None for v in seg) for (seg, _kw, k) in requests if k > 0})
+    if not patterns:
+        return None
+
+    kw_req: list[int] = []
+    kw_pattern: list[str] = []
+    for i, m in enumerate(matchers):
+        for kw in m.keywords:
+            kw_req.append(i)
+            # \y is the ARE word boundary; re.escape output is also a valid ARE literal
+            kw_pattern.append(rf"\y{re.escape(kw)}\y")
+
+    branches = []
+    for nulls in patterns:
+        req_side = " AND ".join(f"r.{c} IS {'' if n else 'NOT '}NULL" for c, n in zip(_SEGMENT_DIMS, nulls))
+        doc_side = " AND ".join(f"d.{c} IS NULL" if n else f"d.{c} = r.{c}" for c, n in zip(_SEGMENT_DIMS, nulls))
+        branches.append(f"""
+              SELECT r.req, d.id, d.event_time, d.text_redacted
+              FROM req r
+              JOIN documents d ON {doc_side}
+              WHERE {req_side} AND d.event_time >= :start AND d.event_time < :end""")
+
+    seg_docs = "\n              UNION ALL".join(branches)
+    stmt = text(f"""
+            WITH req AS (
+              SELECT *
+              FROM unnest(
+                CAST(:reqs AS int[]), CAST(:orgs AS text[]), CAST(:teams AS text[]),
+                CAST(:chans AS text[]), CAST(:top_ks AS int[])
+              ) AS r(req, org_id, team_id, channel, top_k)
+              WHERE r.top_k > 0
+            ),
+            req_kw AS (
+              SELECT * FROM unnest(CAST(:kw_req AS int[]), CAST(:kw_pattern AS text[])) AS k(req, pattern)
+            ),
+            seg_docs AS ({seg_docs}
+            ),
+            latest AS (
+              SELECT DISTINCT ON (di.document_id)
+                di.document_id, di.event_time, di.sentiment, di.emotion_labels, di.calibrated_confidence
+              FROM document_inference di
+              WHERE di.event_time >= :start AND di.event_time < :end
+              ORDER BY di.document_id, di.created_at DESC
+            ),
+            scored AS (
+              SELECT d.req, d.id, d.text_redacted,
+                     l.sentiment, l.emotion_labels, l.calibrated_confidence,
+                     (
+                       CASE WHEN l.sentiment = 'negative' THEN 1.0 ELSE 0.0 END
+                       + 0.5 * (
+                         SELECT count(DISTINCT e)
+                         FROM json_array_elements_text(l.emotion_labels) AS e
+                         WHERE e = ANY(CAST(:targets AS text[]))
+                       )
+                       + 0.2 * (
+                         SELECT count(*)
+                         FROM req_kw k
+                         WHERE k.req = d.req AND d.text_redacted ~* k.pattern
+                       )
+                     ) * (0.5 + COALESCE(l.calibrated_confidence, 0.5)) AS contribution
+              FROM seg_docs d
+              JOIN latest l ON l.document_id = d.id AND l.event_time = d.event_time
+            ),
+            ranked AS (
+              SELECT s.*,
+                     ROW_NUMBER() OVER (PARTITION BY s.req ORDER BY s.contribution DESC, s.id) AS rn
+              FROM scored s
+            )
+            SELECT rk.req, rk.id, rk.sentiment, rk.emotion_labels, rk.calibrated_confidence,
+                   rk.text_redacted, rk.contribution
+            FROM ranked rk
+            JOIN req r ON r.req = rk.req
+            WHERE rk.rn <= r.top_k
+            ORDER BY rk.req, rk.rn
+        """)
+    params = {
+        "reqs": list(range(len(requests))),
+        "orgs": [seg[0] for (seg, _kw, _k) in requests],
+        "teams": [seg[1] for (seg, _kw, _k) in requests],
+        "chans": [seg[2] for (seg, _kw, _k) in requests],
+        "top_ks": [int(k) for (_seg, _kw, k) in requests],
+        "kw_req": kw_req,
+        "kw_pattern": kw_pattern,
+        "targets": sorted(EVIDENCE_TARGET_EMOTIONS),
+        "start": day_start,
+        "end": day_end,
+    }
+    return stmt, params
+
+
+def select_evidence(
+    db: Session,
+    day_start: datetime,
+    day_end: datetime,
+    requests: list[tuple[tuple, list[str], int]],
+) -> list[list[tuple]]:
+    """
+    Top-k evidence for many (segment, keywords, top_k) requests with a single query.
+
+    The contribution score (see compute_contribution) is computed in SQL, with keyword
+    hits counted by word-bounded ~* patterns, and Postgres keeps only the top_k rows per
+    request. Keyword spans are then highlighted in Python for those winners only.
+    Returns, per request, [(contribution, row, hits, highlights)] ordered by contribution desc.
+    """
+    if not requests:
+        return []
+
+    matchers = [keyword_matcher(keywords) for (_seg, keywords, _k) in requests]
+    statement = _evidence_statement(day_start, day_end, requests, matchers)
+    if statement is None:
+        return [[] for _ in requests]
+    rows = db.execute(*statement).fetchall()
+
+    out: list[list[tuple]] = [[] for _ in requests]
+    for row in rows:
+        hits, hl = matchers[row.req].match(row.text_redacted)
+        out[row.req].append((float(row.contribution), row, hits, hl))
+    return out
+
+
+def _ewma_grain(rule: AlertRule) -> str:
+    """ewma_spike rules score day state unless their definition says "grain": "hour"."""
+    return (rule.definition or {}).get("grain", "day")
+
+
+def _ewma_alert(
+    rule: AlertRule, sp: SpikeCandidate, alpha: float, min_docs: int, min_history: int, hour: datetime | None = None
+) -> tuple[str, dict]:
+    """Message and baseline of an ewma_spike alert; hour is the spiking hour of an hour-grain rule."""
+    at = f" at {hour:%H}:00 UTC" if hour is not None else ""
+    msg = f"[{rule.name}] ewma spike{at}: negative_rate={sp.value:.2f} vs ewma={sp.median:.2f} (z={sp.z:.2f})"
+    baseline = {
+        "rule_id": str(rule.id),
+        "rule_name": rule.name,
+        "method": "ewma",
+        "alpha": alpha,
+        "mean": sp.median,
+        "std": sp.mad,
+        "z": sp.z,
+        "min_docs": min_docs,
+        "min_history": min_history,
+    }
+    if hour is not None:
+        baseline.update(grain="hour", hour=hour.isoformat())
+    return msg, baseline
+
+
+def _write_rule_alerts(
+    db: Session,
+    alert_rows: list[dict],
+    winners: list[list[tuple]],
+    known_ids: set,
+    now: datetime,
+) -> tuple[int, int, int, list[tuple[uuid.UUID, uuid.UUID]]]:
+    """
+    Upserts rule alerts on (day, rule_id, segment) with their evidence (winners, aligned
+    with alert_rows) and audit rows, committing every settings.rule_engine_commit_every
+    alerts. Returns (created, updated, evidence rows, (alert_id, document_id) kept).
+    """
+    created_alerts = 0
+    updated_alerts = 0
+    created_evidence = 0
+
+    alert_values = ["alert_type", "severity", "metric", "value", "baseline", "message"]
+    alert_stmt = pg_insert(AlertEvent.__table__)
+    alert_stmt = alert_stmt.on_conflict_do_update(
+        index_elements=["day", "rule_id", "org_id", "team_id", "channel"],
+        index_where=text("rule_id IS NOT NULL"),
+        set_={c: alert_stmt.excluded[c] for c in alert_values},
+        where=text(changed_predicate("alerts", alert_values, ("baseline",))),
+    ).returning(AlertEvent.__table__.c.id)
+
+    evidence_values = ["contribution", "emotion_match", "keyword_hits", "highlights"]
+    evidence_stmt = pg_insert(AlertEvidence.__table__)
+    evidence_stmt = evidence_stmt.on_conflict_do_update(
+        constraint="uq_alert_evidence_alert_document",
+        set_={c: evidence_stmt.excluded[c] for c in evidence_values},
+        where=text(changed_predicate("alert_evidence", evidence_values, ("keyword_hits", "highlights"))),
+    )
+
+    kept_evidence: list[tuple[uuid.UUID, uuid.UUID]] = []
+    chunk = settings.rule_engine_commit_every or len(alert_rows) or 1
+    for lo in range(0, len(alert_rows), chunk):
+        alerts_chunk = alert_rows[lo:lo + chunk]
+        evidence_rows: list[dict] = []
+        for alert, top in zip(alerts_chunk, winners[lo:lo + chunk]):
+            for contrib, row, hits, hl in top:
+                evidence_rows.append(
+                    {
+                        "id": uuid.uuid4(),
+                        "created_at": now,
+                        "alert_id": alert["id"],
+                        "document_id": row.id,
+                        "contribution": float(contrib),
+                        "emotion_match": (row.sentiment or None),
+                        "keyword_hits": hits or None,
+                        "highlights": hl or None,
+                    }
+                )
+                kept_evidence.append((alert["id"], row.id))
+
+        # RETURNING yields inserted rows and rows whose values changed; unchanged rows are skipped
+        written = {r[0] for r in db.execute(alert_stmt, alerts_chunk).fetchall()}
+        audit_rows = [
+            {
+                "id": uuid.uuid4(),
+                "created_at": now,
+                "actor": "system",
+                "action": "alert_updated" if alert["id"] in known_ids else "alert_created",
+                "entity_type": "alert",
+                "entity_id": str(alert["id"]),
+                "meta": {
+                    "alert_type": alert["alert_type"],
+                    "severity": alert["severity"],
+                    "org_id": alert["org_id"],
+                    "team_id": alert["team_id"],
+                    "channel": alert["channel"],
+                    "metric": alert["metric"],
+                    "value": alert["value"],
+                    "baseline": alert["baseline"],
+                },
+            }
+            for alert in alerts_chunk
+            if alert["id"] in written
+        ]
+        if evidence_rows:
+            db.execute(evidence_stmt, evidence_rows)
+        if audit_rows:
+            db.execute(insert(AuditLog), audit_rows)
+        db.commit()
+
+        created_alerts += sum(1 for a in alerts_chunk if a["id"] not in known_ids)
+        updated_alerts += sum(1 for a in alerts_chunk if a["id"] in known_ids and a["id"] in written)
+        created_evidence += len(evidence_rows)
+
+    return created_alerts, updated_alerts, created_evidence, kept_evidence
+
+
+def _remove_stale_evidence(db: Session, alert_ids: list[str], kept_evidence: list[tuple]) -> None:
+    """Deletes evidence of alert_ids that is not in kept_evidence ((alert_id, document_id) pairs)."""
+    db.execute(text("""
+        DELETE FROM alert_evidence e
+        WHERE e.alert_id = ANY(CAST(:ids AS uuid[]))
+          AND NOT EXISTS (
+            SELECT 1
+            FROM unnest(CAST(:kept_alert AS uuid[]), CAST(:kept_doc AS uuid[])) AS k(alert_id, document_id)
+            WHERE k.alert_id = e.alert_id AND k.document_id = e.document_id
+          )
+    """), {
+        "ids": alert_ids,
+        "kept_alert": [str(a) for a, _ in kept_evidence],
+        "kept_doc": [str(d) for _, d in kept_evidence],
+    })
+
+
 @celery_app.task(name="alerting.run_rules")
-def run_rules(day: str | None = None) -> dict:
+def run_rules(day: str | None = None, org_id: str | None = None) -> dict:
+    """
+    Evaluates every enabled rule for `day` (default: yesterday). With org_id, only that
+    org's segments are evaluated and only its rule alerts are replaced.
+    """
     db = SessionLocal()
     try:
         target_day = date.fromisoformat(day) if day else utc_yesterday()
         run_id = str(uuid.uuid4())
+        scope = {"day": target_day, "org_id": org_id}
+        org_filter = org_scope.org_filter(None, org_id)
 
-        audit(db, "rule_engine_run_started", "rule_engine_run", run_id, {"day": target_day.isoformat()})
+        audit(db, "rule_engine_run_started", "rule_engine_run", run_id, {"day": target_day.isoformat(), "org_id": org_id})
         db.commit()
 
         rules = db.query(AlertRule).filter(AlertRule.is_enabled == True).all()  # noqa: E712
-        created_alerts = 0
-        created_evidence = 0
-
-        # Idempotency: clear existing risk_spike alerts + evidence for that day
-        # (Simple first. Later you can key by rule_id to avoid clobbering other alert types.)
-        existing_alert_ids = [
-            str(r[0]) for r in db.execute(
-                text("SELECT id FROM alerts WHERE day=:day AND alert_type='risk_spike'"),
-                {"day": target_day},
+
+        # Idempotency: alerts are upserted on (day, rule_id, segment), keeping their ids so
+        # evidence and audit history stay attached; alerts from the fixed detectors
+        # (rule_id IS NULL) are left alone
+        existing_alert_ids = {
+            (r.rule_id, r.org_id, r.team_id, r.channel): r.id
+            for r in db.execute(
+                text(f"""
+                    SELECT id, rule_id, org_id, team_id, channel
+                    FROM alerts WHERE day=:day AND rule_id IS NOT NULL{org_filter}
+                """),
+                scope,
             ).fetchall()
+        }
+
+        risk_rules = [r for r in rules if (r.definition or {}).get("type") == "risk_spike"]
+        ewma_rules = [
+            r for r in rules if (r.definition or {}).get("type") == "ewma_spike" and _ewma_grain(r) == "day"
+        ]
+        # hour-grain ewma_spike rules run hourly (run_hourly_rules); their alerts are kept here
+        hourly_rule_ids = [
+            str(r.id) for r in rules if (r.definition or {}).get("type") == "ewma_spike" and _ewma_grain(r) == "hour"
         ]
-        if existing_alert_ids:
-            db.execute(text("DELETE FROM alert_evidence WHERE alert_id = ANY(:ids)"), {"ids": existing_alert_ids})
-            db.execute(text("DELETE FROM alerts WHERE id = ANY(:ids)"), {"ids": existing_alert_ids})
-            db.commit()
+        metric_rules = [r for r in rules if (r.definition or {}).get("type") == "metric_spike"]
 
-        for rule in rules:
+        # In-process risk_spike rules read the statistics materialized by the spike-candidate
+        # stage (any missing window is materialized here); compute=sql rules run in Postgres.
+        candidate_rules = [
+            r for r in risk_rules
+            if (r.definition or {}).get("compute", settings.spike_detection_mode) != "sql"
+        ]
+        windows = {
+            (int((r.definition or {}).get("baseline_days", 30)), int((r.definition or {}).get("min_docs", 10)))
+            for r in candidate_rules
+        }
+        missing = windows - materialized_windows(db, target_day, org_id)
+        if missing:
+            materialize_spike_candidates(db, target_day, missing, org_id)
+
+        # metric_spike rules compile to ops over one shared segment table, read once for the
+        # widest baseline; rules on the same metric/window are scored together.
+        ops: dict[str, RuleOp] = {}
+        for r in metric_rules:
+            d = r.definition or {}
+            try:
+                ops[str(r.id)] = compile_rule(str(r.id), r.name, d)
+            except ValueError as e:
+                audit(db, "rule_compile_failed", "alert_rule", str(r.id), {"error": str(e)})
+        hits_by_rule: dict[str, list] = {}
+        if ops:
+            widest = max(op.baseline_days for op in ops.values())
+            table = load_segment_table(db, target_day - timedelta(days=widest), target_day, org_id)
+            hits_by_rule = evaluate_rules(table, list(ops.values()), target_day)
+
+        day_start = datetime(target_day.year, target_day.month, target_day.day, tzinfo=timezone.utc)
+        day_end = day_start + timedelta(days=1)
+
+        # Rows are accumulated as plain dicts with client-side ids and written with bulk
+        # multi-row inserts below; (segment, keywords, top_k) per alert drives evidence selection.
+        now = datetime.now(timezone.utc)
+        alert_rows: list[dict] = []
+        evidence_requests: list[tuple[tuple, list[str], int]] = []
+
+        for rule in risk_rules + ewma_rules + metric_rules:
             d = rule.definition or {}
-            if d.get("type") != "risk_spike":
-                continue
+            rule_type = d.get("type")
 
             baseline_days = int(d.get("baseline_days", 30))
             z_threshold = float(d.get("z_threshold", 3.5))
@@ -70,169 +413,266 @@ def run_rules(day: str | None = None) -> dict:
             keywords = list(d.get("keywords", []))
             top_k = int(d.get("top_k_evidence", 10))
 
-            rows = db.execute(
-                text("""
-                    SELECT day, org_id, team_id, channel,
-                           SUM(CASE WHEN sentiment='negative' THEN doc_count ELSE 0 END)::int AS neg,
-                           SUM(doc_count)::int AS total
-                    FROM emotion_daily
-                    WHERE day >= :start AND day <= :target
-                    GROUP BY day, org_id, team_id, channel
-                """),
-                {"start": target_day - timedelta(days=baseline_days), "target": target_day},
-            ).fetchall()
-
-            from collections import defaultdict
-            import statistics
-
-            seg_series = defaultdict(list)
-            for r in rows:
-                day_i, org_id, team_id, channel, neg, total = r
-                total = int(total or 0)
-                neg = int(neg or 0)
-                rate = (neg / total) if total > 0 else 0.0
-                seg_series[(org_id, team_id, channel)].append((day_i, rate, total))
-
-            def median(xs): return statistics.median(xs)
-            def mad(xs, med): return statistics.median([abs(x - med) for x in xs])
-
-            day_start = datetime(target_day.year, target_day.month, target_day.day, tzinfo=timezone.utc)
-            day_end = day_start + timedelta(days=1)
-
-            for (org_id, team_id, channel), series in seg_series.items():
-                series.sort(key=lambda x: x[0])
-
-                baseline = [(d0, r0, n0) for (d0, r0, n0) in series if d0 < target_day and n0 >= min_docs]
-                target = [(d0, r0, n0) for (d0, r0, n0) in series if d0 == target_day]
-                if not target or len(baseline) < 7:
-                    continue
-
-                _x_day, x_rate, x_total = target[0]
-                if x_total < min_docs:
-                    continue
-
-                baseline_rates = [r0 for (_d0, r0, _n0) in baseline]
-                med = float(median(baseline_rates))
-                m = float(mad(baseline_rates, med))
-                denom = 1.4826 * m if m > 1e-9 else 1e-9
-                z = float((x_rate - med) / denom)
-
-                if z < z_threshold or x_rate < med + 0.10:
-                    continue
-
-                severity = "high" if z >= z_threshold * 1.5 else "medium"
-                msg = f"[{rule.name}] risk spike: negative_rate={x_rate:.2f} vs median={med:.2f} (z={z:.2f})"
-
-                alert = AlertEvent(
-                    day=target_day,
-                    alert_type="risk_spike",
-                    severity=severity,
-                    org_id=org_id,
-                    team_id=team_id,
-                    channel=channel,
-                    metric="negative_rate",
-                    value=float(x_rate),
-                    baseline={
+            if rule_type == "ewma_spike":
+                # persisted state already scored the day; no history is re-read
+                alpha = float(d.get("alpha", settings.ewma_alpha))
+                min_history = int(d.get("min_history", MIN_HISTORY))
+                spikes = ewma_spikes(db, "day", day_start, alpha, z_threshold, min_docs, min_history, org_id)
+            elif str(rule.id) in ops:
+                spikes = hits_by_rule[str(rule.id)]
+            elif rule in candidate_rules:
+                spikes = read_spike_candidates(db, target_day, baseline_days, min_docs, z_threshold, org_id)
+            elif rule_type == "risk_spike":
+                spikes = detect_spikes_sql(db, target_day, baseline_days, z_threshold, min_docs, org_id)
+            else:
+                continue  # failed to compile
+            metric = ops[str(rule.id)].metric_key if str(rule.id) in ops else "negative_rate"
+
+            for sp in spikes:
+                seg_org, team_id, channel = sp.segment
+                x_rate, med, m, z, severity = sp.value, sp.median, sp.mad, sp.z, sp.severity
+                if rule_type == "ewma_spike":
+                    msg, baseline = _ewma_alert(rule, sp, alpha, min_docs, min_history)
+                else:
+                    if rule_type == "metric_spike":
+                        kind = "drop" if ops[str(rule.id)].direction < 0 else "spike"
+                        msg = f"[{rule.name}] {metric} {kind}: value={x_rate:.2f} vs median={med:.2f} (z={z:.2f})"
+                    else:
+                        msg = f"[{rule.name}] risk spike: negative_rate={x_rate:.2f} vs median={med:.2f} (z={z:.2f})"
+                    baseline = {
                         "rule_id": str(rule.id),
                         "rule_name": rule.name,
+                        "metric": metric,
                         "baseline_days": baseline_days,
                         "median": med,
                         "mad": m,
                         "z": z,
                         "min_docs": min_docs,
-                    },
-                    message=msg,
-                )
-                db.add(alert)
-                db.flush()
-                created_alerts += 1
-
-                audit(
-                    db,
-                    "alert_created",
-                    "alert",
-                    str(alert.id),
+                    }
+
+                alert_rows.append(
                     {
-                        "alert_type": alert.alert_type,
-                        "severity": alert.severity,
-                        "org_id": org_id,
+                        "id": existing_alert_ids.get((rule.id, seg_org, team_id, channel)) or uuid.uuid4(),
+                        "created_at": now,
+                        "day": target_day,
+                        "alert_type": rule_type,
+                        "severity": severity,
+                        "org_id": seg_org,
                         "team_id": team_id,
                         "channel": channel,
-                        "metric": alert.metric,
-                        "value": alert.value,
-                        "baseline": alert.baseline,
-                    },
+                        "metric": metric,
+                        "value": float(x_rate),
+                        "baseline": baseline,
+                        "message": msg,
+                        "rule_id": rule.id,
+                    }
                 )
+                evidence_requests.append((sp.segment, keywords, top_k))
 
-                # ---- Evidence selection: latest inference per document for that segment/day ----
-                latest_inf_subq = (
-                    db.query(
-                        DocumentInference.document_id.label("document_id"),
-                        func.max(DocumentInference.created_at).label("max_created_at"),
-                    )
-                    .group_by(DocumentInference.document_id)
-                    .subquery()
-                )
+        # ---- Evidence selection: one query for every alerted segment of the day ----
+        winners = select_evidence(db, day_start, day_end, evidence_requests)
 
-                candidates = (
-                    db.query(Document, DocumentInference)
-                    .join(latest_inf_subq, latest_inf_subq.c.document_id == Document.id)
-                    .join(
-                        DocumentInference,
-                        and_(
-                            DocumentInference.document_id == latest_inf_subq.c.document_id,
-                            DocumentInference.created_at == latest_inf_subq.c.max_created_at,
-                        ),
-                    )
-                    .filter(Document.org_id == org_id)
-                    .filter(Document.team_id == team_id)
-                    .filter(Document.channel == channel)
-                    .filter(
-                        or_(
-                            and_(Document.timestamp.is_(None), Document.created_at >= day_start, Document.created_at < day_end),
-                            and_(Document.timestamp >= day_start, Document.timestamp < day_end),
-                        )
-                    )
-                    .all()
-                )
+        # ---- Bulk upserts, committed per chunk of alerts (0 = one commit for the run) ----
+        created_alerts, updated_alerts, created_evidence, kept_evidence = _write_rule_alerts(
+            db, alert_rows, winners, set(existing_alert_ids.values()), now
+        )
 
-                scored = []
-                for doc, inf in candidates:
-                    hits, hl = find_keyword_spans(doc.text_redacted, keywords)
-                    contrib = compute_contribution(
-                        sentiment=inf.sentiment,
-                        emotion_labels=inf.emotion_labels,
-                        confidence=inf.calibrated_confidence,
-                        keyword_hits=hits,
-                        target_sentiment="negative",
-                        target_emotions={"sadness", "fear", "fatigue", "anger"},
-                    )
-                    scored.append((contrib, doc, inf, hits, hl))
-
-                scored.sort(key=lambda x: x[0], reverse=True)
-                for contrib, doc, inf, hits, hl in scored[:top_k]:
-                    db.add(
-                        AlertEvidence(
-                            alert_id=alert.id,
-                            document_id=doc.id,
-                            contribution=float(contrib),
-                            emotion_match=(inf.sentiment or None),
-                            keyword_hits=hits or None,
-                            highlights=hl or None,
-                        )
-                    )
-                    created_evidence += 1
+        # ---- Remove what this run no longer produces (evidence of removed alerts cascades) ----
+        kept_ids = [str(a["id"]) for a in alert_rows]
+        removed_alerts = db.execute(text(f"""
+            DELETE FROM alerts
+            WHERE day = :day AND rule_id IS NOT NULL{org_filter} AND NOT (id = ANY(CAST(:ids AS uuid[])))
+              AND NOT (rule_id = ANY(CAST(:hourly_rule_ids AS uuid[])))
+        """), {**scope, "ids": kept_ids, "hourly_rule_ids": hourly_rule_ids}).rowcount
+        _remove_stale_evidence(db, kept_ids, kept_evidence)
+        db.commit()
 
         audit(
             db,
             "rule_engine_run_completed",
             "rule_engine_run",
             run_id,
-            {"day": target_day.isoformat(), "alerts": created_alerts, "evidence": created_evidence},
+            {
+                "day": target_day.isoformat(),
+                "org_id": org_id,
+                "alerts": created_alerts,
+                "updated": updated_alerts,
+                "removed": removed_alerts,
+                "evidence": created_evidence,
+            },
         )
         db.commit()
 
-        return {"ok": True, "day": target_day.isoformat(), "alerts": created_alerts, "evidence": created_evidence}
+        return {
+            "ok": True,
+            "day": target_day.isoformat(),
+            "org_id": org_id,
+            "alerts": created_alerts,
+            "updated": updated_alerts,
+            "removed": removed_alerts,
+            "evidence": created_evidence,
+        }
 
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+@celery_app.task(name="alerting.run_hourly_rules")
+def run_hourly_rules(hour: str | None = None, org_id: str | None = None) -> dict:
+    """
+    Evaluates hour-grain ewma_spike rules against the EWMA state of `hour` (default:
+    the hour update_ewma_state folds in at :10, once it left the emotion_hourly lookback).
+    A spike upserts the rule's alert for that segment and day, so a later spiking hour of
+    the same day refreshes it (with that hour's evidence); the nightly run_rules leaves
+    these alerts alone.
+    """
+    db = SessionLocal()
+    try:
+        if hour:
+            ts = datetime.fromisoformat(hour)
+            ts = (ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)).astimezone(timezone.utc)
+        else:
+            ts = datetime.now(timezone.utc) - timedelta(hours=settings.emotion_hourly_lookback_hours)
+        ts = ts.replace(minute=0, second=0, microsecond=0)
+        target_day = ts.date()
+
+        rules = [
+            r for r in db.query(AlertRule).filter(AlertRule.is_enabled == True).all()  # noqa: E712
+            if (r.definition or {}).get("type") == "ewma_spike" and _ewma_grain(r) == "hour"
+        ]
+        if not rules:
+            return {"ok": True, "hour": ts.isoformat(), "org_id": org_id, "alerts": 0, "updated": 0, "evidence": 0}
+
+        org_filter = org_scope.org_filter(None, org_id)
+        existing_alert_ids = {
+            (r.rule_id, r.org_id, r.team_id, r.channel): r.id
+            for r in db.execute(
+                text(f"""
+                    SELECT id, rule_id, org_id, team_id, channel
+                    FROM alerts WHERE day=:day AND rule_id = ANY(CAST(:rule_ids AS uuid[])){org_filter}
+                """),
+                {"day": target_day, "org_id": org_id, "rule_ids": [str(r.id) for r in rules]},
+            ).fetchall()
+        }
+
+        now = datetime.now(timezone.utc)
+        alert_rows: list[dict] = []
+        evidence_requests: list[tuple[tuple, list[str], int]] = []
+        for rule in rules:
+            d = rule.definition or {}
+            z_threshold = float(d.get("z_threshold", 3.5))
+            min_docs = int(d.get("min_docs", 10))
+            alpha = float(d.get("alpha", settings.ewma_alpha))
+            min_history = int(d.get("min_history", MIN_HISTORY))
+
+            for sp in ewma_spikes(db, "hour", ts, alpha, z_threshold, min_docs, min_history, org_id):
+                seg_org, team_id, channel = sp.segment
+                msg, baseline = _ewma_alert(rule, sp, alpha, min_docs, min_history, hour=ts)
+                alert_rows.append(
+                    {
+                        "id": existing_alert_ids.get((rule.id, seg_org, team_id, channel)) or uuid.uuid4(),
+                        "created_at": now,
+                        "day": target_day,
+                        "alert_type": "ewma_spike",
+                        "severity": sp.severity,
+                        "org_id": seg_org,
+                        "team_id": team_id,
+                        "channel": channel,
+                        "metric": "negative_rate",
+                        "value": float(sp.value),
+                        "baseline": baseline,
+                        "message": msg,
+                        "rule_id": rule.id,
+                    }
+                )
+                evidence_requests.append((sp.segment, list(d.get("keywords", [])), int(d.get("top_k_evidence", 10))))
+
+        winners = select_evidence(db, ts, ts + timedelta(hours=1), evidence_requests)
+        created_alerts, updated_alerts, created_evidence, kept_evidence = _write_rule_alerts(
+            db, alert_rows, winners, set(existing_alert_ids.values()), now
+        )
+        # evidence of a refreshed alert is the latest spiking hour's
+        _remove_stale_evidence(db, [str(a["id"]) for a in alert_rows], kept_evidence)
+        db.commit()
+
+        return {
+            "ok": True,
+            "hour": ts.isoformat(),
+            "org_id": org_id,
+            "alerts": created_alerts,
+            "updated": updated_alerts,
+            "evidence": created_evidence,
+        }
+
+    finally:
+        db.close()
+
+
+# longest baseline a backtest loads ahead of its range (the range itself is capped at a year)
+BACKTEST_MAX_BASELINE_DAYS = 365
+
+
+def backtest_rule(
+    db: Session,
+    definition: dict,
+    start: date,
+    end: date,
+    org_id: str | None = None,
+    team_id: str | None = None,
+    channel: str | None = None,
+) -> list[dict]:
+    """
+    Alerts a risk_spike rule definition would have raised on each day of [start, end].
+    The (segment x day) series is loaded once and every day is scored in one vectorized
+    pass; nothing is written.
+    """
+    d = definition or {}
+    if d.get("type", "risk_spike") != "risk_spike":
+        raise ValueError(f"backtesting is not supported for rule type {d.get('type')!r}")
+    if end < start:
+        raise ValueError("end must be on or after start")
+
+    try:
+        baseline_days = int(d.get("baseline_days", 30))
+        z_threshold = float(d.get("z_threshold", 3.5))
+        min_docs = int(d.get("min_docs", 10))
+    except (TypeError, ValueError):
+        raise ValueError("baseline_days, z_threshold and min_docs must be numbers")
+    if not 1 <= baseline_days <= BACKTEST_MAX_BASELINE_DAYS:
+        raise ValueError(f"baseline_days must be between 1 and {BACKTEST_MAX_BASELINE_DAYS}")
+    if min_docs < 1:
+        raise ValueError("min_docs must be at least 1")
+
+    series = load_segment_series(db, start - timedelta(days=baseline_days), end, org_id=org_id)
+    spikes = backtest_spikes(series, start, end, baseline_days, z_threshold, min_docs)
+
+    return [
+        {
+            "day": day,
+            "severity": sp.severity,
+            "org_id": sp.segment[0],
+            "team_id": sp.segment[1],
+            "channel": sp.segment[2],
+            "metric": "negative_rate",
+            "value": sp.value,
+            "doc_count": sp.total,
+            "median": sp.median,
+            "mad": sp.mad,
+            "z": sp.z,
+        }
+        for day, sp in spikes
+        if (team_id is None or sp.segment[1] == team_id) and (channel is None or sp.segment[2] == channel)
+    ]
+
+
+@celery_app.task(name="alerting.backtest_rule")
+def backtest_rule_task(definition: dict, start: str, end: str, org_id: str | None = None) -> dict:
+    """Read-only replay of a candidate rule definition over [start, end] (YYYY-MM-DD)."""
+    db = SessionLocal()
+    try:
+        alerts = backtest_rule(db, definition, date.fromisoformat(start), date.fromisoformat(end), org_id=org_id)
+        for a in alerts:
+            a["day"] = a["day"].isoformat()
+        return {"ok": True, "start": start, "end": end, "alerts": alerts}
+    finally:
+        db.close()
@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+from celery.signals import task_postrun
+
+from app.core import fair_queue
+from app.core.celery_app import celery_app
+
+
+@celery_app.task(name="fair_queue.dispatch")
+def dispatch() -> dict:
+    """Periodic sweep: dispatches jobs whose slots were freed by expired leases."""
+    return {"ok": True, "dispatched": fair_queue.dispatch()}
+
+
+@task_postrun.connect
+def _release_tenant_slot(sender=None, task_id=None, task=None, **_kwargs) -> None:
+    # fires for success, failure and retry alike; a retried job runs again without a slot
+    org_id = getattr(task.request, fair_queue.ORG_HEADER, None) if task is not None else None
+    if org_id is None:
+        return
+    fair_queue.release(org_id, task_id)
+    fair_queue.dispatch()
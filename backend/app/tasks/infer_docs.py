@@ -1,17 +1,42 @@
 from datetime import datetime
 import uuid
 
+from sqlalchemy import text
+
 from app.core.celery_app import celery_app
+from app.core.config import settings
 from app.db.session import SessionLocal
-from app.db.models.document import Document
 from app.db.models.inference import InferenceRun, DocumentInference
 from app.ml.models.emotion import predict_emotion
 
 
+# keyset page over the run's members in [seq_start, seq_end) that are not done yet, joined
+# to the documents (text_redacted is NULL once a document's partition was dropped). The
+# members are locked until the chunk commits: a concurrent redelivery of the chunk waits,
+# then no longer sees them as pending.
+_MEMBERS_PAGE = text("""
+    SELECT m.seq, m.document_id, m.event_time, d.text_redacted
+    FROM inference_run_documents m
+    LEFT JOIN documents d ON d.id = m.document_id AND d.event_time = m.event_time
+    WHERE m.inference_run_id = :run_id AND m.seq > :after AND m.seq < :seq_end AND NOT m.done
+    ORDER BY m.seq
+    LIMIT :page
+    FOR UPDATE OF m
+""")
+
+_MARK_DONE = text("""
+    UPDATE inference_run_documents SET done = true
+    WHERE inference_run_id = :run_id AND seq = ANY(:seqs)
+""")
+
+
 @celery_app.task(name="infer_docs.run_emotion_inference")
-def run_emotion_inference(inference_run_id: str, document_ids: list[str]) -> dict:
+def run_emotion_inference(inference_run_id: str, seq_start: int, seq_end: int) -> dict:
+    """
+    Infers one chunk of a run: members seq_start <= seq < seq_end of inference_run_documents.
+    The message only carries the run id and the range, whatever the run size.
+    """
     run_uuid = uuid.UUID(inference_run_id)
-    doc_uuids = [uuid.UUID(d) for d in document_ids]
 
     db = SessionLocal()
     try:
@@ -19,56 +44,74 @@ def run_emotion_inference(inference_run_id: str, document_ids: list[str]) -> dic
         if run is None:
             return {"ok": False, "error": "inference_run not found"}
 
-        run.status = "running"
-        run.started_at = run.started_at or datetime.utcnow()
-        db.commit()
+        if run.status == "queued":
+            run.status = "running"
+            run.started_at = run.started_at or datetime.utcnow()
+            db.commit()
 
         inserted = 0
+        missing = 0
+        after = seq_start - 1
+        while True:
+            page = db.execute(_MEMBERS_PAGE, {
+                "run_id": run_uuid,
+                "after": after,
+                "seq_end": seq_end,
+                "page": settings.inference_page_size,
+            }).fetchall()
+            if not page:
+                break
 
-        docs = db.query(Document).filter(Document.id.in_(doc_uuids)).all()
-        docs_by_id = {d.id: d for d in docs}
-
-        for doc_id in doc_uuids:
-            doc = docs_by_id.get(doc_id)
-            if doc is None:
-                continue
-
-            pred = predict_emotion(doc.text_redacted)
+            for m in page:
+                if m.text_redacted is None:
+                    missing += 1
+                    continue
+                pred = predict_emotion(m.text_redacted)
 
-            row = DocumentInference(
-                document_id=doc.id,
-                inference_run_id=run.id,
-                sentiment=pred.sentiment,
-                emotion_labels=pred.emotion_labels,
-                calibrated_confidence=pred.calibrated_confidence,
-                # optional generic payload too
-                result={
-                    "sentiment": pred.sentiment,
-                    "emotion_labels": pred.emotion_labels,
-                    "calibrated_confidence": pred.calibrated_confidence,
-                },
-            )
-            db.add(row)
-            inserted += 1
+                row = DocumentInference(
+                    document_id=m.document_id,
+                    event_time=m.event_time,
+                    inference_run_id=run_uuid,
+                    sentiment=pred.sentiment,
+                    emotion_labels=pred.emotion_labels,
+                    calibrated_confidence=pred.calibrated_confidence,
+                    # optional generic payload too
+                    result={
+                        "sentiment": pred.sentiment,
+                        "emotion_labels": pred.emotion_labels,
+                        "calibrated_confidence": pred.calibrated_confidence,
+                    },
+                )
+                db.add(row)
+                inserted += 1
+            db.execute(_MARK_DONE, {"run_id": run_uuid, "seqs": [m.seq for m in page]})
+            after = page[-1].seq
 
-        run.status = "completed"
-        run.finished_at = datetime.utcnow()
-        run.summary = {"inserted": inserted}
+        # progress (only members this delivery marked done) + completion under a row lock,
+        # in the same transaction as the results, so concurrent chunks of the run serialize
+        # and exactly one of them completes it
+        run = db.get(InferenceRun, run_uuid, with_for_update=True, populate_existing=True)
+        run.documents_done = (run.documents_done or 0) + inserted + missing
+        run.summary = {**(run.summary or {}), "processed": run.documents_done}
+        if run.status != "failed" and (run.document_count is None or run.documents_done >= run.document_count):
+            run.status = "completed"
+            run.finished_at = datetime.utcnow()
         db.commit()
 
-        return {"ok": True, "inserted": inserted}
+        return {"ok": True, "seq_start": seq_start, "seq_end": seq_end, "inserted": inserted, "missing": missing}
 
     except Exception as e:
+        db.rollback()
         # best-effort mark failed
         try:
             run = db.get(InferenceRun, run_uuid)
             if run is not None:
                 run.status = "failed"
                 run.finished_at = datetime.utcnow()
-                run.summary = {"error": str(e)}
+                run.summary = {**(run.summary or {}), "error": str(e), "failed_chunk": [seq_start, seq_end]}
                 db.commit()
         except Exception:
             pass
         raise
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
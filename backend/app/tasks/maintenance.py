@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.db.partitions import ensure_monthly_partitions, drop_partitions_before, add_months, month_start
+
+
+@celery_app.task(name="maintenance.ensure_partitions")
+def ensure_partitions(months_ahead: int | None = None) -> dict:
+    """
+    Creates monthly partitions of documents / document_inference for the current
+    month and the next `months_ahead` months (default: settings.partition_months_ahead).
+    Each month commits on its own; months that failed are listed in "failed".
+    """
+    db = SessionLocal()
+    try:
+        ahead = settings.partition_months_ahead if months_ahead is None else int(months_ahead)
+        created, failed = ensure_monthly_partitions(db, datetime.now(timezone.utc).date(), ahead)
+        return {"ok": not failed, "created": created, "failed": failed}
+
+    finally:
+        db.close()
+
+
+@celery_app.task(name="maintenance.drop_expired_partitions")
+def drop_expired_partitions(retention_months: int | None = None) -> dict:
+    """
+    Retention by partition drop: removes documents (and their inference, evidence and
+    topic assignments) in months older than `retention_months` full months
+    (default: settings.document_retention_months).
+    """
+    db = SessionLocal()
+    try:
+        keep = settings.document_retention_months if retention_months is None else int(retention_months)
+        cutoff = add_months(month_start(datetime.now(timezone.utc).date()), -keep)
+        dropped = drop_partitions_before(db, cutoff)
+        db.commit()
+        return {"ok": True, "cutoff": cutoff.isoformat(), "dropped": dropped}
+
+    finally:
+        db.close()
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta, timezone
+import time
+import uuid
+from typing import Callable
+
+from celery import chain, chord, group
+from sqlalchemy import text
+
+from app.core.celery_app import PRIORITY_HIGH, celery_app
+from app.core.config import settings
+from app.db.org_scope import NO_ORG
+from app.db.session import SessionLocal
+
+# stage name -> runner(day, org_id, options); each runs a standalone task's body in-process.
+# Tasks are looked up by registered name when a stage runs: importing the task modules
+# here would be circular (celery_app imports this module once they are registered).
+def _run(task_name: str, *args, **kwargs):
+    return celery_app.tasks[task_name](*args, **kwargs)
+
+
+STAGES: dict[str, Callable[[str, str, dict], dict]] = {
+    "emotion_daily": lambda day, org, opts: _run("aggregations.compute_emotion_daily", day, org),
+    "emotion_rolling": lambda day, org, opts: _run(
+        "aggregations.compute_emotion_rolling", day, None, bool(opts.get("full_rebuild")), org
+    ),
+    "emotion_cumulative": lambda day, org, opts: _run("aggregations.compute_emotion_cumulative", day, False, org),
+    "ewma_state": lambda day, org, opts: _run("aggregations.update_ewma_state", "day", day, org),
+    "spike_candidates": lambda day, org, opts: _run("aggregations.compute_spike_candidates", day, org),
+    "risk_spikes": lambda day, org, opts: _run("aggregations.detect_risk_spikes", day, org_id=org),
+    "alert_rules": lambda day, org, opts: _run("alerting.run_rules", day, org),
+}
+
+# stages on the path to alerts (sent at high priority)
+ALERT_STAGES = {"ewma_state", "spike_candidates", "risk_spikes", "alert_rules"}
+
+# stage -> stages it reads from, directly or not; it is skipped for an org once one of them failed
+UPSTREAM: dict[str, set[str]] = {
+    "emotion_daily": set(),
+    "emotion_rolling": {"emotion_daily"},
+    "emotion_cumulative": {"emotion_daily"},
+    "ewma_state": {"emotion_daily"},
+    "spike_candidates": {"emotion_daily"},
+    "risk_spikes": {"emotion_daily", "ewma_state", "spike_candidates"},
+    "alert_rules": {"emotion_daily", "ewma_state", "spike_candidates"},
+}
+
+
+def _record(action: str, run_id: str, meta: dict) -> None:
+    from app.tasks.alerting import audit
+
+    db = SessionLocal()
+    try:
+        audit(db, action, "pipeline_run", run_id, meta)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _failed_stages(run_id: str) -> list[dict]:
+    """(stage, org_id) of the run's stages that failed for good or were skipped."""
+    db = SessionLocal()
+    try:
+        rows = db.execute(text("""
+            SELECT meta FROM audit_log
+            WHERE entity_type = 'pipeline_run' AND entity_id = :run_id
+              AND action IN ('pipeline_stage_failed', 'pipeline_stage_skipped')
+        """), {"run_id": run_id}).scalars()
+        return [{"stage": m["stage"], "org_id": m["org_id"]} for m in rows]
+    finally:
+        db.close()
+
+
+def _tenants(db, day: date) -> list[str]:
+    """
+    Registered orgs plus any org with documents on `day`, then the org-less lane
+    (documents ingested without an org), which always runs like a registered org.
+    """
+    day_start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+    rows = db.execute(text("""
+        SELECT org_id FROM organizations
+        UNION
+        SELECT DISTINCT org_id FROM documents
+        WHERE event_time >= :start AND event_time < :end AND org_id IS NOT NULL
+    """), {"start": day_start, "end": day_start + timedelta(days=1)}).fetchall()
+    return sorted(r[0] for r in rows) + [NO_ORG]
+
+
+@celery_app.task(name="pipeline.run_stage", bind=True, max_retries=settings.pipeline_stage_max_retries)
+def run_stage(self, run_id: str, stage: str, day: str, org_id: str, options: dict | None = None) -> dict:
+    """
+    Runs one stage of the nightly pipeline for one org and audits its timing. A failure
+    is retried for that org only; once retries are exhausted it is audited and the stage
+    returns, so the run's chord still completes. That org's stages reading from a failed
+    (or skipped) stage are then skipped.
+    """
+    started_at = datetime.now(timezone.utc)
+    t0 = time.monotonic()
+    meta = {"stage": stage, "day": day, "org_id": org_id, "attempt": self.request.retries + 1}
+
+    failed_upstream = sorted(
+        f["stage"] for f in _failed_stages(run_id) if f["org_id"] == org_id and f["stage"] in UPSTREAM[stage]
+    )
+    if failed_upstream:
+        _record("pipeline_stage_skipped", run_id, {**meta, "failed_upstream": failed_upstream})
+        return {"stage": stage, "org_id": org_id, "skipped": True}
+
+    try:
+        result = STAGES[stage](day, org_id, options or {})
+    except Exception as exc:
+        meta.update(
+            started_at=started_at.isoformat(),
+            duration_ms=int((time.monotonic() - t0) * 1000),
+            error=repr(exc),
+        )
+        if self.request.retries < self.max_retries:
+            _record("pipeline_stage_retrying", run_id, meta)
+            raise self.retry(exc=exc, countdown=settings.pipeline_stage_retry_delay)
+        _record("pipeline_stage_failed", run_id, meta)
+        return {"stage": stage, "org_id": org_id, "failed": True, "error": repr(exc)}
+
+    meta.update(
+        started_at=started_at.isoformat(),
+        duration_ms=int((time.monotonic() - t0) * 1000),
+        result=result,
+    )
+    _record("pipeline_stage_completed", run_id, meta)
+    return {"stage": stage, "org_id": org_id, "result": result}
+
+
+@celery_app.task(name="pipeline.finish_run")
+def finish_run(results: list | None, run_id: str, day: str, triggered_at: str) -> dict:
+    """Closes the run: pipeline_run_completed, or pipeline_run_partial listing the stages that did not run."""
+    duration_ms = int((datetime.now(timezone.utc) - datetime.fromisoformat(triggered_at)).total_seconds() * 1000)
+    failed = _failed_stages(run_id)
+    status = "partial" if failed else "completed"
+    _record(f"pipeline_run_{status}", run_id, {"day": day, "duration_ms": duration_ms, "failed": failed})
+    return {"ok": not failed, "run_id": run_id, "day": day, "status": status, "duration_ms": duration_ms, "failed": failed}
+
+
+def tenant_pipeline(run_id: str, day: str, org_id: str, full_rebuild: bool):
+    """
+    One org's nightly DAG; every stage starts as soon as the stages it reads from finish:
+
+        emotion_daily ─┬─ emotion_rolling
+                       ├─ emotion_cumulative
+                       └─ (ewma_state, spike_candidates) ─┬─ risk_spikes
+                                                          └─ alert_rules
+
+    Signatures are immutable: stages exchange data through the database, not results.
+    Alert stages jump ahead of other analytics work on the queue.
+    """
+    def stage(name: str, **options):
+        sig = run_stage.si(run_id, name, day, org_id, options or None)
+        return sig.set(priority=PRIORITY_HIGH) if name in ALERT_STAGES else sig
+
+    return chain(
+        stage("emotion_daily"),
+        group(
+            stage("emotion_rolling", full_rebuild=full_rebuild),
+            stage("emotion_cumulative"),
+            chain(
+                group(stage("ewma_state"), stage("spike_candidates")),
+                group(stage("risk_spikes"), stage("alert_rules")),
+            ),
+        ),
+    )
+
+
+def nightly_pipeline(run_id: str, day: str, org_ids: list[str], full_rebuild: bool, triggered_at: str):
+    """
+    The per-org DAGs run side by side, so a large or failing tenant does not hold back
+    the others' alerts; finish_run fires once every org is done.
+    """
+    return chord(
+        [tenant_pipeline(run_id, day, org_id, full_rebuild) for org_id in org_ids],
+        finish_run.s(run_id, day, triggered_at),
+    )
+
+
+@celery_app.task(name="pipeline.run_nightly")
+def run_nightly(day: str | None = None, full_rebuild: bool | None = None) -> dict:
+    """
+    Triggers the nightly aggregation -> detection -> rule-engine pipeline for `day`
+    (default: yesterday, resolved once so every stage works on the same day), fanned
+    out per org. Rolling windows are fully rebuilt on Sundays unless full_rebuild says
+    otherwise.
+    """
+    now = datetime.now(timezone.utc)
+    target_day = date.fromisoformat(day) if day else (now - timedelta(days=1)).date()
+    rebuild = now.weekday() == 6 if full_rebuild is None else bool(full_rebuild)
+    run_id = str(uuid.uuid4())
+
+    db = SessionLocal()
+    try:
+        org_ids = _tenants(db, target_day)
+    finally:
+        db.close()
+
+    _record("pipeline_run_started", run_id, {
+        "day": target_day.isoformat(),
+        "full_rebuild": rebuild,
+        "orgs": len(org_ids),
+    })
+    if org_ids:
+        nightly_pipeline(run_id, target_day.isoformat(), org_ids, rebuild, now.isoformat()).apply_async()
+
+    return {"ok": True, "run_id": run_id, "day": target_day.isoformat(), "orgs": org_ids, "full_rebuild": rebuild}
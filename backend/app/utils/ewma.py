@@ -0,0 +1,240 @@
+"""
+Streaming EWMA anomaly detection over per-segment negative_rate.
+
+Instead of re-reading a baseline window every night, each (org_id, team_id, channel)
+keeps an exponentially weighted mean/variance in segment_ewma_state. A new bucket
+(day or hour) is scored against that state and then folded into it, which is O(1)
+per segment; the state can be rebuilt from the daily rollup with replay_ewma.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.db import org_scope
+from app.utils.spikes import MIN_HISTORY, MIN_LIFT, SegmentSeries, SpikeCandidate
+
+GRAINS = ("day", "hour")
+STD_FLOOR = 0.02  # rate units; keeps z finite while a segment's variance is still ~0
+# buckets with fewer documents are not folded in (nor scored): a 1-2 document hour has a
+# rate of 0 or 1 and would inflate var and drag mean, as robust_z masks thin baseline days
+MIN_BUCKET_DOCS = 10
+
+# one observation per segment for the bucket; segments below min_docs are left untouched
+_OBSERVATIONS = {
+    "day": """
+        SELECT org_id, team_id, channel, doc_count AS total,
+               negative_count::float / doc_count AS rate
+        FROM emotion_rollup
+        WHERE grain = 'channel'
+          AND day = CAST(CAST(:bucket AS timestamptz) AT TIME ZONE 'UTC' AS date)
+          AND doc_count >= :min_docs
+    """,
+    "hour": """
+        SELECT org_id, team_id, channel, doc_count AS total,
+               negative_count::float / doc_count AS rate
+        FROM emotion_hourly
+        WHERE hour = :bucket AND doc_count >= :min_docs
+    """,
+}
+
+
+def day_bucket(d: date) -> datetime:
+    return datetime(d.year, d.month, d.day, tzinfo=timezone.utc)
+
+
+def advance_ewma_state(
+    db: Session,
+    grain: str,
+    bucket: datetime,
+    alpha: float,
+    org_id: str | None = None,
+    min_docs: int = MIN_BUCKET_DOCS,
+) -> int:
+    """
+    Scores `bucket` against each segment's state (of one org, if given) and folds it in,
+    in one upsert; segments with fewer than min_docs documents in it are skipped. State
+    already at or past `bucket` is left alone, so re-runs are no-ops: fold a bucket only
+    once its source rows are final. Returns the number of segments inserted or advanced.
+    """
+    if min_docs < 1:
+        raise ValueError("min_docs must be at least 1")
+    if grain not in GRAINS:
+        raise ValueError(f"unknown EWMA grain: {grain!r}")
+    org_filter = " WHERE TRUE" + org_scope.org_filter("o", org_id)
+
+    # SET expressions all see the pre-update row, so last_* score against the old state
+    result = db.execute(text(f"""
+        INSERT INTO segment_ewma_state AS s (
+          id, grain, alpha, org_id, team_id, channel,
+          n, mean, var,
+          last_bucket, last_value, last_total, last_mean, last_std, last_z, updated_at
+        )
+        SELECT
+          gen_random_uuid(), :grain, :alpha, o.org_id, o.team_id, o.channel,
+          1, o.rate, 0.0,
+          :bucket, o.rate, o.total, NULL, NULL, NULL, NOW()
+        FROM ({_OBSERVATIONS[grain]}) o{org_filter}
+        ON CONFLICT ON CONSTRAINT uq_segment_ewma_state_segment DO UPDATE SET
+          n = s.n + 1,
+          mean = s.mean + :alpha * (EXCLUDED.last_value - s.mean),
+          var = (1 - :alpha) * (s.var + :alpha * (EXCLUDED.last_value - s.mean) ^ 2),
+          last_bucket = EXCLUDED.last_bucket,
+          last_value = EXCLUDED.last_value,
+          last_total = EXCLUDED.last_total,
+          last_mean = s.mean,
+          last_std = SQRT(s.var),
+          last_z = (EXCLUDED.last_value - s.mean) / GREATEST(SQRT(s.var), :std_floor),
+          updated_at = NOW()
+        WHERE s.last_bucket < EXCLUDED.last_bucket
+    """), {
+        "grain": grain,
+        "alpha": float(alpha),
+        "bucket": bucket,
+        "min_docs": int(min_docs),
+        "std_floor": STD_FLOOR,
+        "org_id": org_id,
+    })
+    return result.rowcount
+
+
+@dataclass(frozen=True)
+class EwmaState:
+    """Replayed state per segment (arrays aligned with series.segments)."""
+    n: np.ndarray
+    mean: np.ndarray
+    var: np.ndarray
+    last_day: np.ndarray  # day index into the series, -1 if never observed
+    last_value: np.ndarray
+    last_total: np.ndarray
+    last_mean: np.ndarray
+    last_std: np.ndarray
+    last_z: np.ndarray
+
+
+def replay_ewma(series: SegmentSeries, alpha: float, min_docs: int = MIN_BUCKET_DOCS) -> EwmaState:
+    """
+    Runs the same recursion as advance_ewma_state over every day of the series (skipping
+    days with fewer than min_docs documents), vectorized across segments; used to
+    backfill day-grain state.
+    """
+    n_seg = len(series.segments)
+    n = np.zeros(n_seg, dtype=np.int64)
+    mean = np.zeros(n_seg)
+    var = np.zeros(n_seg)
+    last_day = np.full(n_seg, -1, dtype=np.int64)
+    last_value = np.zeros(n_seg)
+    last_total = np.zeros(n_seg, dtype=np.int64)
+    last_mean = np.full(n_seg, np.nan)
+    last_std = np.full(n_seg, np.nan)
+    last_z = np.full(n_seg, np.nan)
+
+    rate = series.rate
+    for j in range(series.n_days):
+        obs = series.total[:, j] >= min_docs
+        if not obs.any():
+            continue
+        x = rate[:, j]
+        first = obs & (n == 0)
+        upd = obs & (n > 0)
+        diff = x - mean
+        std = np.sqrt(var)
+
+        last_mean = np.where(upd, mean, np.where(first, np.nan, last_mean))
+        last_std = np.where(upd, std, np.where(first, np.nan, last_std))
+        last_z = np.where(upd, diff / np.maximum(std, STD_FLOOR), np.where(first, np.nan, last_z))
+
+        mean = np.where(first, x, np.where(upd, mean + alpha * diff, mean))
+        var = np.where(first, 0.0, np.where(upd, (1 - alpha) * (var + alpha * diff ** 2), var))
+        n = n + obs
+        last_day = np.where(obs, j, last_day)
+        last_value = np.where(obs, x, last_value)
+        last_total = np.where(obs, series.total[:, j], last_total)
+
+    return EwmaState(
+        n=n, mean=mean, var=var, last_day=last_day, last_value=last_value, last_total=last_total,
+        last_mean=last_mean, last_std=last_std, last_z=last_z,
+    )
+
+
+def ewma_state_rows(series: SegmentSeries, state: EwmaState, alpha: float) -> list[dict]:
+    """segment_ewma_state rows (day grain) for every segment observed in the series."""
+    def _opt(v: float) -> float | None:
+        return None if np.isnan(v) else float(v)
+
+    now = datetime.now(timezone.utc)
+    rows = []
+    for i in np.flatnonzero(state.n > 0):
+        org_id, team_id, channel = series.segments[i]
+        rows.append({
+            "grain": "day",
+            "alpha": float(alpha),
+            "org_id": org_id,
+            "team_id": team_id,
+            "channel": channel,
+            "n": int(state.n[i]),
+            "mean": float(state.mean[i]),
+            "var": float(state.var[i]),
+            "last_bucket": day_bucket(series.start + timedelta(days=int(state.last_day[i]))),
+            "last_value": float(state.last_value[i]),
+            "last_total": int(state.last_total[i]),
+            "last_mean": _opt(state.last_mean[i]),
+            "last_std": _opt(state.last_std[i]),
+            "last_z": _opt(state.last_z[i]),
+            "updated_at": now,
+        })
+    return rows
+
+
+def ewma_spikes(
+    db: Session,
+    grain: str,
+    bucket: datetime,
+    alpha: float,
+    z_threshold: float,
+    min_docs: int,
+    min_history: int = MIN_HISTORY,
+    org_id: str | None = None,
+) -> list[SpikeCandidate]:
+    """
+    Upward spikes in `bucket` from the persisted state: segments advanced to this bucket
+    whose score crossed z_threshold with at least min_history prior buckets. Buckets below
+    MIN_BUCKET_DOCS are never advanced, so a lower min_docs has no effect.
+    SpikeCandidate.median / .mad carry the EWMA mean / std here.
+    """
+    org_filter = org_scope.org_filter(None, org_id)
+    rows = db.execute(text(f"""
+        SELECT org_id, team_id, channel, last_value, last_total, last_mean, last_std, last_z
+        FROM segment_ewma_state
+        WHERE grain = :grain AND alpha = :alpha AND last_bucket = :bucket{org_filter}
+          AND n - 1 >= :min_history
+          AND last_total >= :min_docs
+          AND last_z >= :z_threshold
+          AND last_value >= last_mean + :min_lift
+    """), {
+        "grain": grain,
+        "alpha": float(alpha),
+        "bucket": bucket,
+        "min_history": int(min_history),
+        "min_docs": int(min_docs),
+        "z_threshold": float(z_threshold),
+        "min_lift": MIN_LIFT,
+        "org_id": org_id,
+    }).fetchall()
+
+    return [
+        SpikeCandidate(
+            segment=(r.org_id, r.team_id, r.channel),
+            value=float(r.last_value),
+            total=int(r.last_total),
+            median=float(r.last_mean),
+            mad=float(r.last_std),
+            z=float(r.last_z),
+            severity="high" if r.last_z >= z_threshold * 1.5 else "medium",
+        )
+        for r in rows
+    ]
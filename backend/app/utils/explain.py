@@ -1,37 +1,91 @@
 import re
+from functools import lru_cache
 from typing import Iterable
 
+_WORD_CHAR = re.compile(r"\w")
+
+
+def _is_boundary(s: str, i: int) -> bool:
+    """True if a regex \\b holds between s[i-1] and s[i]."""
+    return bool(_WORD_CHAR.match(s[i - 1])) != bool(_WORD_CHAR.match(s[i]))
+
+
+class KeywordMatcher:
+    """
+    All keywords of a rule compiled into one case-insensitive alternation.
+
+    scan() makes a single pass over the text. The alternation sits in a lookahead so
+    matches starting inside an earlier match are still found; keywords that are
+    word-boundary prefixes of a longer match at the same position (e.g. "burn" inside
+    "burn out") are credited via a precomputed table. Hits are the same set the
+    per-keyword \\b...\\b search finds.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords: tuple[str, ...] = tuple(dict.fromkeys(kw.lower() for kw in keywords if kw))
+
+        self._pattern: re.Pattern | None = None
+        if self.keywords:
+            # longest first so the alternation prefers the longest keyword at each position
+            alts = "|".join(re.escape(k) for k in sorted(self.keywords, key=len, reverse=True))
+            self._pattern = re.compile(rf"(?=\b({alts})\b)", re.IGNORECASE)
+
+        self._implied: dict[str, tuple[str, ...]] = {
+            k: tuple(p for p in self.keywords if p != k and k.startswith(p) and _is_boundary(k, len(p)))
+            for k in self.keywords
+        }
+
+    def scan(self, text: str) -> tuple[list[str], list[tuple[int, int]]]:
+        """Returns (unique hits in first-seen order, merged (start, end) spans)."""
+        if self._pattern is None or not text:
+            return [], []
+
+        hits: list[str] = []
+        seen: set[str] = set()
+        spans: list[tuple[int, int]] = []
+        for m in self._pattern.finditer(text):
+            kw = m.group(1).lower()
+            for k in (kw, *self._implied.get(kw, ())):
+                if k not in seen:
+                    seen.add(k)
+                    hits.append(k)
+            start, end = m.start(1), m.end(1)
+            # matches arrive in start order, so merging only needs the last span
+            if spans and start <= spans[-1][1]:
+                if end > spans[-1][1]:
+                    spans[-1] = (spans[-1][0], end)
+            else:
+                spans.append((start, end))
+        return hits, spans
+
+    @staticmethod
+    def highlights(text: str, spans: list[tuple[int, int]]) -> list[dict]:
+        return [{"start": s, "end": e, "label": "keyword", "text": text[s:e]} for (s, e) in spans]
+
+    def match(self, text: str) -> tuple[list[str], list[dict]]:
+        hits, spans = self.scan(text)
+        return hits, self.highlights(text, spans)
+
+
+@lru_cache(maxsize=512)
+def _compiled_matcher(keywords: tuple[str, ...]) -> KeywordMatcher:
+    return KeywordMatcher(keywords)
+
+
+def keyword_matcher(keywords: Iterable[str]) -> KeywordMatcher:
+    """
+    Cached matcher for a keyword list. Rules are keyed by their keyword tuple (the only
+    part of a definition the matcher depends on), so it is compiled once per definition.
+    """
+    return _compiled_matcher(tuple(keywords))
+
+
 def find_keyword_spans(text: str, keywords: Iterable[str]) -> tuple[list[str], list[dict]]:
     """
     Returns (hits, highlights).
-    highlights: [{"start": int, "end": int, "label":"keyword", "text": "..."}]
-    """
-    hits: list[str] = []
-    highlights: list[dict] = []
-
-    for kw in keywords:
-        if not kw:
-            continue
-        # word-ish match, case-insensitive
-        pattern = re.compile(rf"\b{re.escape(kw)}\b", re.IGNORECASE)
-        for m in pattern.finditer(text):
-            hits.append(kw.lower())
-            highlights.append(
-                {
-                    "start": m.start(),
-                    "end": m.end(),
-                    "label": "keyword",
-                    "text": text[m.start():m.end()],
-                }
-            )
-    # unique hits, preserve first-seen order
-    seen = set()
-    uniq_hits = []
-    for h in hits:
-        if h not in seen:
-            uniq_hits.append(h)
-            seen.add(h)
-    return uniq_hits, highlights
+    highlights: [{"start": int, "end": int, "label":"keyword", "text": "..."}], overlapping spans merged
+    """
+    return keyword_matcher(keywords).match(text)
 
 
 def compute_contribution(
@@ -44,6 +98,7 @@ def compute_contribution(
 ) -> float:
     """
     Very simple weighted score for ranking evidence docs.
+    alerting.select_evidence computes the same score in SQL; keep the two in step.
     """
     target_emotions = target_emotions or set()
 
@@ -0,0 +1,212 @@
+"""
+Columnar rule evaluation over a shared (segment x day) table.
+
+The channel and channel_emotion grains of emotion_rollup are read once into dense
+arrays. Each metric_spike rule definition compiles to a RuleOp on one metric column;
+rules sharing (metric, baseline_days, min_docs) are scored together with one robust
+z-score pass, and every rule's threshold in the group is applied as a single vector
+comparison.
+
+risk_spike rules are not evaluated here: run_rules reads them from the materialized
+spike_candidates (app.utils.spikes), which detect_risk_spikes and dashboards share.
+A metric_spike rule on negative_rate is therefore scored apart from risk_spike rules
+on the same window.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.db import org_scope
+from app.utils.spikes import MIN_LIFT, Segment, SpikeCandidate, robust_z
+
+
+@dataclass(frozen=True)
+class MetricSpec:
+    direction: int         # +1 alerts on rises, -1 on drops
+    min_lift: float        # default minimum move away from the median
+    relative_lift: bool    # min_lift is a fraction of the median rather than absolute
+    mask_baseline: bool    # ignore baseline days with fewer than min_docs documents
+
+
+METRICS: dict[str, MetricSpec] = {
+    "negative_rate": MetricSpec(direction=1, min_lift=MIN_LIFT, relative_lift=False, mask_baseline=True),
+    "emotion_share": MetricSpec(direction=1, min_lift=MIN_LIFT, relative_lift=False, mask_baseline=True),
+    "volume": MetricSpec(direction=1, min_lift=0.5, relative_lift=True, mask_baseline=False),
+    "avg_confidence": MetricSpec(direction=-1, min_lift=0.05, relative_lift=False, mask_baseline=True),
+}
+
+
+@dataclass(frozen=True)
+class SegmentTable:
+    """Per-segment daily columns; days are contiguous from start."""
+    start: date
+    segments: list[Segment]
+    emotions: list[str]
+    total: np.ndarray          # (segments, days) label rows, as in emotion_rollup
+    neg: np.ndarray            # (segments, days)
+    conf_sum: np.ndarray       # (segments, days) total * avg_confidence
+    emotion_count: np.ndarray  # (segments, emotions, days)
+
+    @property
+    def n_days(self) -> int:
+        return self.total.shape[1]
+
+    def day_index(self, d: date) -> int:
+        return (d - self.start).days
+
+    def column(self, metric: str, emotion: str | None = None) -> np.ndarray:
+        """(segments, days) values of one metric; days without documents are 0."""
+        denom = np.maximum(self.total, 1)
+        if metric == "negative_rate":
+            num = self.neg
+        elif metric == "emotion_share":
+            if emotion not in self.emotions:
+                return np.zeros(self.total.shape)
+            num = self.emotion_count[:, self.emotions.index(emotion), :]
+        elif metric == "avg_confidence":
+            num = self.conf_sum
+        elif metric == "volume":
+            return self.total.astype(float)
+        else:
+            raise ValueError(f"unknown metric: {metric!r}")
+        return np.where(self.total > 0, num / denom, 0.0)
+
+
+def load_segment_table(db: Session, start: date, end: date, org_id: str | None = None) -> SegmentTable:
+    """One read of emotion_rollup (channel + channel_emotion grains) for [start, end]."""
+    org_filter = org_scope.org_filter(None, org_id)
+    rows = db.execute(text(f"""
+        SELECT day, grain, org_id, team_id, channel, emotion, doc_count, negative_count, avg_confidence
+        FROM emotion_rollup
+        WHERE grain IN ('channel', 'channel_emotion') AND day >= :start AND day <= :end{org_filter}
+    """), {"start": start, "end": end, "org_id": org_id}).fetchall()
+
+    n_days = (end - start).days + 1
+    seg_index: dict[Segment, int] = {}
+    emo_index: dict[str, int] = {}
+    for r in rows:
+        seg_index.setdefault((r.org_id, r.team_id, r.channel), len(seg_index))
+        if r.grain == "channel_emotion" and r.emotion is not None:
+            emo_index.setdefault(r.emotion, len(emo_index))
+
+    total = np.zeros((len(seg_index), n_days), dtype=np.int64)
+    neg = np.zeros((len(seg_index), n_days), dtype=np.int64)
+    conf_sum = np.zeros((len(seg_index), n_days))
+    emotion_count = np.zeros((len(seg_index), len(emo_index), n_days), dtype=np.int64)
+    for r in rows:
+        i = seg_index[(r.org_id, r.team_id, r.channel)]
+        j = (r.day - start).days
+        if r.grain == "channel":
+            total[i, j] = int(r.doc_count or 0)
+            neg[i, j] = int(r.negative_count or 0)
+            conf_sum[i, j] = float(r.avg_confidence or 0.0) * int(r.doc_count or 0)
+        elif r.emotion is not None:
+            emotion_count[i, emo_index[r.emotion], j] = int(r.doc_count or 0)
+
+    return SegmentTable(
+        start=start,
+        segments=list(seg_index),
+        emotions=list(emo_index),
+        total=total,
+        neg=neg,
+        conf_sum=conf_sum,
+        emotion_count=emotion_count,
+    )
+
+
+@dataclass(frozen=True)
+class RuleOp:
+    """A rule definition compiled against the segment table."""
+    rule_id: str
+    rule_name: str
+    metric: str
+    emotion: str | None
+    baseline_days: int
+    min_docs: int
+    z_threshold: float
+    min_lift: float
+
+    @property
+    def metric_key(self) -> str:
+        return f"{self.metric}:{self.emotion}" if self.emotion else self.metric
+
+    @property
+    def direction(self) -> int:
+        return METRICS[self.metric].direction
+
+
+def compile_rule(rule_id: str, rule_name: str, definition: dict) -> RuleOp:
+    """
+    Compiles a metric_spike rule; its definition names the metric ("negative_rate",
+    the default, "emotion_share" + "emotion", "volume", "avg_confidence").
+    """
+    d = definition or {}
+    metric = d.get("metric", "negative_rate")
+    if metric not in METRICS:
+        raise ValueError(f"unknown metric: {metric!r}")
+    emotion = d.get("emotion") if metric == "emotion_share" else None
+    if metric == "emotion_share" and not emotion:
+        raise ValueError("emotion_share rules need an 'emotion'")
+
+    return RuleOp(
+        rule_id=rule_id,
+        rule_name=rule_name,
+        metric=metric,
+        emotion=emotion,
+        baseline_days=int(d.get("baseline_days", 30)),
+        min_docs=int(d.get("min_docs", 10)),
+        z_threshold=float(d.get("z_threshold", 3.5)),
+        min_lift=float(d.get("min_lift", METRICS[metric].min_lift)),
+    )
+
+
+def evaluate_rules(table: SegmentTable, ops: list[RuleOp], target_day: date) -> dict[str, list[SpikeCandidate]]:
+    """
+    Hits per rule_id for target_day. Each (metric, baseline_days, min_docs) group is
+    scored once; candidates carry the raw z (negative for drops).
+    """
+    groups: dict[tuple[str, int, int], list[RuleOp]] = {}
+    for op in ops:
+        groups.setdefault((op.metric_key, op.baseline_days, op.min_docs), []).append(op)
+
+    t = table.day_index(target_day)
+    out: dict[str, list[SpikeCandidate]] = {op.rule_id: [] for op in ops}
+    for (_key, baseline_days, min_docs), group in groups.items():
+        b0 = table.day_index(target_day - timedelta(days=baseline_days))
+        if t < 0 or t >= table.n_days or b0 < 0:
+            raise ValueError("table does not cover the target day and its baseline window")
+
+        spec = METRICS[group[0].metric]
+        col = table.column(group[0].metric, group[0].emotion)
+        base_total = table.total[:, b0:t] if spec.mask_baseline else np.full((len(table.segments), t - b0), min_docs)
+        med, mad, z, ok = robust_z(col[:, b0:t], base_total, col[:, t], table.total[:, t], min_docs)
+
+        x = col[:, t]
+        score = spec.direction * z
+        lift = spec.direction * (x - med)
+        thresholds = np.array([op.z_threshold for op in group])
+        lifts = np.array([op.min_lift for op in group])
+        need = np.abs(med)[:, None] * lifts[None, :] if spec.relative_lift else lifts[None, :]
+
+        with np.errstate(invalid="ignore"):
+            hit = ok[:, None] & (score[:, None] >= thresholds[None, :]) & (lift[:, None] >= need)
+
+        for i, r in np.argwhere(hit):
+            op = group[r]
+            out[op.rule_id].append(
+                SpikeCandidate(
+                    segment=table.segments[i],
+                    value=float(x[i]),
+                    total=int(table.total[i, t]),
+                    median=float(med[i]),
+                    mad=float(mad[i]),
+                    z=float(z[i]),
+                    severity="high" if score[i] >= op.z_threshold * 1.5 else "medium",
+                )
+            )
+    return out
@@ -0,0 +1,549 @@
+"""
+Robust z-score spike detection over a (segment x day) matrix.
+
+The daily series for every segment is loaded once into NumPy arrays and median /
+MAD / z-scores are computed for all segments at once. materialize_spike_candidates
+stores those statistics in spike_candidates, which aggregations.detect_risk_spikes,
+alerting.run_rules and dashboards read instead of each re-scoring the series.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import cached_property
+from datetime import date, timedelta
+import warnings
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.db import org_scope
+from app.db.models.aggregations import SpikeCandidateStat
+from app.db.upsert import changed_predicate, null_safe_match, upsert_replace_ctes
+
+Segment = tuple[str | None, str | None, str | None]  # (org_id, team_id, channel)
+
+MAD_SCALE = 1.4826
+MIN_HISTORY = 7  # baseline days (with >= min_docs) needed before a segment can alert
+MIN_LIFT = 0.10  # value must also exceed the median by this much
+
+
+@dataclass(frozen=True)
+class SegmentSeries:
+    """Daily negative/total counts per segment; days are contiguous from start to end."""
+    start: date
+    segments: list[Segment]
+    neg: np.ndarray    # (segments, days) int
+    total: np.ndarray  # (segments, days) int
+
+    @property
+    def n_days(self) -> int:
+        return self.total.shape[1]
+
+    def day_index(self, d: date) -> int:
+        return (d - self.start).days
+
+    @cached_property
+    def rate(self) -> np.ndarray:
+        # computed once per series, however many rules/windows score it
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(self.total > 0, self.neg / np.maximum(self.total, 1), 0.0)
+
+
+@dataclass(frozen=True)
+class SpikeCandidate:
+    segment: Segment
+    value: float
+    total: int
+    median: float
+    mad: float
+    z: float
+    severity: str
+
+
+def load_segment_series(db: Session, start: date, end: date, org_id: str | None = None) -> SegmentSeries:
+    """Reads the channel-grain rollup for [start, end] (optionally one org) into dense (segment x day) arrays."""
+    org_filter = org_scope.org_filter(None, org_id)
+    rows = db.execute(text(f"""
+        SELECT day, org_id, team_id, channel, negative_count, doc_count
+        FROM emotion_rollup
+        WHERE grain = 'channel' AND day >= :start AND day <= :end{org_filter}
+    """), {"start": start, "end": end, "org_id": org_id}).fetchall()
+
+    n_days = (end - start).days + 1
+    seg_index: dict[Segment, int] = {}
+    for r in rows:
+        seg_index.setdefault((r[1], r[2], r[3]), len(seg_index))
+
+    neg = np.zeros((len(seg_index), n_days), dtype=np.int64)
+    total = np.zeros((len(seg_index), n_days), dtype=np.int64)
+    for r in rows:
+        i = seg_index[(r[1], r[2], r[3])]
+        j = (r[0] - start).days
+        neg[i, j] = int(r[4] or 0)
+        total[i, j] = int(r[5] or 0)
+
+    return SegmentSeries(start=start, segments=list(seg_index), neg=neg, total=total)
+
+
+def robust_z(
+    base_rate: np.ndarray,
+    base_total: np.ndarray,
+    x_rate: np.ndarray,
+    x_total: np.ndarray,
+    min_docs: int,
+    min_history: int = MIN_HISTORY,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Row-wise robust z-score of x against its baseline columns.
+
+    Baseline points with fewer than min_docs documents are masked out. Returns
+    (median, mad, z, ok) where ok marks rows with enough history and x_total >= min_docs;
+    median/mad/z are NaN elsewhere.
+    """
+    n = base_rate.shape[0]
+    med = np.full(n, np.nan)
+    mad = np.full(n, np.nan)
+    z = np.full(n, np.nan)
+
+    mask = base_total >= min_docs
+    ok = (mask.sum(axis=1) >= min_history) & (x_total >= min_docs)
+    if not ok.any():
+        return med, mad, z, ok
+
+    vals = np.where(mask[ok], base_rate[ok], np.nan)
+    m = np.nanmedian(vals, axis=1)
+    d = np.nanmedian(np.abs(vals - m[:, None]), axis=1)
+    denom = np.where(d > 1e-9, MAD_SCALE * d, 1e-9)
+
+    med[ok] = m
+    mad[ok] = d
+    z[ok] = (x_rate[ok] - m) / denom
+    return med, mad, z, ok
+
+
+@dataclass(frozen=True)
+class SegmentScores:
+    """Per-segment robust z-score inputs/outputs for one target day (arrays aligned with series.segments)."""
+    value: np.ndarray
+    total: np.ndarray
+    median: np.ndarray
+    mad: np.ndarray
+    z: np.ndarray
+    ok: np.ndarray
+
+
+def score_segments(
+    series: SegmentSeries,
+    target_day: date,
+    baseline_days: int,
+    min_docs: int,
+) -> SegmentScores:
+    """
+    Robust z-scores of target_day's negative_rate against the previous baseline_days days.
+    The series may cover a wider window than baseline_days; only the needed slice is used.
+    """
+    t = series.day_index(target_day)
+    b0 = series.day_index(target_day - timedelta(days=baseline_days))
+    if t < 0 or t >= series.n_days or b0 < 0:
+        raise ValueError("series does not cover the target day and its baseline window")
+
+    rate = series.rate
+    med, mad, z, ok = robust_z(
+        rate[:, b0:t],
+        series.total[:, b0:t],
+        rate[:, t],
+        series.total[:, t],
+        min_docs,
+    )
+    return SegmentScores(value=rate[:, t], total=series.total[:, t], median=med, mad=mad, z=z, ok=ok)
+
+
+def spikes_from_scores(
+    segments: list[Segment],
+    scores: SegmentScores,
+    z_threshold: float,
+) -> list[SpikeCandidate]:
+    """Upward spikes: z >= z_threshold and value at least MIN_LIFT above the median."""
+    hit = scores.ok & (scores.z >= z_threshold) & (scores.value >= scores.median + MIN_LIFT)
+    return [
+        SpikeCandidate(
+            segment=segments[i],
+            value=float(scores.value[i]),
+            total=int(scores.total[i]),
+            median=float(scores.median[i]),
+            mad=float(scores.mad[i]),
+            z=float(scores.z[i]),
+            severity="high" if scores.z[i] >= z_threshold * 1.5 else "medium",
+        )
+        for i in np.flatnonzero(hit)
+    ]
+
+
+def detect_spikes(
+    series: SegmentSeries,
+    target_day: date,
+    baseline_days: int,
+    z_threshold: float,
+    min_docs: int,
+) -> list[SpikeCandidate]:
+    """Upward negative_rate spikes on target_day against the previous baseline_days days."""
+    scores = score_segments(series, target_day, baseline_days, min_docs)
+    return spikes_from_scores(series.segments, scores, z_threshold)
+
+
+def backtest_spikes(
+    series: SegmentSeries,
+    first_day: date,
+    last_day: date,
+    baseline_days: int,
+    z_threshold: float,
+    min_docs: int,
+    max_cells: int = 4_000_000,
+) -> list[tuple[date, SpikeCandidate]]:
+    """
+    Every spike detect_spikes would have raised on each day of [first_day, last_day], in one pass.
+
+    Each day's baseline is a sliding window over the series (which must start baseline_days
+    before first_day); windows are flattened into (segment*day, baseline_days) rows and scored
+    with robust_z, in segment chunks of at most max_cells baseline values.
+    """
+    if baseline_days < 1:
+        raise ValueError("baseline_days must be at least 1")
+    t0, t1 = series.day_index(first_day), series.day_index(last_day)
+    b0 = t0 - baseline_days
+    if b0 < 0 or t1 >= series.n_days or t1 < t0:
+        raise ValueError("series does not cover the backtest range and its baseline window")
+
+    n_target = t1 - t0 + 1
+    rate_w = sliding_window_view(series.rate[:, b0:t1], baseline_days, axis=1)  # (segments, days, baseline)
+    total_w = sliding_window_view(series.total[:, b0:t1], baseline_days, axis=1)
+    x_rate = series.rate[:, t0:t1 + 1]
+    x_total = series.total[:, t0:t1 + 1]
+
+    out: list[tuple[date, SpikeCandidate]] = []
+    step = max(1, max_cells // (n_target * baseline_days))
+    for lo in range(0, len(series.segments), step):
+        hi = min(lo + step, len(series.segments))
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN rows are masked by ok
+            med, mad, z, ok = robust_z(
+                rate_w[lo:hi].reshape(-1, baseline_days),
+                total_w[lo:hi].reshape(-1, baseline_days),
+                x_rate[lo:hi].reshape(-1),
+                x_total[lo:hi].reshape(-1),
+                min_docs,
+            )
+        value = x_rate[lo:hi].reshape(-1)
+        hit = ok & (z >= z_threshold) & (value >= med + MIN_LIFT)
+        for k in np.flatnonzero(hit):
+            i, j = divmod(int(k), n_target)
+            out.append((
+                first_day + timedelta(days=j),
+                SpikeCandidate(
+                    segment=series.segments[lo + i],
+                    value=float(value[k]),
+                    total=int(x_total[lo + i, j]),
+                    median=float(med[k]),
+                    mad=float(mad[k]),
+                    z=float(z[k]),
+                    severity="high" if z[k] >= z_threshold * 1.5 else "medium",
+                ),
+            ))
+
+    out.sort(key=lambda item: item[0])  # stable: segment order within a day
+    return out
+
+
+def _robust_z_ctes(org_filter: str) -> str:
+    """
+    CTEs ending in `scored`: every eligible segment's robust z-score of :target against
+    the days in [:start, :target), as detect_spikes scores them, computed with percentile_cont.
+    """
+    return f"""
+        seg AS (
+          SELECT
+            -- integer segment id (ORDER BY groups NULL dimensions together), so joins are hashable
+            DENSE_RANK() OVER (ORDER BY org_id, team_id, channel) AS seg_id,
+            day, org_id, team_id, channel,
+            doc_count AS total,
+            CASE WHEN doc_count > 0 THEN negative_count::float / doc_count ELSE 0.0 END AS rate
+          FROM emotion_rollup
+          WHERE grain = 'channel' AND day >= :start AND day <= :target{org_filter}
+        ),
+        stats AS (
+          SELECT
+            seg_id, org_id, team_id, channel,
+            percentile_cont(0.5) WITHIN GROUP (ORDER BY rate)
+              FILTER (WHERE day < :target AND total >= :min_docs) AS median,
+            COUNT(*) FILTER (WHERE day < :target AND total >= :min_docs) AS n,
+            MAX(rate) FILTER (WHERE day = :target) AS x_rate,
+            MAX(total) FILTER (WHERE day = :target) AS x_total
+          FROM seg
+          GROUP BY seg_id, org_id, team_id, channel
+        ),
+        eligible AS (
+          SELECT * FROM stats WHERE n >= :min_history AND x_total >= :min_docs
+        ),
+        mad AS (
+          SELECT s.seg_id, percentile_cont(0.5) WITHIN GROUP (ORDER BY ABS(s.rate - e.median)) AS mad
+          FROM seg s
+          JOIN eligible e ON e.seg_id = s.seg_id
+          WHERE s.day < :target AND s.total >= :min_docs
+          GROUP BY s.seg_id
+        ),
+        scored AS (
+          SELECT
+            e.org_id, e.team_id, e.channel, e.x_rate, e.x_total, e.median, m.mad,
+            (e.x_rate - e.median) / CASE WHEN m.mad > 1e-9 THEN :mad_scale * m.mad ELSE 1e-9 END AS z
+          FROM eligible e
+          JOIN mad m ON m.seg_id = e.seg_id
+        )
+    """
+
+
+def detect_spikes_sql(
+    db: Session,
+    target_day: date,
+    baseline_days: int,
+    z_threshold: float,
+    min_docs: int,
+    org_id: str | None = None,
+) -> list[SpikeCandidate]:
+    """
+    Same detection as detect_spikes, computed in Postgres with percentile_cont.
+    Only segments that cross the threshold come back over the wire, so transfer
+    scales with the number of alerts rather than segments x baseline_days.
+    """
+    org_filter = org_scope.org_filter(None, org_id)
+    rows = db.execute(text(f"""
+        WITH {_robust_z_ctes(org_filter)}
+        SELECT org_id, team_id, channel, x_rate, x_total, median, mad, z
+        FROM scored
+        WHERE z >= :z_threshold AND x_rate >= median + :min_lift
+    """), {
+        "start": target_day - timedelta(days=baseline_days),
+        "target": target_day,
+        "min_docs": int(min_docs),
+        "min_history": MIN_HISTORY,
+        "mad_scale": MAD_SCALE,
+        "z_threshold": float(z_threshold),
+        "min_lift": MIN_LIFT,
+        "org_id": org_id,
+    }).fetchall()
+
+    return [
+        SpikeCandidate(
+            segment=(r.org_id, r.team_id, r.channel),
+            value=float(r.x_rate),
+            total=int(r.x_total),
+            median=float(r.median),
+            mad=float(r.mad),
+            z=float(r.z),
+            severity="high" if r.z >= z_threshold * 1.5 else "medium",
+        )
+        for r in rows
+    ]
+
+
+def find_spikes(
+    db: Session,
+    target_day: date,
+    baseline_days: int,
+    z_threshold: float,
+    min_docs: int,
+    mode: str = "python",
+    org_id: str | None = None,
+) -> list[SpikeCandidate]:
+    """Dispatches to the in-process ("python") or in-database ("sql") detector."""
+    if mode == "sql":
+        return detect_spikes_sql(db, target_day, baseline_days, z_threshold, min_docs, org_id)
+    if mode != "python":
+        raise ValueError(f"unknown spike detection mode: {mode!r}")
+    series = load_segment_series(db, target_day - timedelta(days=baseline_days), target_day, org_id)
+    return detect_spikes(series, target_day, baseline_days, z_threshold, min_docs)
+
+
+def _materialize_spike_candidates_sql(
+    db: Session,
+    target_day: date,
+    windows: set[tuple[int, int]],
+    org_id: str | None = None,
+) -> int:
+    """
+    materialize_spike_candidates in Postgres: one INSERT ... SELECT per window over the
+    robust z-score CTEs, so no rollup rows or statistics cross the wire.
+    """
+    keys = ["day", "metric", "baseline_days", "min_docs", "org_id", "team_id", "channel"]
+    scope = (
+        "t.day = :target AND t.metric = 'negative_rate'"
+        " AND t.baseline_days = :baseline_days AND t.min_docs = :min_docs"
+        + org_scope.org_filter("t", org_id)
+    )
+    produced = 0
+    for baseline_days, min_docs in sorted(windows):
+        produced += db.execute(text(f"""
+            WITH {_robust_z_ctes(org_scope.org_filter(None, org_id))},
+            new_candidates AS (
+              SELECT
+                CAST(:target AS date) AS day, 'negative_rate'::text AS metric,
+                CAST(:baseline_days AS int) AS baseline_days, CAST(:min_docs AS int) AS min_docs,
+                org_id, team_id, channel,
+                x_rate AS value, x_total::int AS doc_count, median, mad, z
+              FROM scored
+            ),
+            {upsert_replace_ctes(
+                "candidates", "new_candidates", "spike_candidates", "uq_spike_candidates_segment",
+                keys=keys, values=["value", "doc_count", "median", "mad", "z"], scope=scope,
+            )}
+            SELECT COUNT(*) FROM new_candidates
+        """), {
+            "start": target_day - timedelta(days=baseline_days),
+            "target": target_day,
+            "baseline_days": int(baseline_days),
+            "min_docs": int(min_docs),
+            "min_history": MIN_HISTORY,
+            "mad_scale": MAD_SCALE,
+            "org_id": org_id,
+        }).scalar()
+    return produced
+
+
+def materialize_spike_candidates(
+    db: Session,
+    target_day: date,
+    windows: set[tuple[int, int]],
+    org_id: str | None = None,
+    mode: str = "python",
+) -> int:
+    """
+    (Re)computes spike_candidates for target_day and each (baseline_days, min_docs) window:
+    one series load for the widest window, one scoring pass per window, one bulk upsert.
+    In "sql" mode the statistics are computed and written server-side instead.
+    With org_id, only that org's segments are computed and replaced.
+    Returns the number of rows produced.
+    """
+    if not windows:
+        return 0
+    if mode == "sql":
+        return _materialize_spike_candidates_sql(db, target_day, windows, org_id)
+    if mode != "python":
+        raise ValueError(f"unknown spike detection mode: {mode!r}")
+
+    widest = max(b for b, _m in windows)
+    series = load_segment_series(db, target_day - timedelta(days=widest), target_day, org_id)
+
+    rows: list[dict] = []
+    for baseline_days, min_docs in sorted(windows):
+        scores = score_segments(series, target_day, baseline_days, min_docs)
+        for i in np.flatnonzero(scores.ok):
+            seg_org, seg_team, seg_channel = series.segments[i]
+            rows.append({
+                "day": target_day,
+                "metric": "negative_rate",
+                "baseline_days": int(baseline_days),
+                "min_docs": int(min_docs),
+                "org_id": seg_org,
+                "team_id": seg_team,
+                "channel": seg_channel,
+                "value": float(scores.value[i]),
+                "doc_count": int(scores.total[i]),
+                "median": float(scores.median[i]),
+                "mad": float(scores.mad[i]),
+                "z": float(scores.z[i]),
+            })
+
+    # upsert (only changed statistics are rewritten), then drop segments of these windows
+    # that are no longer eligible with a NULL-safe anti-join
+    values = ["value", "doc_count", "median", "mad", "z"]
+    if rows:
+        stmt = pg_insert(SpikeCandidateStat.__table__)
+        db.execute(
+            stmt.on_conflict_do_update(
+                constraint="uq_spike_candidates_segment",
+                set_={c: stmt.excluded[c] for c in values},
+                where=text(changed_predicate("spike_candidates", values)),
+            ),
+            rows,
+        )
+    keys = ["baseline_days", "min_docs", "org_id", "team_id", "channel"]
+    org_filter = org_scope.org_filter("t", org_id)
+    db.execute(text(f"""
+        DELETE FROM spike_candidates t
+        WHERE t.day = :day AND t.metric = 'negative_rate'{org_filter}
+          AND (t.baseline_days, t.min_docs) IN (
+            SELECT * FROM unnest(CAST(:w_days AS int[]), CAST(:w_docs AS int[]))
+          )
+          AND NOT EXISTS (
+            SELECT 1
+            FROM unnest(
+              CAST(:days AS int[]), CAST(:docs AS int[]),
+              CAST(:orgs AS text[]), CAST(:teams AS text[]), CAST(:chans AS text[])
+            ) AS n(baseline_days, min_docs, org_id, team_id, channel)
+            WHERE {null_safe_match("n", "t", keys)}
+          )
+    """), {
+        "day": target_day,
+        "org_id": org_id,
+        "w_days": [b for b, _m in sorted(windows)],
+        "w_docs": [m for _b, m in sorted(windows)],
+        "days": [r["baseline_days"] for r in rows],
+        "docs": [r["min_docs"] for r in rows],
+        "orgs": [r["org_id"] for r in rows],
+        "teams": [r["team_id"] for r in rows],
+        "chans": [r["channel"] for r in rows],
+    })
+    return len(rows)
+
+
+def materialized_windows(db: Session, target_day: date, org_id: str | None = None) -> set[tuple[int, int]]:
+    """(baseline_days, min_docs) windows already materialized for target_day."""
+    org_filter = org_scope.org_filter(None, org_id)
+    rows = db.execute(text(f"""
+        SELECT DISTINCT baseline_days, min_docs
+        FROM spike_candidates
+        WHERE day = :day AND metric = 'negative_rate'{org_filter}
+    """), {"day": target_day, "org_id": org_id}).fetchall()
+    return {(int(r[0]), int(r[1])) for r in rows}
+
+
+def read_spike_candidates(
+    db: Session,
+    target_day: date,
+    baseline_days: int,
+    min_docs: int,
+    z_threshold: float,
+    org_id: str | None = None,
+) -> list[SpikeCandidate]:
+    """Upward spikes from the materialized statistics; same criteria as spikes_from_scores."""
+    org_filter = org_scope.org_filter(None, org_id)
+    rows = db.execute(text(f"""
+        SELECT org_id, team_id, channel, value, doc_count, median, mad, z
+        FROM spike_candidates
+        WHERE day = :day AND metric = 'negative_rate'{org_filter}
+          AND baseline_days = :baseline_days AND min_docs = :min_docs
+          AND z >= :z_threshold AND value >= median + :min_lift
+        ORDER BY z DESC
+    """), {
+        "day": target_day,
+        "baseline_days": int(baseline_days),
+        "min_docs": int(min_docs),
+        "z_threshold": float(z_threshold),
+        "min_lift": MIN_LIFT,
+        "org_id": org_id,
+    }).fetchall()
+
+    return [
+        SpikeCandidate(
+            segment=(r.org_id, r.team_id, r.channel),
+            value=float(r.value),
+            total=int(r.doc_count),
+            median=float(r.median),
+            mad=float(r.mad),
+            z=float(r.z),
+            severity="high" if r.z >= z_threshold * 1.5 else "medium",
+        )
+        for r in rows
+    ]
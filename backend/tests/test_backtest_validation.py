@@ -0,0 +1,19 @@
+"""Bad backtest rule definitions are rejected before any data is loaded (the API maps ValueError to 422)."""
+from datetime import date
+
+import pytest
+
+from app.tasks.alerting import BACKTEST_MAX_BASELINE_DAYS, backtest_rule
+
+
+@pytest.mark.parametrize("definition", [
+    {"baseline_days": 0},
+    {"baseline_days": -3},
+    {"baseline_days": BACKTEST_MAX_BASELINE_DAYS + 1},
+    {"min_docs": 0},
+    {"baseline_days": None},
+    {"z_threshold": "high"},
+])
+def test_invalid_definition_raises_value_error(definition):
+    with pytest.raises(ValueError):
+        backtest_rule(None, definition, date(2026, 1, 1), date(2026, 1, 31))
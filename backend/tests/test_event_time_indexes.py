@@ -0,0 +1,115 @@
+"""The rule engine's evidence lookup is served by ix_documents_org_team_channel_event_time."""
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+from app.tasks.alerting import _evidence_statement, select_evidence
+from app.utils.explain import keyword_matcher
+
+SEGMENT_INDEX = "ix_documents_org_team_channel_event_time"
+
+
+def _day_start() -> datetime:
+    # yesterday: its month partition exists right after the migrations
+    d = (datetime.now(timezone.utc) - timedelta(days=1)).date()
+    return datetime(d.year, d.month, d.day, tzinfo=timezone.utc)
+
+
+def _seed(db, day_start: datetime, n: int = 50_000) -> None:
+    """n documents over the 31 days up to day_start's day (every 7th without a team); that day's are inferred."""
+    run_id = db.execute(text("""
+        INSERT INTO inference_runs (id, model_name, status, created_at)
+        VALUES (gen_random_uuid(), 'test', 'completed', now())
+        RETURNING id
+    """)).scalar_one()
+    db.execute(text("""
+        INSERT INTO documents (
+          id, org_id, team_id, channel, text_redacted, redaction_summary,
+          timestamp, event_time, created_at, updated_at
+        )
+        SELECT gen_random_uuid(), 'org' || (g % 20),
+               CASE WHEN g % 7 = 0 THEN NULL ELSE 'team' || (g % 10) END,
+               'chan' || (g % 5), 'text ' || g, '{}', ts, ts, ts, ts
+        FROM generate_series(1, :n) AS g,
+             LATERAL (
+               SELECT CAST(:day AS timestamptz) - (g % 31) * interval '1 day' + (g % 86400) * interval '1 second' AS ts
+             ) t
+    """), {"n": n, "day": day_start})
+    db.execute(text("""
+        INSERT INTO document_inference (
+          id, document_id, event_time, inference_run_id, sentiment, emotion_labels,
+          calibrated_confidence, created_at
+        )
+        SELECT gen_random_uuid(), d.id, d.event_time, :run_id,
+               CASE WHEN random() < 0.3 THEN 'negative' ELSE 'neutral' END,
+               '["anger"]', 0.8, now()
+        FROM documents d
+        WHERE d.event_time >= :start AND d.event_time < :end
+    """), {"run_id": run_id, "start": day_start, "end": day_start + timedelta(days=1)})
+    db.execute(text("ANALYZE documents"))
+    db.execute(text("ANALYZE document_inference"))
+
+
+def _plan_nodes(node: dict):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def test_evidence_lookup_uses_segment_index(db):
+    day_start = _day_start()
+    _seed(db, day_start)
+
+    requests = [
+        (("org3", "team3", "chan3"), ["text"], 5),
+        (("org7", None, "chan2"), [], 5),  # NULL team: its own branch, still an index condition
+    ]
+    stmt, params = _evidence_statement(
+        day_start, day_start + timedelta(days=1), requests, [keyword_matcher(k) for (_s, k, _n) in requests]
+    )
+    plan = db.execute(text("EXPLAIN (FORMAT JSON) " + stmt.text), params).scalar_one()
+    nodes = list(_plan_nodes(plan[0]["Plan"]))
+
+    # the index is declared on the parent; plans name the per-partition indexes attached to it
+    partition_indexes = set(db.execute(text("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = :index
+    """), {"index": SEGMENT_INDEX}).scalars())
+
+    segment_scans = [
+        n for n in nodes
+        if n.get("Index Name") in partition_indexes and "org_id" in n.get("Index Cond", "")
+    ]
+    assert len(segment_scans) == 2, [(n["Node Type"], n.get("Index Name")) for n in nodes]
+    assert any("team_id IS NULL" in n["Index Cond"] for n in segment_scans)
+    assert not [
+        n for n in nodes if n["Node Type"] == "Seq Scan" and n.get("Relation Name", "").startswith("documents")
+    ]
+
+
+def test_evidence_matches_null_dimensions_exactly(db):
+    day_start = _day_start()
+    _seed(db, day_start, n=20_000)
+
+    out = select_evidence(db, day_start, day_start + timedelta(days=1), [
+        (("org7", None, "chan2"), [], 1000),
+        (("org3", "team3", "chan3"), [], 1000),
+    ])
+
+    expected = {
+        seg: set(db.execute(text(f"""
+            SELECT id FROM documents
+            WHERE org_id = :org AND channel = :chan AND team_id {"IS NULL" if seg[1] is None else "= :team"}
+              AND event_time >= :start AND event_time < :end
+        """), {
+            "org": seg[0], "team": seg[1], "chan": seg[2],
+            "start": day_start, "end": day_start + timedelta(days=1),
+        }).scalars())
+        for seg in (("org7", None, "chan2"), ("org3", "team3", "chan3"))
+    }
+    assert {row.id for (_c, row, _h, _hl) in out[0]} == expected[("org7", None, "chan2")]
+    assert {row.id for (_c, row, _h, _hl) in out[1]} == expected[("org3", "team3", "chan3")]
+    assert expected[("org7", None, "chan2")]